@@ -4,35 +4,48 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from config import engine_options, load_config
+from replicas import RoutingSession
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "DEBUG"))
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
-# Create the app
-app = Flask(__name__)
-# app.secret_key = os.environ.get("SESSION_SECRET")
-# Ganti baris lama dengan yang ini untuk pengembangan lokal
-app.secret_key = 'dev-secret-key-simlog-inirahasia'
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+def create_app(config=None):
+    """Create the Flask app.
 
-# Configure the database
-# Ganti dengan baris ini untuk koneksi MySQL lokal
-app.config["SQLALCHEMY_DATABASE_URI"] = "mysql+mysqlconnector://root:@localhost/simlog_db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+    Configuration comes from the environment (see config.load_config) and is
+    overridden by ``config``, a mapping or config object. Creating the app does
+    not touch the database: schema creation and the default admin are the
+    ``flask create-db`` and ``flask seed-admin`` commands.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(load_config())
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Initialize the app with the extension
-db.init_app(app)
+    # Configure the database
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    db.init_app(app)
 
-with app.app_context():
-    # Import models to ensure tables are created
     import models  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+    import commands
+    import outbox
+    import profiling
+    import replicas
+    import routes
+    import shipment_events
+    replicas.init_app(app)
+    routes.init_app(app)
+    profiling.init_app(app)
+    outbox.init_app(app)
+    shipment_events.init_app(app)
+    commands.init_app(app)
+    return app
@@ -0,0 +1,67 @@
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import DateTime, delete, insert, literal, select
+from app import db
+from models import (Order, Shipment, FinancialRecord, SupplierTransaction, OutboxEvent, StockReservation,
+                    ArchivedOrder, ArchivedShipment, ArchivedFinancialRecord, ArchivedSupplierTransaction)
+
+CLOSED_ORDER_STATUSES = ('delivered', 'cancelled')
+
+# Children before the orders they reference, so every DELETE is FK-safe
+ARCHIVED_TABLES = [
+    (Shipment, ArchivedShipment),
+    (FinancialRecord, ArchivedFinancialRecord),
+    (SupplierTransaction, ArchivedSupplierTransaction),
+    (Order, ArchivedOrder),
+]
+# Operational rows that are dropped rather than archived
+DROPPED_TABLES = [OutboxEvent, StockReservation]
+
+def _move(model, archive, order_ids, archived_at):
+    table = model.__table__
+    key = table.c.id if model is Order else table.c.order_id
+    names = [column.name for column in table.columns]
+    # INSERT ... SELECT: rows are copied inside the database, not through Python
+    db.session.execute(insert(archive.__table__).from_select(
+        names + ['archived_at'],
+        select(*table.columns, literal(archived_at, DateTime)).where(key.in_(order_ids))
+    ))
+    return db.session.execute(delete(table).where(key.in_(order_ids))).rowcount
+
+def archive_orders(cutoff, batch_size=1000):
+    """Move closed orders placed before ``cutoff`` and their dependent rows to the archive tables.
+
+    Each batch of ``batch_size`` orders is copied and deleted in its own
+    transaction. Returns a report with the rows moved per table and the time
+    taken.
+    """
+    started = time.perf_counter()
+    moved = Counter()
+    batches = 0
+    while True:
+        order_ids = db.session.execute(
+            select(Order.id)
+            .where(Order.status.in_(CLOSED_ORDER_STATUSES), Order.order_date < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not order_ids:
+            db.session.rollback()
+            break
+        archived_at = datetime.utcnow()
+        for model in DROPPED_TABLES:
+            db.session.execute(delete(model.__table__).where(model.__table__.c.order_id.in_(order_ids)))
+        for model, archive in ARCHIVED_TABLES:
+            moved[model.__tablename__] += _move(model, archive, order_ids, archived_at)
+        db.session.commit()
+        batches += 1
+        if len(order_ids) < batch_size:
+            break
+    return {
+        'cutoff': cutoff.isoformat(),
+        'batches': batches,
+        'rows_moved': {model.__tablename__: moved[model.__tablename__] for model, _ in ARCHIVED_TABLES},
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,817 @@
+"""Load-test harness for the Flask routes.
+
+Builds a synthetic dataset with the models.py schema, drives the real routes
+with concurrent clients and prints per-route latency percentiles, throughput
+and SQL statement counts as JSON, e.g.::
+
+    python benchmark.py --database-url sqlite:///bench.db --orders 1000000 --build
+    python benchmark.py --database-url sqlite:///bench.db --requests 500 --concurrency 16 -o before.json
+
+With --base-url the requests go to a running server (e.g. gunicorn) instead
+of the in-process test client; statement counts are then read from the
+server's /admin/metrics, so start it with SQL_PROFILING=1.
+
+--stock-stress N sends N concurrent orders for one product and checks that
+the stock reservations never oversell it; --search N compares the search
+index with LIKE '%term%' queries and --planner times the replenishment
+planner over the whole dataset; --eta replays delivered shipments to score
+the ETA estimator against the old fixed 7 days; --identity-cache runs the
+dashboard routes with the login identity cache off and on; --score-check
+fails if supplier scoring misses a transaction that commits after a higher
+id.
+
+--explain requests every route once, EXPLAINs the statements it ran and
+exits non-zero if any of them scans a large table in full; run it against
+a dataset big enough for the planner to prefer indexes, e.g.::
+
+    python benchmark.py --database-url sqlite:///bench.db --orders 1000000 --build --explain
+
+--check-plans does the same on a fresh SQLite database in a temporary
+directory, so it can run as a CI step without any setup::
+
+    python benchmark.py --check-plans --orders 50000
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pricing import LOGISTICS_COSTS as PACKAGE_COSTS
+
+BENCH_PASSWORD = 'bench-password'
+ADMIN_USERNAME = 'bench_admin'
+
+# Distribusi status mengikuti data produksi kira-kira
+ORDER_STATUSES = [('pending', 0.10), ('confirmed', 0.25), ('delivered', 0.65)]
+CONFIRMED_SHIPMENT_STATUSES = [('preparing', 0.4), ('in_transit', 0.6)]
+EXPENSE_RATIO = 0.3
+# Transit time depends on the supplier and the package type, with some noise
+PACKAGE_TRANSIT_FACTOR = {'basic': 1.3, 'standard': 1.0, 'premium': 0.6}
+LOCATIONS = ['Jakarta', 'Bandung', 'Surabaya', 'Semarang', 'Medan', 'Makassar', 'Denpasar', 'Yogyakarta']
+
+def _weighted(rng, choices):
+    r = rng.random()
+    for value, weight in choices:
+        r -= weight
+        if r <= 0:
+            return value
+    return choices[-1][0]
+
+def _next_id(db, model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def _insert_batches(db, table, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[i:i + batch_size])
+    db.session.commit()
+
+def build_dataset(users=1000, products=1000, suppliers=100, orders=100000, days=730,
+                  batch_size=10000, seed=42):
+    """Append a synthetic dataset to the configured database; returns row counts."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from ledger import rebuild_rollups
+    from models import User, Product, Supplier, Order, Shipment, FinancialRecord, SupplierTransaction
+    from stats import repair_user_stats
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    user_start = _next_id(db, User)
+    user_rows = [{'id': user_start + i, 'username': f'bench_user_{user_start + i}',
+                  'email': f'bench_user_{user_start + i}@example.com', 'password_hash': password_hash,
+                  'role': 'user', 'created_at': now - timedelta(days=days)} for i in range(users)]
+    if not User.query.filter_by(username=ADMIN_USERNAME).first():
+        user_rows.append({'id': user_start + users, 'username': ADMIN_USERNAME,
+                          'email': f'{ADMIN_USERNAME}@example.com', 'password_hash': password_hash,
+                          'role': 'admin', 'created_at': now - timedelta(days=days)})
+    _insert_batches(db, User.__table__, user_rows, batch_size)
+
+    product_start = _next_id(db, Product)
+    prices = [float(rng.randrange(10, 5000) * 1000) for _ in range(products)]
+    _insert_batches(db, Product.__table__, [
+        {'id': product_start + i, 'name': f'Product {product_start + i}', 'description': 'Synthetic benchmark product',
+         'stock_quantity': rng.randint(0, 500), 'min_stock_level': rng.randint(5, 50), 'unit_price': prices[i],
+         'created_at': now - timedelta(days=days), 'updated_at': now - timedelta(days=days)}
+        for i in range(products)], batch_size)
+
+    supplier_start = _next_id(db, Supplier)
+    _insert_batches(db, Supplier.__table__, [
+        {'id': supplier_start + i, 'name': f'Supplier {supplier_start + i}', 'contact_person': 'Bench',
+         'email': f'supplier{supplier_start + i}@example.com', 'phone': '0800000000',
+         'address': rng.choice(LOCATIONS), 'rating': round(rng.uniform(1, 5), 1),
+         'created_at': now - timedelta(days=days)} for i in range(suppliers)], batch_size)
+
+    supplier_transit = [rng.uniform(36, 168) for _ in range(suppliers)]
+    order_id = _next_id(db, Order)
+    shipment_id = _next_id(db, Shipment)
+    record_id = _next_id(db, FinancialRecord)
+    transaction_id = _next_id(db, SupplierTransaction)
+    counts = {'orders': 0, 'shipments': 0, 'financial_records': 0, 'supplier_transactions': 0}
+    tables = (Order.__table__, Shipment.__table__, FinancialRecord.__table__, SupplierTransaction.__table__)
+
+    remaining = orders
+    while remaining > 0:
+        chunk = min(batch_size, remaining)
+        remaining -= chunk
+        order_rows, shipment_rows, record_rows, transaction_rows = [], [], [], []
+        for _ in range(chunk):
+            product = rng.randrange(products)
+            package_type = rng.choice(list(PACKAGE_COSTS))
+            quantity = rng.randint(1, 20)
+            logistics_cost = PACKAGE_COSTS[package_type]
+            total_cost = prices[product] * quantity + logistics_cost
+            order_date = now - timedelta(seconds=rng.randrange(days * 86400))
+            status = _weighted(rng, ORDER_STATUSES)
+            supplier = supplier_start + rng.randrange(suppliers)
+            order_rows.append({
+                'id': order_id, 'user_id': user_start + rng.randrange(users), 'supplier_id': supplier,
+                'product_id': product_start + product, 'quantity': quantity, 'unit_price': prices[product],
+                'total_cost': total_cost, 'logistics_cost': logistics_cost, 'package_type': package_type,
+                'status': status, 'order_date': order_date,
+            })
+            if status != 'pending':
+                confirmed_at = order_date + timedelta(hours=rng.randint(1, 48))
+                shipped = confirmed_at + timedelta(hours=rng.randint(2, 48))
+                if status == 'delivered':
+                    shipment_status = 'delivered'
+                else:
+                    shipment_status = _weighted(rng, CONFIRMED_SHIPMENT_STATUSES)
+                shipment_rows.append({
+                    'id': shipment_id, 'order_id': order_id, 'tracking_number': f'SIMLOG{shipment_id:08X}',
+                    'status': shipment_status,
+                    'shipped_date': shipped if shipment_status != 'preparing' else None,
+                    'estimated_delivery': confirmed_at + timedelta(days=7),
+                    'actual_delivery': shipped + timedelta(hours=supplier_transit[supplier - supplier_start]
+                                                           * PACKAGE_TRANSIT_FACTOR.get(package_type, 1.0)
+                                                           * rng.uniform(0.8, 1.25)) if shipment_status == 'delivered' else None,
+                    'current_location': rng.choice(LOCATIONS),
+                })
+                shipment_id += 1
+                record_rows.append({
+                    'id': record_id, 'order_id': order_id, 'transaction_type': 'income', 'amount': total_cost,
+                    'description': f'Order payment for Product {product_start + product}', 'transaction_date': confirmed_at,
+                })
+                record_id += 1
+                if rng.random() < EXPENSE_RATIO:
+                    record_rows.append({
+                        'id': record_id, 'order_id': order_id, 'transaction_type': 'expense',
+                        'amount': logistics_cost * 0.6, 'description': 'Carrier fee', 'transaction_date': shipped,
+                    })
+                    record_id += 1
+                transaction_rows.append({
+                    'id': transaction_id, 'supplier_id': supplier, 'order_id': order_id,
+                    'amount': total_cost - logistics_cost, 'transaction_date': confirmed_at,
+                })
+                transaction_id += 1
+            order_id += 1
+        for table, rows, key in zip(tables, (order_rows, shipment_rows, record_rows, transaction_rows), counts):
+            if rows:
+                db.session.execute(table.insert(), rows)
+            counts[key] += len(rows)
+        db.session.commit()
+
+    rebuild_rollups()
+    repair_user_stats()
+    return {'users': users, 'products': products, 'suppliers': suppliers, **counts}
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(samples))))
+    return samples[min(rank, len(samples)) - 1]
+
+class TestClientDriver:
+    """Drives the app in-process through Flask's test client."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, username):
+        client = self.app.test_client()
+        client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+        return lambda method, path, data=None: client.open(path, method=method, data=data).status_code
+
+    def metrics(self):
+        import profiling
+        # Some metrics providers query the database
+        with self.app.app_context():
+            return profiling.metrics_snapshot()
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpDriver:
+    """Drives a running server over HTTP, one cookie jar per simulated client."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def _call(self, opener, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with opener.open(req) as resp:
+                payload = resp.read()
+                return resp.status, payload
+        except urllib.error.HTTPError as err:
+            return err.code, b''
+
+    def session(self, username):
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+        self._call(opener, 'POST', '/login', {'username': username, 'password': BENCH_PASSWORD})
+        return lambda method, path, data=None: self._call(opener, method, path, data)[0]
+
+    def metrics(self):
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+        self._call(opener, 'POST', '/login', {'username': ADMIN_USERNAME, 'password': BENCH_PASSWORD})
+        status, payload = self._call(opener, 'GET', '/admin/metrics')
+        return json.loads(payload) if status == 200 else {'endpoints': {}}
+
+class _Sampler:
+    """Thread-safe source of ids for the write routes."""
+
+    def __init__(self, ids, consume=False, seed=0):
+        self._ids = list(ids)
+        self._consume = consume
+        self._pos = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if not self._ids:
+                raise StopIteration
+            if not self._consume:
+                return self._rng.choice(self._ids)
+            if self._pos >= len(self._ids):
+                raise StopIteration
+            self._pos += 1
+            return self._ids[self._pos - 1]
+
+def route_plan(max_requests, seed=0):
+    """(endpoint, as_admin, request factory) for every benchmarked route."""
+    from models import User, Product, Supplier, Order, Shipment
+    rng = random.Random(seed)
+    products = _Sampler([p for (p,) in Product.query.with_entities(Product.id).limit(1000)], seed=seed)
+    suppliers = _Sampler([s for (s,) in Supplier.query.with_entities(Supplier.id).limit(1000)], seed=seed)
+    pending = _Sampler([o for (o,) in Order.query.with_entities(Order.id).filter_by(status='pending')
+                        .order_by(Order.id.desc()).limit(max_requests)], consume=True)
+    shipments = _Sampler([s for (s,) in Shipment.query.with_entities(Shipment.id)
+                          .filter(Shipment.status != 'delivered').limit(10000)], seed=seed)
+    usernames = [u for (u,) in User.query.with_entities(User.username)
+                 .filter(User.username.like('bench_user_%')).limit(1000)]
+
+    def new_order():
+        return 'POST', '/orders/create', {
+            'supplier_id': suppliers.next(), 'product_id': products.next(),
+            'quantity': rng.randint(1, 20), 'package_type': rng.choice(list(PACKAGE_COSTS)),
+        }
+
+    def shipment_update():
+        status = rng.choice(['in_transit', 'in_transit', 'delivered'])
+        return 'POST', f'/admin/shipments/{shipments.next()}/update', {
+            'status': status, 'current_location': rng.choice(LOCATIONS),
+        }
+
+    plan = [
+        ('user_dashboard', False, lambda: ('GET', '/dashboard', None)),
+        ('admin_dashboard', True, lambda: ('GET', '/admin/dashboard', None)),
+        ('admin_orders', True, lambda: ('GET', '/admin/orders', None)),
+        ('admin_financial', True, lambda: ('GET', '/admin/financial', None)),
+        ('create_order', False, new_order),
+        ('confirm_order', True, lambda: ('POST', f'/orders/{pending.next()}/confirm', None)),
+        ('update_shipment_status', True, shipment_update),
+    ]
+    return plan, usernames
+
+def run_route(driver, endpoint, as_admin, make_request, usernames, requests, concurrency):
+    sessions = [driver.session(ADMIN_USERNAME if as_admin else usernames[i % len(usernames)])
+                for i in range(concurrency)]
+    quotas = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(i):
+        call = sessions[i]
+        latencies = []
+        errors = 0
+        for _ in range(quotas[i]):
+            try:
+                method, path, data = make_request()
+            except StopIteration:
+                break
+            started = time.perf_counter()
+            status = call(method, path, data)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+        return latencies, errors
+
+    before = driver.metrics()['endpoints'].get(endpoint, {})
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = driver.metrics()['endpoints'].get(endpoint, {})
+
+    latencies = sorted(itertools.chain.from_iterable(r[0] for r in results))
+    profiled = after.get('requests', 0) - before.get('requests', 0)
+    statements = after.get('statements_total', 0) - before.get('statements_total', 0)
+    to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(r[1] for r in results),
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'statements_per_request': round(statements / profiled, 2) if profiled else None,
+    }
+
+DASHBOARD_ROUTES = ('user_dashboard', 'admin_dashboard', 'admin_orders', 'admin_financial')
+
+def identity_cache_benchmark(app, driver, plan, usernames, requests, concurrency):
+    """Statements per request on the dashboard routes with the identity cache off and on."""
+    from identity import identity_cache
+    results = {}
+    for endpoint, as_admin, make_request in plan:
+        if endpoint not in DASHBOARD_ROUTES:
+            continue
+        runs = {}
+        for label, ttl in (('uncached', 0), ('cached', 60)):
+            app.config['IDENTITY_CACHE_TTL'] = ttl
+            identity_cache.clear()
+            runs[label] = run_route(driver, endpoint, as_admin, make_request, usernames, requests, concurrency)
+        before, after = runs['uncached']['statements_per_request'], runs['cached']['statements_per_request']
+        runs['statements_saved_per_request'] = round(before - after, 2) if None not in (before, after) else None
+        results[endpoint] = runs
+    results['cache'] = identity_cache.stats()
+    return results
+
+def stock_stress(app, driver, usernames, orders=500, stock=100, concurrency=32):
+    """Fire ``orders`` concurrent one-unit orders at a single product holding ``stock`` units.
+
+    Afterwards the created orders, held stock and remaining stock must add up:
+    at most ``stock`` orders and never a negative stock level.
+    """
+    from sqlalchemy import func
+    from app import db
+    from models import Order, Product, StockReservation, Supplier
+    with app.app_context():
+        product = Product(name=f'Hot SKU {time.time_ns()}', description='Stock stress test',
+                          stock_quantity=stock, min_stock_level=0, unit_price=1000.0)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        supplier_id = db.session.query(Supplier.id).limit(1).scalar()
+        db.session.remove()
+
+    sessions = [driver.session(usernames[i % len(usernames)]) for i in range(concurrency)]
+    remaining = iter(range(orders))
+    lock = threading.Lock()
+    form = {'supplier_id': supplier_id, 'product_id': product_id, 'quantity': 1, 'package_type': 'basic'}
+
+    def worker(i):
+        errors = 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return errors
+            if sessions[i]('POST', '/orders/create', form) >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        errors = sum(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        left = db.session.get(Product, product_id).stock_quantity
+        created = Order.query.filter_by(product_id=product_id).count()
+        reserved = db.session.query(func.coalesce(func.sum(StockReservation.quantity), 0)).filter(
+            StockReservation.product_id == product_id, StockReservation.status == 'held').scalar()
+        db.session.remove()
+    return {
+        'orders_attempted': orders,
+        'concurrency': concurrency,
+        'initial_stock': stock,
+        'orders_created': created,
+        'stock_held': reserved,
+        'stock_remaining': left,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'oversold': created > stock or left < 0 or reserved + left != stock or reserved != created,
+    }
+
+def search_benchmark(app, queries=200, seed=0):
+    """Typeahead latency of the in-process search index against LIKE '%term%' queries."""
+    from sqlalchemy import and_, or_
+    from app import db
+    from models import Product, Supplier
+    from search import CatalogSearch, tokenize
+
+    rng = random.Random(seed)
+    with app.app_context():
+        words = sorted({word for (name,) in db.session.query(Product.name).limit(5000)
+                        for word in tokenize(name)} |
+                       {word for (name,) in db.session.query(Supplier.name).limit(5000)
+                        for word in tokenize(name)})
+        terms = []
+        for _ in range(queries):
+            picked = rng.sample(words, min(len(words), rng.choice([1, 1, 2])))
+            terms.append([word[:rng.randint(min(2, len(word)), len(word))] for word in picked])
+
+        search = CatalogSearch()
+        started = time.perf_counter()
+        search.build()
+        build_seconds = time.perf_counter() - started
+
+        def run(fn):
+            latencies = []
+            for query_terms in terms:
+                started = time.perf_counter()
+                fn(query_terms)
+                latencies.append(time.perf_counter() - started)
+            return sorted(latencies)
+
+        def like(query_terms):
+            for model, columns in ((Product, (Product.name, Product.description)),
+                                   (Supplier, (Supplier.name, Supplier.contact_person, Supplier.address))):
+                db.session.query(model.id, model.name).filter(and_(*[
+                    or_(*[column.ilike(f'%{term}%') for column in columns]) for term in query_terms
+                ])).limit(20).all()
+
+        results = {
+            'index': run(lambda query_terms: search.index.search(' '.join(query_terms), limit=20)),
+            'like': run(like),
+        }
+        db.session.remove()
+
+    to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+    report = {'queries': len(terms), 'index_build_ms': to_ms(build_seconds), **search.stats()}
+    for name, latencies in results.items():
+        report[name] = {'p50_ms': to_ms(percentile(latencies, 50)), 'p95_ms': to_ms(percentile(latencies, 95)),
+                        'p99_ms': to_ms(percentile(latencies, 99))}
+    return report
+
+def eta_accuracy(app, min_samples=5):
+    """Replay delivered shipments in shipping order and score ETA predictions.
+
+    Each delivery is predicted from the statistics of the deliveries that
+    arrived before it was shipped, like the live estimator would have, and
+    compared with the fixed 7-day estimate used before.
+    """
+    import heapq
+    from collections import defaultdict
+    from app import db
+    from eta import DEFAULT_TRANSIT_HOURS, TransitStats, stats_keys, transit_hours
+    from models import Order, Shipment
+
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(Order.supplier_id, Order.package_type, Shipment.shipped_date, Shipment.actual_delivery)
+            .join(Order, Order.id == Shipment.order_id)
+            .where(Shipment.status == 'delivered', Shipment.shipped_date.isnot(None),
+                   Shipment.actual_delivery.isnot(None))
+            .order_by(Shipment.shipped_date)
+        ).all()
+        db.session.remove()
+
+    stats = defaultdict(TransitStats)
+    arrived = []  # heap of (actual_delivery, keys, hours) not yet visible to the estimator
+    errors, baseline_errors, covered, scored = [], [], 0, 0
+    for supplier_id, package_type, shipped_date, actual_delivery in rows:
+        while arrived and arrived[0][0] <= shipped_date:
+            _, _, keys, hours = heapq.heappop(arrived)
+            for key in keys:
+                stats[key].add(hours)
+        keys = stats_keys(supplier_id, package_type)
+        hours = transit_hours(shipped_date, actual_delivery)
+        known = next((stats[key] for key in keys if stats[key].count >= min_samples), None)
+        if known is not None:
+            low, high = known.interval()
+            errors.append(abs(known.mean - hours))
+            covered += low <= hours <= high
+            scored += 1
+        else:
+            errors.append(abs(DEFAULT_TRANSIT_HOURS - hours))
+        # The old estimate was confirmation + 7 days; measured from shipping that is 7 days as well
+        baseline_errors.append(abs(7 * 24 - hours))
+        heapq.heappush(arrived, (actual_delivery, len(baseline_errors), keys, hours))
+
+    mean = lambda values: round(sum(values) / len(values), 2) if values else None
+    return {
+        'deliveries': len(rows),
+        'predicted_from_stats': scored,
+        'mae_hours': mean(errors),
+        'baseline_mae_hours': mean(baseline_errors),
+        'interval_coverage': round(covered / scored, 3) if scored else None,
+    }
+
+def supplier_score_late_commit(app):
+    """Check that a supplier transaction committing after a higher id still reaches the scores.
+
+    Inserts transaction id N+2, runs an incremental score, then inserts N+1
+    (the late commit) and scores again; the supplier's order_count must grow
+    by two. The rows are removed and the scores rebuilt afterwards.
+    """
+    from app import db
+    from models import Order, SupplierScore, SupplierTransaction
+    from scoring import score_suppliers
+
+    with app.app_context():
+        order = db.session.execute(db.select(Order.id, Order.supplier_id).limit(1)).first()
+        if order is None:
+            return {'error': 'no orders; run with --build first'}
+        score_suppliers()
+        counted = lambda: db.session.execute(
+            db.select(SupplierScore.order_count).where(SupplierScore.supplier_id == order.supplier_id)
+        ).scalar() or 0
+        before = counted()
+        first_id = _next_id(db, SupplierTransaction)
+        runs = []
+        for transaction_id in (first_id + 1, first_id):
+            db.session.add(SupplierTransaction(id=transaction_id, supplier_id=order.supplier_id, order_id=order.id,
+                                               amount=1.0, transaction_date=datetime.utcnow()))
+            db.session.commit()
+            runs.append(score_suppliers())
+        after = counted()
+        db.session.execute(db.delete(SupplierTransaction).where(SupplierTransaction.id.in_([first_id, first_id + 1])))
+        db.session.commit()
+        score_suppliers(full=True)
+        db.session.remove()
+    return {
+        'supplier_id': order.supplier_id,
+        'counted': after - before,
+        'pending_after_first_run': runs[0]['pending_transactions'],
+        'missed': after - before != 2,
+    }
+
+# Tables that may be read in full: small reference tables that the order
+# and logistics pages list whole (and products' low-stock test compares two
+# of its columns, which no index can serve)
+FULL_SCAN_ALLOWED = {'products', 'suppliers'}
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+def explain_route_plan(app, max_requests=1, seed=0):
+    """(endpoint, as_admin, request factory) for every route whose queries are checked by --explain."""
+    from models import Order, Shipment
+    from pagination import DEFAULT_PAGE_SIZE, encode_cursor
+    with app.app_context():
+        plan, usernames = route_plan(max_requests, seed)
+        older = Order.query.order_by(Order.order_date.desc(), Order.id.desc()).offset(DEFAULT_PAGE_SIZE).first()
+        tracking_number = Shipment.query.with_entities(Shipment.tracking_number).limit(1).scalar()
+        today = datetime.utcnow().date()
+    get = lambda path: lambda: ('GET', path, None)
+    plan += [
+        ('orders', False, get('/orders')),
+        ('distribution', False, get('/distribution')),
+        ('logistics', False, get('/logistics')),
+        ('suppliers', False, get('/suppliers?sort=on_time')),
+        ('admin_orders_page_2', True, get('/admin/orders?cursor=' + encode_cursor([older.order_date, older.id])
+                                          if older else '/admin/orders')),
+        ('admin_orders_archived', True, get('/admin/orders?include_archived=1')),
+        ('admin_distribution', True, get('/admin/distribution')),
+        ('admin_financial_range', True, get(f'/admin/financial?start={today - timedelta(days=45)}&end={today}')),
+        ('admin_suppliers', True, get('/admin/suppliers?sort=rating')),
+        ('admin_replenishment', True, get('/admin/replenishment')),
+        ('track_shipment', False, get(f'/api/track/{tracking_number}')),
+    ]
+    return plan, usernames
+
+def _full_scans(connection, statement, parameters):
+    """Tables the database would read in full to run ``statement``."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        nodes, tables = [plan[0]['Plan']], []
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan':
+                tables.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return tables
+    if dialect == 'mysql':
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+        return [row['table'] for row in rows if row['type'] == 'ALL']
+    # SQLite: "SCAN orders" is a table scan, "SCAN orders USING INDEX ..." walks an index
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    details = [detail for *_, detail in rows]
+    scans = [match.group(1) for detail in details if (match := re.fullmatch(r'SCAN (\w+)(?: AS \w+)?', detail))]
+    # The outer scan stops early only when it walks the rowid in ORDER BY order:
+    # "... ORDER BY t.id [DESC] LIMIT n" with no sort step. A filtered scan
+    # with a LIMIT but another (or no) order may still read the whole table.
+    outer = re.fullmatch(r'SCAN (\w+)(?: AS (\w+))?', details[0]) if details else None
+    order_by = re.findall(r'\bORDER BY\s+(?:(\w+)\.)?(\w+)', statement, re.IGNORECASE)
+    if (outer and order_by and re.search(r'\bLIMIT\b', statement, re.IGNORECASE)
+            and not any(detail.startswith('USE TEMP B-TREE') for detail in details)):
+        qualifier, column = order_by[-1]
+        if column.lower() == 'id' and qualifier in ('', outer.group(1), outer.group(2)):
+            scans.pop(0)
+    return scans
+
+def check_query_plans(app, driver, plan, usernames):
+    """EXPLAIN every SELECT/UPDATE/DELETE each route runs and report full scans of large tables.
+
+    Each route is requested once through ``driver`` (the test client) while
+    its statements are captured, then every statement is explained on the
+    same database. Scans of FULL_SCAN_ALLOWED tables and of tables that are
+    not part of the schema (subqueries, CTEs) are ignored. A route answering
+    with a 4xx/5xx status is listed in ``errors``, since it may have failed
+    before running the queries it was meant to check.
+    """
+    from sqlalchemy import event
+    from app import db
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if _EXPLAINABLE.match(statement):
+            captured.append((statement, parameters[0] if executemany and parameters else parameters))
+
+    with app.app_context():
+        engine = db.engine
+        tables = set(db.metadata.tables)
+    report = {'routes': {}, 'full_scans': 0, 'errors': []}
+    for endpoint, as_admin, make_request in plan:
+        call = driver.session(ADMIN_USERNAME if as_admin else usernames[0])
+        try:
+            method, path, data = make_request()
+        except StopIteration:
+            continue
+        captured.clear()
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            status = call(method, path, data)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        scans = []
+        with engine.connect() as connection:
+            seen = set()
+            for statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                for table in _full_scans(connection, statement, parameters):
+                    if table in tables and table not in FULL_SCAN_ALLOWED:
+                        scans.append({'table': table, 'statement': ' '.join(statement.split())[:300]})
+        report['routes'][endpoint] = {'status': status, 'statements': len(seen), 'full_scans': scans}
+        report['full_scans'] += len(scans)
+        if not 200 <= status < 400:
+            report['errors'].append({'route': endpoint, 'path': path, 'status': status})
+    return report
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the SIMLOG routes')
+    parser.add_argument('--database-url', help='database to build/benchmark (defaults to DATABASE_URL)')
+    parser.add_argument('--build', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--suppliers', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=730, help='order history span')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', help='comma-separated endpoint names to run (default: all)')
+    parser.add_argument('--base-url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--stock-stress', type=int, metavar='ORDERS',
+                        help='only run the stock reservation stress test with this many orders')
+    parser.add_argument('--stock', type=int, default=100, help='stock of the stress test product')
+    parser.add_argument('--planner', action='store_true', help='only time the replenishment planner')
+    parser.add_argument('--eta', action='store_true', help='only score the delivery ETA estimator')
+    parser.add_argument('--search', type=int, metavar='QUERIES',
+                        help='only compare the search index with LIKE queries, using this many queries')
+    parser.add_argument('--identity-cache', action='store_true',
+                        help='only compare the dashboard routes with the identity cache off and on')
+    parser.add_argument('--score-check', action='store_true',
+                        help='only check that supplier scoring counts late-committed transactions')
+    parser.add_argument('--explain', action='store_true',
+                        help='only EXPLAIN the queries of every route and fail on full table scans')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='build a dataset in a temporary SQLite database and run --explain on it')
+    parser.add_argument('-o', '--output', help='write the JSON report here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    if args.check_plans:
+        if args.database_url or args.base_url:
+            parser.error('--check-plans builds its own database; drop --database-url/--base-url')
+        scratch = tempfile.mkdtemp(prefix='simlog-plans-')
+        args.database_url = 'sqlite:///' + os.path.join(scratch, 'plans.db')
+        args.build = args.explain = True
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ['SQL_PROFILING'] = '1'
+    # Jangan banjiri output dengan peringatan budget selama benchmark
+    os.environ.setdefault('SQL_BUDGET_STATEMENTS', '1000000')
+    os.environ.setdefault('SQL_BUDGET_MS', '1000000')
+    os.environ.setdefault('SQL_REPEAT_THRESHOLD', '1000000')
+
+    import logging
+    from app import create_app, db
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'mode': 'http' if args.base_url else 'test_client',
+        'requests_per_route': args.requests,
+        'concurrency': args.concurrency,
+    }
+    with app.app_context():
+        report['database'] = db.engine.dialect.name
+        if args.build:
+            from migrations import migrate
+            migrate(echo=lambda message: None)
+            started = time.perf_counter()
+            report['dataset'] = build_dataset(args.users, args.products, args.suppliers, args.orders,
+                                              args.days, args.batch_size, args.seed)
+            report['dataset']['build_seconds'] = round(time.perf_counter() - started, 2)
+        plan, usernames = route_plan(args.requests * 2, args.seed)
+        db.session.remove()
+
+    if not usernames:
+        parser.error('no benchmark users found; run with --build first')
+    selected = set(args.routes.split(',')) if args.routes else None
+    driver = HttpDriver(args.base_url) if args.base_url else TestClientDriver(app)
+    report['routes'] = {}
+    if args.stock_stress:
+        report['stock_stress'] = stock_stress(app, driver, usernames, args.stock_stress, args.stock,
+                                              args.concurrency)
+        plan = []
+    if args.planner:
+        from planner import plan_replenishment
+        with app.app_context():
+            report['planner'] = plan_replenishment(history_days=args.days)
+            db.session.remove()
+        plan = []
+    if args.eta:
+        report['eta'] = eta_accuracy(app)
+        plan = []
+    if args.search:
+        report['search'] = search_benchmark(app, args.search, args.seed)
+        plan = []
+    if args.identity_cache:
+        if args.base_url:
+            parser.error('--identity-cache toggles the cache in-process and needs the test client')
+        report['identity_cache'] = identity_cache_benchmark(app, driver, plan, usernames, args.requests,
+                                                            args.concurrency)
+        plan = []
+    if args.score_check:
+        report['supplier_scores'] = supplier_score_late_commit(app)
+        plan = []
+    if args.explain:
+        if args.base_url:
+            parser.error('--explain captures statements in-process and needs the test client')
+        explain_plan, _ = explain_route_plan(app, seed=args.seed)
+        report['query_plans'] = check_query_plans(app, driver, explain_plan, usernames)
+        plan = []
+    for endpoint, as_admin, make_request in plan:
+        if selected and endpoint not in selected:
+            continue
+        report['routes'][endpoint] = run_route(driver, endpoint, as_admin, make_request, usernames,
+                                               args.requests, args.concurrency)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if report.get('stock_stress', {}).get('oversold'):
+        raise SystemExit('stock stress test failed: oversold')
+    if report.get('supplier_scores', {}).get('missed'):
+        raise SystemExit('supplier score check failed: a late-committed transaction was not counted')
+    if args.check_plans:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if report.get('query_plans', {}).get('full_scans'):
+        raise SystemExit(f"query plan check failed: {report['query_plans']['full_scans']} full table scan(s)")
+    if report.get('query_plans', {}).get('errors'):
+        raise SystemExit(f"query plan check failed: {len(report['query_plans']['errors'])} route(s) returned an error")
+
+if __name__ == '__main__':
+    main()
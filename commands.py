@@ -0,0 +1,229 @@
+import click
+from flask import current_app
+from app import db
+from exports import EXPORTS
+from models import User
+
+def create_default_admin(username='admin', email='admin@simlog.com', password='admin123'):
+    admin = User.query.filter_by(username=username).first()
+    if not admin:
+        admin = User(username=username, email=email, role='admin')
+        admin.set_password(password)
+        db.session.add(admin)
+        db.session.commit()
+        return True
+    return False
+
+@click.command('create-db')
+def create_db_command():
+    """Create the database tables by applying all migrations."""
+    from migrations import migrate
+    migrate(echo=click.echo)
+    click.echo("Database schema is up to date.")
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='List pending migrations without applying them.')
+@click.option('--to', 'target', type=int, help='Stop after this version.')
+def migrate_command(status, target):
+    """Apply pending schema migrations."""
+    from migrations import migrate, pending_migrations
+    if status:
+        pending = pending_migrations()
+        for version, description in pending:
+            click.echo(f"{version}: {description}")
+        click.echo(f"{len(pending)} pending migration(s).")
+        return
+    applied = migrate(target, echo=click.echo)
+    click.echo(f"{len(applied)} migration(s) applied.")
+
+@click.command('seed-admin')
+@click.option('--username', default='admin')
+@click.option('--email', default='admin@simlog.com')
+@click.option('--password', default='admin123')
+def seed_admin_command(username, email, password):
+    """Create the default admin user if it does not exist."""
+    if create_default_admin(username, email, password):
+        click.echo(f"Admin user '{username}' created.")
+    else:
+        click.echo(f"Admin user '{username}' already exists.")
+
+@click.command('seed-data')
+@click.option('--bulk', is_flag=True, help='Stream files and insert in batches.')
+@click.option('--batch-size', type=int, default=1000)
+@click.option('--data-dir', default='DB')
+def seed_data_command(bulk, batch_size, data_dir):
+    """Load DB/*.json into the database."""
+    from seed_data import bulk_seed_data, seed_data
+    if bulk:
+        bulk_seed_data(data_dir, batch_size)
+    else:
+        seed_data()
+
+@click.command('rebuild-ledger')
+def rebuild_ledger_command():
+    """Rebuild the financial rollups from financial_records."""
+    from ledger import rebuild_rollups
+    count = rebuild_rollups()
+    click.echo(f"{count} rollup rows written.")
+
+@click.command('repair-user-stats')
+@click.option('--check-only', is_flag=True, help='Report mismatches without fixing them.')
+def repair_user_stats_command(check_only):
+    """Check and repair per-user dashboard counters."""
+    from stats import repair_user_stats
+    wrong = repair_user_stats(fix=not check_only)
+    action = 'found' if check_only else 'repaired'
+    click.echo(f"{len(wrong)} user counter rows {action}.")
+
+@click.command('ingest-carrier-feed')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=1000)
+def ingest_carrier_feed_command(path, fmt, batch_size):
+    """Apply a carrier shipment status feed (CSV or JSONL)."""
+    import json
+    from shipments import ingest_carrier_feed
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as stream:
+        summary = ingest_carrier_feed(stream, fmt, batch_size)
+    click.echo(json.dumps(summary, indent=2))
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (PRODUCT_IMPORT_BATCH_SIZE).')
+def import_products_command(path, fmt, batch_size):
+    """Create or update products and apply stock counts or adjustments (CSV or JSONL)."""
+    import json
+    from product_import import import_products
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    batch_size = batch_size or current_app.config.get('PRODUCT_IMPORT_BATCH_SIZE', 1000)
+    with open(path, newline='', encoding='utf-8', errors='replace') as stream:
+        summary = import_products(stream, fmt, batch_size)
+    click.echo(json.dumps(summary, indent=2))
+
+@click.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Drain the queue once and exit.')
+def outbox_worker_command(once):
+    """Process queued order confirmation events."""
+    import outbox
+    app = current_app._get_current_object()
+    if once:
+        click.echo(f"{outbox.drain(app)} events processed.")
+        return
+    worker = outbox.OutboxWorker(app)
+    click.echo('Outbox worker running, Ctrl+C to stop.')
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+@click.command('expire-reservations')
+@click.option('--batch-size', type=int, default=500)
+def expire_reservations_command(batch_size):
+    """Release expired stock reservations and cancel their pending orders (run from cron)."""
+    from stats import invalidate_dashboard_stats
+    from stock import expire_reservations
+    count = expire_reservations(batch_size)
+    if count:
+        invalidate_dashboard_stats()
+    click.echo(f"{count} reservations expired.")
+
+@click.command('export')
+@click.argument('name', type=click.Choice(list(EXPORTS)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), help='Defaults to the file extension.')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day to include.')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day to include.')
+@click.option('--status', help='Order/shipment status or financial transaction type.')
+@click.option('--batch-size', type=int, default=10000, help='Rows per fetch and per Parquet row group.')
+def export_command(name, path, fmt, start, end, status, batch_size):
+    """Export a table to CSV or Parquet in constant memory."""
+    from exports import ExportError, iter_csv, write_parquet
+    fmt = fmt or ('parquet' if path.lower().endswith('.parquet') else 'csv')
+    start = start.date() if start else None
+    end = end.date() if end else None
+    try:
+        if fmt == 'parquet':
+            rows = 0
+            for rows in write_parquet(name, path, start, end, status, batch_size):
+                click.echo(f"{rows} rows...", err=True)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                for chunk in iter_csv(name, start, end, status, batch_size):
+                    f.write(chunk)
+    except ExportError as exc:
+        raise click.UsageError(str(exc))
+    click.echo(f"{name} exported to {path}.")
+
+@click.command('archive-orders')
+@click.option('--older-than-days', type=int, help='Defaults to ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', type=int, help='Orders per transaction; defaults to ARCHIVE_BATCH_SIZE.')
+def archive_orders_command(older_than_days, batch_size):
+    """Move old delivered/cancelled orders and their rows to the archive tables."""
+    import json
+    from datetime import datetime, timedelta
+    from archive import archive_orders
+    from stats import invalidate_dashboard_stats
+    config = current_app.config
+    days = older_than_days if older_than_days is not None else config.get('ARCHIVE_AFTER_DAYS', 90)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    report = archive_orders(cutoff, batch_size or config.get('ARCHIVE_BATCH_SIZE', 1000))
+    invalidate_dashboard_stats()
+    click.echo(json.dumps(report, indent=2))
+
+@click.command('plan-replenishment')
+def plan_replenishment_command():
+    """Recompute reorder points and suggested purchase orders from order history."""
+    import json
+    from planner import plan_replenishment, suggested_purchase_orders
+    from stats import invalidate_dashboard_stats
+    config = current_app.config
+    summary = plan_replenishment(
+        history_days=config.get('PLANNER_HISTORY_DAYS', 730),
+        lead_time_days=config.get('PLANNER_LEAD_TIME_DAYS', 7),
+        coverage_days=config.get('PLANNER_COVERAGE_DAYS', 30),
+        service_z=config.get('PLANNER_SERVICE_Z', 1.65)
+    )
+    invalidate_dashboard_stats()
+    summary['purchase_orders'] = suggested_purchase_orders()[:20]
+    click.echo(json.dumps(summary, indent=2))
+
+@click.command('rebuild-delivery-stats')
+def rebuild_delivery_stats_command():
+    """Backfill the delivery-time statistics used for ETAs from delivered shipments."""
+    from eta import rebuild_delivery_stats
+    count = rebuild_delivery_stats()
+    click.echo(f"{count} deliveries folded into the ETA statistics.")
+
+@click.command('score-suppliers')
+@click.option('--full', is_flag=True, help='Recompute from the whole history instead of since the last run.')
+def score_suppliers_command(full):
+    """Update supplier metrics and ratings with the activity since the last run."""
+    import json
+    from scoring import score_suppliers
+    config = current_app.config
+    summary = score_suppliers(
+        full=full,
+        delivery_lag_hours=config.get('SUPPLIER_SCORE_DELIVERY_LAG_HOURS', 24),
+        prior_weight=config.get('SUPPLIER_SCORE_PRIOR_WEIGHT', 10),
+        commit_window_hours=config.get('SUPPLIER_SCORE_COMMIT_WINDOW_HOURS', 24)
+    )
+    click.echo(json.dumps(summary, indent=2))
+
+def init_app(app):
+    app.cli.add_command(create_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(seed_admin_command)
+    app.cli.add_command(seed_data_command)
+    app.cli.add_command(rebuild_ledger_command)
+    app.cli.add_command(repair_user_stats_command)
+    app.cli.add_command(ingest_carrier_feed_command)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(outbox_worker_command)
+    app.cli.add_command(expire_reservations_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(archive_orders_command)
+    app.cli.add_command(plan_replenishment_command)
+    app.cli.add_command(rebuild_delivery_stats_command)
+    app.cli.add_command(score_suppliers_command)
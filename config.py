@@ -0,0 +1,128 @@
+import os
+from sqlalchemy.engine import make_url
+
+DEFAULT_DATABASE_URI = "mysql+mysqlconnector://root:@localhost/simlog_db"
+
+def _env_int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def _env_float(environ, name, default):
+    value = environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+def _env_bool(environ, name, default=False):
+    value = environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def load_config(environ=None):
+    """Build the app configuration from environment variables."""
+    environ = os.environ if environ is None else environ
+    return {
+        # Ganti SESSION_SECRET di produksi
+        "SECRET_KEY": environ.get("SESSION_SECRET", "dev-secret-key-simlog-inirahasia"),
+        "SQLALCHEMY_DATABASE_URI": environ.get("DATABASE_URL", DEFAULT_DATABASE_URI),
+        # Comma-separated read replicas for reporting pages, see replicas.py
+        "DATABASE_REPLICA_URLS": [u.strip() for u in environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()],
+        "REPLICA_HEALTH_INTERVAL": _env_float(environ, "REPLICA_HEALTH_INTERVAL", 10),
+        "REPLICA_STICKY_SECONDS": _env_float(environ, "REPLICA_STICKY_SECONDS", 5),
+        # Connection pool; ignored for SQLite
+        "DB_POOL_SIZE": _env_int(environ, "DB_POOL_SIZE", 5),
+        "DB_MAX_OVERFLOW": _env_int(environ, "DB_MAX_OVERFLOW", 10),
+        "DB_POOL_TIMEOUT": _env_float(environ, "DB_POOL_TIMEOUT", 30),
+        "DB_POOL_RECYCLE": _env_int(environ, "DB_POOL_RECYCLE", 300),
+        "DB_CONNECT_TIMEOUT": _env_int(environ, "DB_CONNECT_TIMEOUT", 10),
+        # Seconds a worker may serve a logged-in user's id/role from memory.
+        # Role and password changes apply immediately in the worker that made
+        # them and within IDENTITY_INVALIDATION_POLL seconds in the others
+        "IDENTITY_CACHE_TTL": _env_float(environ, "IDENTITY_CACHE_TTL", 60),
+        "IDENTITY_INVALIDATION_POLL": _env_float(environ, "IDENTITY_INVALIDATION_POLL", 1),
+        "DASHBOARD_CACHE_TTL": _env_float(environ, "DASHBOARD_CACHE_TTL", 30),
+        # Seconds a pending order holds its stock before the sweeper cancels it
+        "STOCK_RESERVATION_TTL": _env_int(environ, "STOCK_RESERVATION_TTL", 86400),
+        "ORDER_BATCH_MAX_LINES": _env_int(environ, "ORDER_BATCH_MAX_LINES", 1000),
+        # Closed orders older than this many days are moved to the archive tables
+        "ARCHIVE_AFTER_DAYS": _env_int(environ, "ARCHIVE_AFTER_DAYS", 90),
+        "ARCHIVE_BATCH_SIZE": _env_int(environ, "ARCHIVE_BATCH_SIZE", 1000),
+        # How often each worker's search index picks up changes made by other workers
+        "SEARCH_REFRESH_INTERVAL": _env_float(environ, "SEARCH_REFRESH_INTERVAL", 5),
+        # Seconds re-read behind the newest updated_at, for writes that commit late
+        "SEARCH_REFRESH_OVERLAP": _env_float(environ, "SEARCH_REFRESH_OVERLAP", 60),
+        # Delivery ETA estimates (eta.py)
+        "ETA_MIN_SAMPLES": _env_int(environ, "ETA_MIN_SAMPLES", 5),
+        "ETA_HANDLING_HOURS": _env_float(environ, "ETA_HANDLING_HOURS", 24),
+        # Replenishment planner (flask plan-replenishment)
+        "PLANNER_HISTORY_DAYS": _env_int(environ, "PLANNER_HISTORY_DAYS", 730),
+        "PLANNER_LEAD_TIME_DAYS": _env_float(environ, "PLANNER_LEAD_TIME_DAYS", 7),
+        "PLANNER_COVERAGE_DAYS": _env_float(environ, "PLANNER_COVERAGE_DAYS", 30),
+        "PLANNER_SERVICE_Z": _env_float(environ, "PLANNER_SERVICE_Z", 1.65),
+        # Supplier scoring (flask score-suppliers): deliveries are counted once
+        # they are this many hours old, so late carrier events are not missed
+        "SUPPLIER_SCORE_DELIVERY_LAG_HOURS": _env_float(environ, "SUPPLIER_SCORE_DELIVERY_LAG_HOURS", 24),
+        # Transaction ids skipped by a run (not committed yet) are looked for
+        # again by later runs for this many hours
+        "SUPPLIER_SCORE_COMMIT_WINDOW_HOURS": _env_float(environ, "SUPPLIER_SCORE_COMMIT_WINDOW_HOURS", 24),
+        "SUPPLIER_SCORE_PRIOR_WEIGHT": _env_float(environ, "SUPPLIER_SCORE_PRIOR_WEIGHT", 10),
+        "EXPORT_BATCH_SIZE": _env_int(environ, "EXPORT_BATCH_SIZE", 10000),
+        "CARRIER_FEED_BATCH_SIZE": _env_int(environ, "CARRIER_FEED_BATCH_SIZE", 1000),
+        # Rows per transaction for the product/stock import (flask import-products)
+        "PRODUCT_IMPORT_BATCH_SIZE": _env_int(environ, "PRODUCT_IMPORT_BATCH_SIZE", 1000),
+        # Public pages (index, rates, ...) cached in memory, see page_cache.py
+        "PUBLIC_PAGE_CACHE_TTL": _env_float(environ, "PUBLIC_PAGE_CACHE_TTL", 300),
+        "PUBLIC_PAGE_CACHE_CONTROL": environ.get("PUBLIC_PAGE_CACHE_CONTROL", "public, max-age=300"),
+        # Public tracking lookup: server-side cache and client Cache-Control max-age
+        "TRACKING_CACHE_TTL": _env_float(environ, "TRACKING_CACHE_TTL", 60),
+        "TRACKING_NEGATIVE_CACHE_TTL": _env_float(environ, "TRACKING_NEGATIVE_CACHE_TTL", 10),
+        "TRACKING_MAX_AGE": _env_int(environ, "TRACKING_MAX_AGE", 30),
+        # Live shipment stream: "local" reaches clients of the same process,
+        # "database" relays through the shipment_events table to every worker
+        "SHIPMENT_EVENTS_BACKEND": environ.get("SHIPMENT_EVENTS_BACKEND", "local"),
+        "SHIPMENT_EVENTS_BUFFER": _env_int(environ, "SHIPMENT_EVENTS_BUFFER", 10000),
+        "SHIPMENT_EVENTS_POLL_INTERVAL": _env_float(environ, "SHIPMENT_EVENTS_POLL_INTERVAL", 1),
+        "SHIPMENT_EVENTS_RETENTION": _env_int(environ, "SHIPMENT_EVENTS_RETENTION", 3600),
+        # How long the database poller keeps asking for row ids it skipped, in
+        # case their transaction commits late
+        "SHIPMENT_EVENTS_COMMIT_WINDOW": _env_float(environ, "SHIPMENT_EVENTS_COMMIT_WINDOW", 30),
+        "SHIPMENT_STREAM_HEARTBEAT": _env_float(environ, "SHIPMENT_STREAM_HEARTBEAT", 15),
+        "SHIPMENT_STREAM_MAX_SECONDS": _env_float(environ, "SHIPMENT_STREAM_MAX_SECONDS", 300),
+        "SHIPMENT_LONG_POLL_TIMEOUT": _env_float(environ, "SHIPMENT_LONG_POLL_TIMEOUT", 25),
+        # Outbox worker for order confirmation side effects: "thread" runs it
+        # inside each web process, "off" leaves it to `flask outbox-worker`
+        "OUTBOX_WORKER": environ.get("OUTBOX_WORKER", "thread"),
+        "OUTBOX_BATCH_SIZE": _env_int(environ, "OUTBOX_BATCH_SIZE", 100),
+        "OUTBOX_POLL_INTERVAL": _env_float(environ, "OUTBOX_POLL_INTERVAL", 2),
+        "OUTBOX_MAX_ATTEMPTS": _env_int(environ, "OUTBOX_MAX_ATTEMPTS", 5),
+        # Opt-in request/SQL profiling, see profiling.py
+        "SQL_PROFILING": _env_bool(environ, "SQL_PROFILING"),
+        "SQL_BUDGET_STATEMENTS": _env_int(environ, "SQL_BUDGET_STATEMENTS", 50),
+        "SQL_BUDGET_MS": _env_float(environ, "SQL_BUDGET_MS", 500),
+        "SQL_REPEAT_THRESHOLD": _env_int(environ, "SQL_REPEAT_THRESHOLD", 5),
+    }
+
+# Nama argumen timeout koneksi berbeda per driver
+_CONNECT_TIMEOUT_ARGS = {
+    'psycopg2': 'connect_timeout',
+    'mysqlconnector': 'connection_timeout',
+    'pymysql': 'connect_timeout',
+    'mysqldb': 'connect_timeout',
+}
+
+def engine_options(config, uri=None):
+    """SQLAlchemy create_engine() options for ``uri`` derived from the DB_* settings."""
+    url = make_url(uri or config["SQLALCHEMY_DATABASE_URI"])
+    options = {
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_timeout=config["DB_POOL_TIMEOUT"],
+        )
+    timeout_arg = _CONNECT_TIMEOUT_ARGS.get(url.get_driver_name())
+    if timeout_arg and config.get("DB_CONNECT_TIMEOUT"):
+        options["connect_args"] = {timeout_arg: config["DB_CONNECT_TIMEOUT"]}
+    return options
@@ -1,6 +1,9 @@
-from app import app, db
+from app import create_app
+from migrations import migrate
+
+app = create_app()
 
 with app.app_context():
     print("Creating database tables...")
-    db.create_all()
-    print("Database tables created successfully.")
\ No newline at end of file
+    migrate()
+    print("Database tables created successfully.")
\ No newline at end of file
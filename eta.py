@@ -0,0 +1,167 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Order, Shipment, ArchivedOrder, ArchivedShipment, DeliveryTimeStats
+
+# There is no route/destination in the schema, so estimates are keyed by
+# supplier and package type, falling back to package type only and then to
+# all deliveries when a key has too few samples.
+ANY_SUPPLIER = 0
+ANY_PACKAGE = ''
+# Without enough data: handling + transit = the old fixed 7 days
+DEFAULT_HANDLING_HOURS = 24
+DEFAULT_TRANSIT_HOURS = 7 * 24 - DEFAULT_HANDLING_HOURS
+INTERVAL_Z = 1.2816  # 10th-90th percentile under a normal approximation
+
+class TransitStats:
+    """Count, sum and sum of squares of transit times in hours."""
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+
+    def add(self, hours):
+        self.count += 1
+        self.total += hours
+        self.total_sq += hours * hours
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def interval(self, z=INTERVAL_Z):
+        mean, spread = self.mean, z * self.std
+        return max(mean - spread, 0.0), mean + spread
+
+def transit_hours(shipped_date, actual_delivery):
+    return (actual_delivery - shipped_date).total_seconds() / 3600.0
+
+def stats_keys(supplier_id, package_type):
+    """Keys updated for one delivery, most specific first."""
+    package_type = package_type or ANY_PACKAGE
+    return [(supplier_id or ANY_SUPPLIER, package_type), (ANY_SUPPLIER, package_type), (ANY_SUPPLIER, ANY_PACKAGE)]
+
+def _bump(supplier_id, package_type, count, total, total_sq):
+    table = DeliveryTimeStats.__table__
+    bump = update(table).where(
+        table.c.supplier_id == supplier_id,
+        table.c.package_type == package_type
+    ).values(
+        sample_count=table.c.sample_count + count,
+        total_hours=table.c.total_hours + total,
+        total_sq_hours=table.c.total_sq_hours + total_sq
+    )
+    if db.session.execute(bump).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(
+                supplier_id=supplier_id, package_type=package_type,
+                sample_count=count, total_hours=total, total_sq_hours=total_sq
+            ))
+    except IntegrityError:
+        # Transaksi lain membuat baris statistik lebih dulu
+        db.session.execute(bump)
+
+def record_delivery_times(samples):
+    """Fold ``(supplier_id, package_type, hours)`` samples into the stats in the caller's transaction.
+
+    Constant work per sample: the counters are incremented in place, history
+    is never rescanned.
+    """
+    totals = defaultdict(TransitStats)
+    for supplier_id, package_type, hours in samples:
+        if hours is None or hours < 0:
+            continue
+        for key in stats_keys(supplier_id, package_type):
+            totals[key].add(hours)
+    for (supplier_id, package_type), stats in totals.items():
+        _bump(supplier_id, package_type, stats.count, stats.total, stats.total_sq)
+
+def record_delivery(shipment, order):
+    if shipment.shipped_date and shipment.actual_delivery:
+        record_delivery_times([(order.supplier_id, order.package_type,
+                                transit_hours(shipment.shipped_date, shipment.actual_delivery))])
+
+def load_stats(supplier_id, package_type):
+    """The most specific stats with enough samples for this supplier and package type, or None."""
+    keys = stats_keys(supplier_id, package_type)
+    T = DeliveryTimeStats
+    rows = {
+        (row.supplier_id, row.package_type): row
+        for row in db.session.execute(select(T).where(
+            T.supplier_id.in_({key[0] for key in keys}),
+            T.package_type.in_({key[1] for key in keys})
+        )).scalars()
+    }
+    min_samples = current_app.config.get('ETA_MIN_SAMPLES', 5)
+    for key in keys:
+        row = rows.get(key)
+        if row is not None and row.sample_count >= min_samples:
+            return TransitStats(row.sample_count, row.total_hours, row.total_sq_hours)
+    return None
+
+def estimate_transit(supplier_id, package_type):
+    """(mean, low, high) transit hours for a new shipment."""
+    stats = load_stats(supplier_id, package_type)
+    if stats is None:
+        return DEFAULT_TRANSIT_HOURS, DEFAULT_TRANSIT_HOURS, DEFAULT_TRANSIT_HOURS
+    low, high = stats.interval()
+    return stats.mean, low, high
+
+def estimate_delivery(supplier_id, package_type, confirmed_at=None, shipped_date=None, transit=None):
+    """(eta, earliest, latest) for a shipment confirmed or shipped at the given time.
+
+    Before the shipment leaves, ETA_HANDLING_HOURS are added for pickup.
+    Pass ``transit`` (from estimate_transit) to avoid the stats lookup.
+    """
+    mean, low, high = transit or estimate_transit(supplier_id, package_type)
+    if shipped_date is not None:
+        start = shipped_date
+    else:
+        start = confirmed_at + timedelta(hours=current_app.config.get('ETA_HANDLING_HOURS', DEFAULT_HANDLING_HOURS))
+    return start + timedelta(hours=mean), start + timedelta(hours=low), start + timedelta(hours=high)
+
+def rebuild_delivery_stats(batch_size=10000):
+    """Recompute every stats row from delivered shipments, live and archived; returns the sample count."""
+    totals = defaultdict(TransitStats)
+    samples = 0
+    for shipment, order in ((Shipment, Order), (ArchivedShipment, ArchivedOrder)):
+        rows = db.session.execute(
+            select(order.supplier_id, order.package_type, shipment.shipped_date, shipment.actual_delivery)
+            .join(order, order.id == shipment.order_id)
+            .where(shipment.status == 'delivered', shipment.shipped_date.isnot(None),
+                   shipment.actual_delivery.isnot(None))
+            .execution_options(yield_per=batch_size)
+        )
+        for supplier_id, package_type, shipped_date, actual_delivery in rows:
+            hours = transit_hours(shipped_date, actual_delivery)
+            if hours < 0:
+                continue
+            samples += 1
+            for key in stats_keys(supplier_id, package_type):
+                totals[key].add(hours)
+
+    table = DeliveryTimeStats.__table__
+    db.session.execute(delete(table))
+    values = [
+        {'supplier_id': supplier_id, 'package_type': package_type, 'sample_count': stats.count,
+         'total_hours': stats.total, 'total_sq_hours': stats.total_sq}
+        for (supplier_id, package_type), stats in totals.items()
+    ]
+    for i in range(0, len(values), batch_size):
+        db.session.execute(insert(table), values[i:i + batch_size])
+    db.session.commit()
+    return samples
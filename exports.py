@@ -0,0 +1,158 @@
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import Date, DateTime, Float, Integer, select
+from app import db
+from models import Order, Shipment, FinancialRecord, SupplierTransaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for Parquet exports
+    pa = pq = None
+
+DEFAULT_BATCH_SIZE = 10000
+
+# name -> (model, date column used for start/end, column used for ?status=)
+EXPORTS = {
+    'orders': (Order, Order.order_date, Order.status),
+    'shipments': (Shipment, Shipment.shipped_date, Shipment.status),
+    'financial_records': (FinancialRecord, FinancialRecord.transaction_date, FinancialRecord.transaction_type),
+    'supplier_transactions': (SupplierTransaction, SupplierTransaction.transaction_date, None),
+}
+
+class ExportError(ValueError):
+    pass
+
+def parquet_available():
+    return pq is not None
+
+def _columns(name):
+    return list(EXPORTS[name][0].__table__.columns)
+
+def export_query(name, start=None, end=None, status=None):
+    """SELECT for an export; ``start``/``end`` are inclusive dates."""
+    if name not in EXPORTS:
+        raise ExportError(f'Unknown export {name!r}')
+    model, date_column, status_column = EXPORTS[name]
+    query = select(*_columns(name)).order_by(model.id)
+    if start is not None:
+        query = query.where(date_column >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.where(date_column < datetime.combine(end + timedelta(days=1), time.min))
+    if status:
+        if status_column is None:
+            raise ExportError(f'{name} cannot be filtered by status')
+        query = query.where(status_column == status)
+    return query
+
+def iter_batches(name, start=None, end=None, status=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of row tuples, ``batch_size`` at a time.
+
+    Pages through the export by id (``WHERE id > :last ORDER BY id LIMIT n``)
+    instead of streaming one SELECT: the default mysql-connector driver has
+    no server-side cursors and buffers a whole result, so only separate
+    queries keep memory bounded by one batch whatever the size of the table.
+    """
+    query = export_query(name, start, end, status)
+    model = EXPORTS[name][0]
+    id_position = [column.name for column in _columns(name)].index(model.id.name)
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(model.id > last_id)
+        rows = db.session.execute(page.limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][id_position]
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_csv(name, start=None, end=None, status=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield an export as CSV text, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in _columns(name)])
+    for rows in iter_batches(name, start, end, status, batch_size):
+        writer.writerows([[_csv_value(value) for value in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header saja bila tidak ada baris
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _arrow_type(column):
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def arrow_schema(name):
+    return pa.schema([pa.field(column.name, _arrow_type(column)) for column in _columns(name)])
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last drain()."""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def write_parquet(name, sink, start=None, end=None, status=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Write an export to ``sink`` (path or file object) as Parquet, one row group per batch.
+
+    Yields the running row count after every row group, so callers can
+    forward the bytes written so far or report progress.
+    """
+    if pq is None:
+        raise ExportError('Parquet export needs the optional pyarrow package')
+    schema = arrow_schema(name)
+    rows_written = 0
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for rows in iter_batches(name, start, end, status, batch_size):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            rows_written += len(rows)
+            yield rows_written
+
+def iter_parquet(name, start=None, end=None, status=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield an export as Parquet bytes, flushed after every row group."""
+    sink = _ChunkSink()
+    for _ in write_parquet(name, sink, start, end, status, batch_size):
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    yield sink.drain()
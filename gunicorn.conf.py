@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# gevent (pip install .[realtime]) is the default when installed: each open
+# /shipments/stream or long-poll is a greenlet, so thousands of idle clients
+# fit in a few workers. Without it gthread is used, which keeps heartbeating
+# while long streamed exports run (the sync worker would be killed by the
+# timeout above). The live shipment endpoints must not be served by sync or
+# gthread workers, where each client would hold a whole worker; there they
+# answer 204 and pages fall back to reloading (see shipment_events).
+try:
+    import gevent  # noqa: F401
+    default_worker_class = "gevent"
+except ImportError:
+    default_worker_class = "gthread"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", default_worker_class)
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+if worker_class == "gevent":
+    # Patch before the app is preloaded so its locks and conditions yield to other greenlets
+    from gevent import monkey
+    monkey.patch_all()
+
+# Import the app once in the master and fork workers from it
+preload_app = True
+
+def post_fork(server, worker):
+    # Jangan pakai koneksi pool milik master di worker hasil fork
+    import replicas
+    from app import db
+    from main import app
+    with app.app_context():
+        db.engine.dispose(close=False)
+    replicas.dispose(app)
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from cache import TTLCache
+from models import IdentityInvalidation, User
+from profiling import register_metrics_provider
+
+logger = logging.getLogger(__name__)
+
+# Columns whose change must reach every request of that user right away
+INVALIDATING_COLUMNS = ('role', 'password_hash', 'username', 'email')
+
+identity_cache = TTLCache(maxsize=10000, ttl=60)
+register_metrics_provider('identity_cache', identity_cache.stats)
+
+class UserIdentity(UserMixin):
+    """What Flask-Login keeps as ``current_user``: the user's id, username, email and role.
+
+    Not an ORM object, so it never lazy-loads; views that need the full row
+    load it with ``db.session.get(User, current_user.id)``.
+    """
+
+    __slots__ = ('id', 'username', 'email', 'role')
+
+    def __init__(self, id, username, email, role):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+
+    def __repr__(self):
+        return f'<UserIdentity {self.id} {self.username!r} {self.role}>'
+
+def load_identity(user_id):
+    """The identity for ``user_id``, from the per-process cache or one primary-key lookup.
+
+    A change made by another worker is seen within
+    IDENTITY_INVALIDATION_POLL seconds (see _apply_invalidations);
+    IDENTITY_CACHE_TTL = 0 turns the cache off.
+    """
+    ttl = current_app.config.get('IDENTITY_CACHE_TTL', 60)
+    if ttl > 0:
+        _apply_invalidations(ttl)
+        identity = identity_cache.get(user_id)
+        if identity is not None:
+            return identity
+    row = db.session.execute(
+        select(User.id, User.username, User.email, User.role).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    identity = UserIdentity(*row)
+    if ttl > 0:
+        identity_cache.set(user_id, identity, ttl=ttl)
+    return identity
+
+def invalidate_identity(user_id):
+    identity_cache.pop(user_id)
+
+# Invalidation: ORM changes to users are collected per session during flush
+# and dropped from this worker's cache once the transaction commits. The same
+# flush writes an identity_invalidations row, which the other workers poll.
+# Bulk UPDATEs bypass these events and must call record_invalidations()
+# before committing.
+
+def record_invalidations(user_ids, session=None):
+    """Queue cache invalidations for ``user_ids`` in the caller's transaction, for every worker."""
+    session = session or db.session
+    now = datetime.utcnow()
+    for user_id in user_ids:
+        session.add(IdentityInvalidation(user_id=user_id, created_at=now))
+        session.info.setdefault('changed_user_ids', set()).add(user_id)
+
+def _changed(user):
+    state = inspect(user)
+    return any(state.attrs[name].history.has_changes() for name in INVALIDATING_COLUMNS)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault('changed_user_ids', set())
+    new_ids = {
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, User) and obj.id is not None and obj.id not in changed
+        and (obj in session.deleted or _changed(obj))
+    }
+    if new_ids:
+        record_invalidations(new_ids, session)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_identity(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+# Polling other workers' invalidations. Rows are read by time rather than by
+# id, over a window of twice the TTL: a row whose transaction commits late
+# is still seen, and anything older can no longer be in a cache. Row ids
+# already applied are remembered so each user is dropped once per row.
+
+_poll_lock = threading.Lock()
+_poll = {'at': 0.0, 'applied': set(), 'pruned_at': 0.0}
+
+def _apply_invalidations(ttl):
+    interval = current_app.config.get('IDENTITY_INVALIDATION_POLL', 1)
+    if time.monotonic() - _poll['at'] < interval or not _poll_lock.acquire(blocking=False):
+        return
+    try:
+        if time.monotonic() - _poll['at'] < interval:
+            return
+        since = datetime.utcnow() - timedelta(seconds=2 * ttl)
+        # Koneksi sendiri: jangan ikut transaksi atau replica milik request
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(IdentityInvalidation.id, IdentityInvalidation.user_id)
+                .where(IdentityInvalidation.created_at >= since)
+            ).all()
+        for row_id, user_id in rows:
+            if row_id not in _poll['applied']:
+                invalidate_identity(user_id)
+        _poll['applied'] = {row_id for row_id, _ in rows}
+        _poll['at'] = time.monotonic()
+        if time.monotonic() - _poll['pruned_at'] >= 3600:
+            with db.engine.begin() as connection:
+                connection.execute(delete(IdentityInvalidation).where(IdentityInvalidation.created_at < since))
+            _poll['pruned_at'] = time.monotonic()
+    except Exception:
+        # A failed poll must not break logins; the TTL still bounds staleness
+        logger.exception('Reading identity invalidations failed')
+        _poll['at'] = time.monotonic()
+    finally:
+        _poll_lock.release()
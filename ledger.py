@@ -0,0 +1,139 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, insert, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import FinancialRecord, FinancialRollup, ArchivedFinancialRecord
+
+def _month_start(day):
+    return day.replace(day=1)
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _periods(when):
+    day = when.date()
+    return [('day', day), ('month', _month_start(day))]
+
+def _bump_rollup(period, period_start, transaction_type, amount, count=1):
+    table = FinancialRollup.__table__
+    bump = update(table).where(
+        table.c.period == period,
+        table.c.period_start == period_start,
+        table.c.transaction_type == transaction_type
+    ).values(
+        total_amount=table.c.total_amount + amount,
+        record_count=table.c.record_count + count
+    )
+    if db.session.execute(bump).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(
+                period=period,
+                period_start=period_start,
+                transaction_type=transaction_type,
+                total_amount=amount,
+                record_count=count
+            ))
+    except IntegrityError:
+        # Transaksi lain membuat baris rollup lebih dulu
+        db.session.execute(bump)
+
+def record_financial_transaction(record):
+    """Add ``record`` to the session and fold it into the day/month rollups.
+
+    The rollup rows are updated in the caller's transaction, so they commit or
+    roll back together with the record itself.
+    """
+    record_financial_transactions([record])
+
+def record_financial_transactions(records):
+    """Batch version of record_financial_transaction: one rollup update per period touched."""
+    totals = defaultdict(lambda: [0.0, 0])
+    for record in records:
+        if record.transaction_date is None:
+            record.transaction_date = datetime.utcnow()
+        db.session.add(record)
+        for period, period_start in _periods(record.transaction_date):
+            entry = totals[(period, period_start, record.transaction_type)]
+            entry[0] += record.amount
+            entry[1] += 1
+    for (period, period_start, transaction_type), (amount, count) in totals.items():
+        _bump_rollup(period, period_start, transaction_type, amount, count)
+
+def ledger_summary(start=None, end=None):
+    """Income/expense totals for the inclusive date range [start, end].
+
+    Whole months inside the range are read from the monthly rollups and the
+    partial months at either edge from the daily ones, so the cost depends on
+    the length of the range and not on the number of records. With no bounds
+    this sums the monthly rollups, i.e. the whole ledger.
+    """
+    R = FinancialRollup
+    month_clauses = [R.period == 'month']
+    day_ranges = []
+    month_from = month_until = None
+    if start is not None:
+        month_from = start if start.day == 1 else _next_month(start)
+        month_clauses.append(R.period_start >= month_from)
+        day_ranges.append(and_(R.period_start >= start, R.period_start < month_from))
+    if end is not None:
+        # Exclusive upper bound of the whole months covered by the range
+        month_until = _next_month(end) if _next_month(end) - timedelta(days=1) == end else _month_start(end)
+        month_clauses.append(R.period_start < month_until)
+        day_ranges.append(and_(R.period_start >= month_until, R.period_start <= end))
+
+    if month_from is not None and month_until is not None and month_from >= month_until:
+        # The range does not cover a whole month; read daily rollups only
+        condition = and_(R.period == 'day', R.period_start >= start, R.period_start <= end)
+    elif day_ranges:
+        condition = or_(and_(*month_clauses), and_(R.period == 'day', or_(*day_ranges)))
+    else:
+        condition = and_(*month_clauses)
+
+    rows = db.session.execute(
+        select(R.transaction_type, func.sum(R.total_amount), func.sum(R.record_count))
+        .where(condition)
+        .group_by(R.transaction_type)
+    ).all()
+    totals = {transaction_type: (amount or 0, count or 0) for transaction_type, amount, count in rows}
+    income, income_count = totals.get('income', (0, 0))
+    expenses, expense_count = totals.get('expense', (0, 0))
+    return {
+        'total_income': income,
+        'total_expenses': expenses,
+        'net_profit': income - expenses,
+        'record_count': income_count + expense_count,
+    }
+
+def rebuild_rollups(batch_size=10000):
+    """Recompute every rollup from ``financial_records`` and its archive; returns the number of rollup rows."""
+    totals = defaultdict(lambda: [0.0, 0])
+    # Archived records stay in the rollups
+    rows = db.session.execute(
+        union_all(
+            select(FinancialRecord.transaction_type, FinancialRecord.transaction_date, FinancialRecord.amount),
+            select(ArchivedFinancialRecord.transaction_type, ArchivedFinancialRecord.transaction_date,
+                   ArchivedFinancialRecord.amount)
+        ).execution_options(yield_per=batch_size)
+    )
+    for transaction_type, transaction_date, amount in rows:
+        if transaction_date is None:
+            continue
+        for period, period_start in _periods(transaction_date):
+            entry = totals[(period, period_start, transaction_type)]
+            entry[0] += amount
+            entry[1] += 1
+
+    table = FinancialRollup.__table__
+    db.session.execute(delete(table))
+    values = [
+        {'period': period, 'period_start': period_start, 'transaction_type': transaction_type,
+         'total_amount': amount, 'record_count': count}
+        for (period, period_start, transaction_type), (amount, count) in totals.items()
+    ]
+    for i in range(0, len(values), batch_size):
+        db.session.execute(insert(table), values[i:i + batch_size])
+    db.session.commit()
+    return len(values)
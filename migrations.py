@@ -0,0 +1,174 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text, func, inspect, select, text
+from app import db
+
+# Versioned schema migrations. Each one is a function taking a connection,
+# listed in MIGRATIONS under a version number that never changes once
+# released; applied versions are recorded in schema_migrations. Migrations
+# spell out their tables, columns and indexes instead of reading models.py,
+# except the baseline, which creates whatever tables are missing (what
+# `create-db` used to do). A fresh database therefore already has the
+# latest schema after the baseline, so every later migration must check
+# what exists before changing it.
+#
+# To change the schema: edit models.py and append a migration making the
+# same change to an existing database.
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def _create_indexes(connection, indexes):
+    """Create the ``(table, name, columns)`` indexes that do not exist yet."""
+    inspector = inspect(connection)
+    for table_name, name, columns in indexes:
+        if not inspector.has_table(table_name):
+            continue
+        if name in {index['name'] for index in inspector.get_indexes(table_name)}:
+            continue
+        table = Table(table_name, MetaData(), autoload_with=connection)
+        Index(name, *[table.c[column] for column in columns]).create(connection)
+
+def _baseline(connection):
+    # Databases set up with `create-db` before migrations existed already
+    # have these tables; only the missing ones are created.
+    db.metadata.create_all(connection, checkfirst=True)
+
+def _access_path_indexes(connection):
+    _create_indexes(connection, [
+        ('orders', 'ix_orders_user_date', ('user_id', 'order_date', 'id')),
+        ('orders', 'ix_orders_order_date', ('order_date', 'id')),
+        ('orders', 'ix_orders_status', ('status',)),
+        ('orders', 'ix_orders_product_date', ('product_id', 'order_date')),
+        ('orders', 'ix_orders_supplier_id', ('supplier_id',)),
+        ('shipments', 'ix_shipments_order_status', ('order_id', 'status')),
+        ('shipments', 'ix_shipments_status', ('status',)),
+        ('shipments', 'ix_shipments_actual_delivery', ('actual_delivery',)),
+        ('shipments_archive', 'ix_shipments_archive_actual_delivery', ('actual_delivery',)),
+        ('financial_records', 'ix_financial_records_type_date', ('transaction_type', 'transaction_date')),
+        ('financial_records', 'ix_financial_records_date', ('transaction_date', 'id')),
+        ('financial_records', 'ix_financial_records_order_id', ('order_id',)),
+        ('supplier_transactions', 'ix_supplier_transactions_order_id', ('order_id',)),
+        ('supplier_transactions', 'ix_supplier_transactions_supplier_id', ('supplier_id',)),
+        ('products', 'ix_products_updated_at', ('updated_at',)),
+        ('outbox_events', 'ix_outbox_events_claim', ('status', 'available_at')),
+        ('stock_reservations', 'ix_stock_reservations_product', ('product_id', 'status')),
+    ])
+
+def _shipment_events(connection):
+    if inspect(connection).has_table('shipment_events'):
+        return
+    table = Table(
+        'shipment_events', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, nullable=False),
+        Column('payload', Text, nullable=False),
+        Column('created_at', DateTime, index=True),
+    )
+    table.create(connection)
+
+def _product_name_index(connection):
+    _create_indexes(connection, [('products', 'ix_products_name', ('name',))])
+
+def _keyset_dates_not_null(connection):
+    # Keyset paging compares (date, id) tuples, which never match a NULL date
+    inspector = inspect(connection)
+    for table_name, column in (('orders', 'order_date'), ('financial_records', 'transaction_date'),
+                               ('orders_archive', 'order_date'),
+                               ('financial_records_archive', 'transaction_date')):
+        if not inspector.has_table(table_name):
+            continue
+        table = Table(table_name, MetaData(), autoload_with=connection)
+        # Rows without a date sort as the oldest ones
+        earliest = connection.execute(select(func.min(table.c[column]))).scalar() or datetime.utcnow()
+        connection.execute(table.update().where(table.c[column].is_(None)).values({column: earliest}))
+        if not table.c[column].nullable:
+            continue
+        # SQLite cannot change a column's nullability in place; the backfill is enough there
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN {column} SET NOT NULL'))
+        elif connection.dialect.name == 'mysql':
+            connection.execute(text(f'ALTER TABLE {table_name} MODIFY {column} DATETIME NOT NULL'))
+
+def _shipment_last_event_at(connection):
+    inspector = inspect(connection)
+    for table_name in ('shipments', 'shipments_archive'):
+        if not inspector.has_table(table_name):
+            continue
+        if 'last_event_at' in {column['name'] for column in inspector.get_columns(table_name)}:
+            continue
+        column_type = DateTime().compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN last_event_at {column_type}'))
+        table = Table(table_name, MetaData(), autoload_with=connection)
+        # Best known time of the latest change for shipments that existed before
+        connection.execute(table.update().values(
+            last_event_at=func.coalesce(table.c.actual_delivery, table.c.shipped_date)
+        ))
+
+def _identity_invalidations(connection):
+    if inspect(connection).has_table('identity_invalidations'):
+        return
+    Table(
+        'identity_invalidations', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, nullable=False),
+        Column('created_at', DateTime, index=True),
+    ).create(connection)
+
+def _score_run_pending_ids(connection):
+    inspector = inspect(connection)
+    if not inspector.has_table('supplier_score_runs'):
+        return
+    if 'pending_transaction_ids' in {column['name'] for column in inspector.get_columns('supplier_score_runs')}:
+        return
+    column_type = Text().compile(dialect=connection.dialect)
+    connection.execute(text(f'ALTER TABLE supplier_score_runs ADD COLUMN pending_transaction_ids {column_type}'))
+
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'indexes for the dashboard, listing and background job queries', _access_path_indexes),
+    (3, 'shipment_events table for the live shipment stream', _shipment_events),
+    (4, 'index on product names for the product import', _product_name_index),
+    (5, 'order_date and transaction_date NOT NULL for keyset paging', _keyset_dates_not_null),
+    (6, 'shipments.last_event_at for out-of-order carrier events', _shipment_last_event_at),
+    (7, 'identity_invalidations table for the per-worker identity cache', _identity_invalidations),
+    (8, 'supplier_score_runs.pending_transaction_ids for late-committing transactions', _score_run_pending_ids),
+]
+
+def applied_versions(connection):
+    if not inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def pending_migrations():
+    with db.engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+def migrate(target=None, echo=print):
+    """Apply every migration up to ``target`` (default: all) that has not run yet; returns the versions applied.
+
+    Each migration and its schema_migrations row commit together, so a
+    failed migration is retried on the next run. On MySQL DDL commits
+    implicitly, which is why migrations check what already exists before
+    changing it.
+    """
+    schema_migrations.create(db.engine, checkfirst=True)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with db.engine.begin() as connection:
+            if version in applied_versions(connection):
+                continue
+            echo(f'Applying migration {version}: {description}')
+            upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+    return applied
@@ -21,6 +21,10 @@ class User(UserMixin, db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_updated_at', 'updated_at'),  # search index refresh
+        db.Index('ix_products_name', 'name'),  # product import matches rows by name
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -45,6 +49,13 @@ class Supplier(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_user_date', 'user_id', 'order_date', 'id'),
+        db.Index('ix_orders_order_date', 'order_date', 'id'),
+        db.Index('ix_orders_status', 'status'),
+        db.Index('ix_orders_product_date', 'product_id', 'order_date'),
+        db.Index('ix_orders_supplier_id', 'supplier_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -56,7 +67,7 @@ class Order(db.Model):
     logistics_cost = db.Column(db.Float, default=0.0)
     package_type = db.Column(db.String(20))  # 'basic', 'standard', 'premium'
     status = db.Column(db.String(20), default='pending')  # 'pending', 'confirmed', 'shipped', 'delivered'
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    order_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     user = db.relationship('User', backref='orders')
     supplier = db.relationship('Supplier', backref='orders')
@@ -64,6 +75,10 @@ class Order(db.Model):
 
 class Shipment(db.Model):
     __tablename__ = 'shipments'
+    __table_args__ = (
+        db.Index('ix_shipments_order_status', 'order_id', 'status'),
+        db.Index('ix_shipments_status', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -71,25 +86,35 @@ class Shipment(db.Model):
     status = db.Column(db.String(30), default='preparing')  # 'preparing', 'in_transit', 'delivered'
     shipped_date = db.Column(db.DateTime)
     estimated_delivery = db.Column(db.DateTime)
-    actual_delivery = db.Column(db.DateTime)
+    actual_delivery = db.Column(db.DateTime, index=True)
     current_location = db.Column(db.String(100))
+    last_event_at = db.Column(db.DateTime)  # time of the latest status change, from the carrier feed or the admin form
     
     order = db.relationship('Order', backref='shipments')
 
 class FinancialRecord(db.Model):
     __tablename__ = 'financial_records'
+    __table_args__ = (
+        db.Index('ix_financial_records_type_date', 'transaction_type', 'transaction_date'),
+        db.Index('ix_financial_records_date', 'transaction_date', 'id'),
+        db.Index('ix_financial_records_order_id', 'order_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     transaction_type = db.Column(db.String(20), nullable=False)  # 'income', 'expense'
     amount = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text)
-    transaction_date = db.Column(db.DateTime, default=datetime.utcnow)
+    transaction_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     order = db.relationship('Order', backref='financial_records')
 
 class SupplierTransaction(db.Model):
     __tablename__ = 'supplier_transactions'
+    __table_args__ = (
+        db.Index('ix_supplier_transactions_order_id', 'order_id'),
+        db.Index('ix_supplier_transactions_supplier_id', 'supplier_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=False)
@@ -99,3 +124,172 @@ class SupplierTransaction(db.Model):
     
     supplier = db.relationship('Supplier', backref='transactions')
     order = db.relationship('Order', backref='supplier_transactions')
+
+class FinancialRollup(db.Model):
+    __tablename__ = 'financial_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start', 'transaction_type', name='uq_financial_rollup'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)  # 'day', 'month'
+    period_start = db.Column(db.Date, nullable=False)
+    transaction_type = db.Column(db.String(20), nullable=False)  # 'income', 'expense'
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+class UserOrderStats(db.Model):
+    __tablename__ = 'user_order_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_orders = db.Column(db.Integer, nullable=False, default=0)
+    pending_orders = db.Column(db.Integer, nullable=False, default=0)
+    in_transit = db.Column(db.Integer, nullable=False, default=0)  # shipments with status 'in_transit'
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        db.UniqueConstraint('event_type', 'order_id', name='uq_outbox_event_order'),
+        db.Index('ix_outbox_events_claim', 'status', 'available_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # 'order_confirmed'
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    payload = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+class StockReservation(db.Model):
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservation_expiry', 'status', 'expires_at'),
+        db.Index('ix_stock_reservations_product', 'product_id', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, unique=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')  # 'held', 'committed', 'released', 'expired'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+    
+    order = db.relationship('Order', backref=db.backref('reservation', uselist=False))
+
+class ReplenishmentSuggestion(db.Model):
+    __tablename__ = 'replenishment_suggestions'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), index=True)  # preferred supplier, set when reordering
+    demand_rate = db.Column(db.Float, nullable=False, default=0.0)  # units per day
+    demand_std = db.Column(db.Float, nullable=False, default=0.0)
+    safety_stock = db.Column(db.Float, nullable=False, default=0.0)
+    reorder_point = db.Column(db.Float, nullable=False)
+    stock_quantity = db.Column(db.Integer, nullable=False)  # stock when the plan ran
+    suggested_quantity = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    product = db.relationship('Product', backref=db.backref('replenishment', uselist=False))
+    supplier = db.relationship('Supplier')
+
+class DeliveryTimeStats(db.Model):
+    __tablename__ = 'delivery_time_stats'
+    
+    # supplier_id 0 / package_type '' aggregate over all suppliers / package types
+    supplier_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    package_type = db.Column(db.String(20), primary_key=True)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    total_hours = db.Column(db.Float, nullable=False, default=0.0)  # sum of (actual_delivery - shipped_date)
+    total_sq_hours = db.Column(db.Float, nullable=False, default=0.0)  # sum of squares
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SupplierScore(db.Model):
+    __tablename__ = 'supplier_scores'
+    
+    # Running totals maintained by scoring.py, plus the metrics derived from them
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), primary_key=True, autoincrement=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)  # supplier transactions, one per confirmed order
+    spend_total = db.Column(db.Float, nullable=False, default=0.0)
+    delivered_count = db.Column(db.Integer, nullable=False, default=0)
+    on_time_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)  # on_time + late = deliveries with an estimate
+    lead_time_hours_total = db.Column(db.Float, nullable=False, default=0.0)  # sum of (actual_delivery - order_date)
+    on_time_rate = db.Column(db.Float)
+    avg_lead_time_hours = db.Column(db.Float)
+    rating = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    supplier = db.relationship('Supplier', backref=db.backref('score', uselist=False))
+
+class SupplierScoreRun(db.Model):
+    __tablename__ = 'supplier_score_runs'
+    
+    # The latest run is the watermark for the next one
+    id = db.Column(db.Integer, primary_key=True)
+    last_transaction_id = db.Column(db.Integer, nullable=False, default=0)
+    pending_transaction_ids = db.Column(db.Text)  # JSON {id: first missed}, ids below the watermark not committed yet
+    delivered_until = db.Column(db.DateTime)
+    suppliers_scored = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float)
+    ran_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ShipmentEvent(db.Model):
+    __tablename__ = 'shipment_events'
+    
+    # Shipment changes relayed between workers by the "database" backend of shipment_events.py
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # order owner, for per-user filtering
+    payload = db.Column(db.Text, nullable=False)  # JSON delta
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class IdentityInvalidation(db.Model):
+    __tablename__ = 'identity_invalidations'
+    
+    # Users whose cached identity (identity.py) every worker must drop
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# Archive tables (see archive.py): same columns as the live tables plus
+# archived_at, without foreign keys so the live rows can be deleted
+
+def _archive_table(table, indexed=()):
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False,
+                  nullable=column.nullable, index=column.name in indexed)
+        for column in table.columns
+    ]
+    return db.Table(f'{table.name}_archive', *columns, db.Column('archived_at', db.DateTime))
+
+class ArchivedOrder(db.Model):
+    __table__ = _archive_table(Order.__table__, indexed=('user_id', 'order_date'))
+    archived = True
+    
+    user = db.relationship('User', primaryjoin='foreign(ArchivedOrder.user_id) == User.id', viewonly=True)
+    supplier = db.relationship('Supplier', primaryjoin='foreign(ArchivedOrder.supplier_id) == Supplier.id', viewonly=True)
+    product = db.relationship('Product', primaryjoin='foreign(ArchivedOrder.product_id) == Product.id', viewonly=True)
+
+class ArchivedShipment(db.Model):
+    __table__ = _archive_table(Shipment.__table__, indexed=('order_id', 'tracking_number', 'actual_delivery'))
+    archived = True
+    
+    order = db.relationship('ArchivedOrder', primaryjoin='foreign(ArchivedShipment.order_id) == ArchivedOrder.id', viewonly=True)
+
+class ArchivedFinancialRecord(db.Model):
+    __table__ = _archive_table(FinancialRecord.__table__, indexed=('order_id', 'transaction_date'))
+    archived = True
+    
+    order = db.relationship('ArchivedOrder', primaryjoin='foreign(ArchivedFinancialRecord.order_id) == ArchivedOrder.id', viewonly=True)
+
+class ArchivedSupplierTransaction(db.Model):
+    __table__ = _archive_table(SupplierTransaction.__table__, indexed=('order_id', 'supplier_id'))
+    archived = True
+    
+    supplier = db.relationship('Supplier', primaryjoin='foreign(ArchivedSupplierTransaction.supplier_id) == Supplier.id', viewonly=True)
+    order = db.relationship('ArchivedOrder', primaryjoin='foreign(ArchivedSupplierTransaction.order_id) == ArchivedOrder.id', viewonly=True)
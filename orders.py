@@ -0,0 +1,128 @@
+import math
+from sqlalchemy import Float, cast, literal, null, select, union_all
+from app import db
+from models import Product, Supplier, Order
+from pricing import LOGISTICS_COSTS, order_costs
+from stats import bump_user_stats, invalidate_dashboard_stats
+from stock import add_reservations, reserve_many
+
+# Range of the INTEGER columns the values end up in
+MAX_INT = 2 ** 31 - 1
+
+def _as_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, str):
+        value = value.strip()
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError  # 1e999 in JSON is inf, int() would raise OverflowError
+    result = int(value)
+    if isinstance(value, float) and value != result:
+        raise ValueError
+    if abs(result) > MAX_INT:
+        raise ValueError
+    return result
+
+def _parse_line(line):
+    """Validate one order line; returns (fields, errors)."""
+    if not isinstance(line, dict):
+        return None, ['line must be an object']
+    errors = []
+    fields = {}
+    for key in ('supplier_id', 'product_id', 'quantity'):
+        if line.get(key) is None:
+            errors.append(f'{key} is required')
+            continue
+        try:
+            fields[key] = _as_int(line[key])
+        except (TypeError, ValueError):
+            errors.append(f'{key} must be an integer')
+    if 'quantity' in fields and fields['quantity'] <= 0:
+        errors.append('quantity must be positive')
+    package_type = line.get('package_type')
+    if package_type not in LOGISTICS_COSTS:
+        errors.append(f"package_type must be one of {', '.join(LOGISTICS_COSTS)}")
+    fields['package_type'] = package_type
+    return fields, errors
+
+def _resolve_references(product_ids, supplier_ids):
+    """Unit prices of the given products and the ids of the suppliers that exist, in one query."""
+    if not product_ids and not supplier_ids:
+        return {}, set()
+    products = select(literal('product').label('kind'), Product.id, Product.unit_price).where(
+        Product.id.in_(product_ids))
+    suppliers = select(literal('supplier').label('kind'), Supplier.id, cast(null(), Float)).where(
+        Supplier.id.in_(supplier_ids))
+    prices = {}
+    found_suppliers = set()
+    for kind, ref_id, unit_price in db.session.execute(union_all(products, suppliers)):
+        if kind == 'product':
+            prices[ref_id] = unit_price
+        else:
+            found_suppliers.add(ref_id)
+    return prices, found_suppliers
+
+def create_orders_batch(user_id, lines):
+    """Create many orders for ``user_id`` in one transaction.
+
+    Invalid lines and lines without enough stock are reported and skipped;
+    the rest are priced exactly like create_order, reserve their stock and are
+    inserted together. Returns one result per line.
+    """
+    parsed = [_parse_line(line) for line in lines]
+    product_ids = {f['product_id'] for f, errors in parsed if not errors}
+    supplier_ids = {f['supplier_id'] for f, errors in parsed if not errors}
+    prices, suppliers = _resolve_references(product_ids, supplier_ids)
+
+    results = []
+    candidates = []
+    for index, (fields, errors) in enumerate(parsed):
+        if not errors:
+            if fields['product_id'] not in prices:
+                errors.append('Product not found')
+            if fields['supplier_id'] not in suppliers:
+                errors.append('Supplier not found')
+        result = {'line': index, 'status': 'error', 'errors': errors}
+        results.append(result)
+        if not errors:
+            candidates.append((result, fields))
+
+    taken = reserve_many([(f['product_id'], f['quantity']) for _, f in candidates])
+    new_orders = []
+    for (result, fields), ok in zip(candidates, taken):
+        if not ok:
+            result['errors'].append('Insufficient stock')
+            continue
+        unit_price = prices[fields['product_id']]
+        logistics_cost, total_cost = order_costs(unit_price, fields['quantity'], fields['package_type'])
+        order = Order(
+            user_id=user_id,
+            supplier_id=fields['supplier_id'],
+            product_id=fields['product_id'],
+            quantity=fields['quantity'],
+            unit_price=unit_price,
+            total_cost=total_cost,
+            logistics_cost=logistics_cost,
+            package_type=fields['package_type']
+        )
+        new_orders.append(order)
+        del result['errors']
+        result.update(status='created', order=order)
+
+    if new_orders:
+        # Satu flush (insert batch) dan satu commit untuk semua baris valid
+        db.session.add_all(new_orders)
+        db.session.flush()
+        add_reservations(new_orders)
+        bump_user_stats(user_id, total=len(new_orders), pending=len(new_orders))
+    for result in results:
+        order = result.pop('order', None)
+        if order is not None:
+            result.update(order_id=order.id, logistics_cost=order.logistics_cost, total_cost=order.total_cost)
+    if new_orders:
+        db.session.commit()
+        invalidate_dashboard_stats()
+    else:
+        # Lepaskan lock baris produk dari UPDATE stok yang gagal
+        db.session.rollback()
+    return results
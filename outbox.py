@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import joinedload
+from app import db
+from eta import estimate_delivery, estimate_transit
+from ledger import record_financial_transactions
+from models import Order, Shipment, FinancialRecord, SupplierTransaction, OutboxEvent
+from profiling import register_metrics_provider
+from shipment_events import publish_shipment_changes, shipment_delta
+
+ORDER_CONFIRMED = 'order_confirmed'
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+_counters = {'processed_total': 0, 'failed_attempts_total': 0}
+_worker = None
+
+def new_tracking_number():
+    return f"SIMLOG{uuid.uuid4().hex[:8].upper()}"
+
+def enqueue_order_confirmed(order, confirmed_at=None):
+    """Queue the side effects of confirming ``order`` in the caller's transaction."""
+    confirmed_at = confirmed_at or datetime.utcnow()
+    db.session.add(OutboxEvent(
+        event_type=ORDER_CONFIRMED,
+        order_id=order.id,
+        payload=json.dumps({'confirmed_at': confirmed_at.isoformat()}),
+        created_at=confirmed_at,
+        available_at=confirmed_at
+    ))
+
+def notify():
+    """Wake the in-process worker after a commit that queued events."""
+    _wakeup.set()
+
+def _handle_order_confirmed(events):
+    order_ids = [event.order_id for event in events]
+    orders = {
+        order.id: order
+        for order in Order.query.options(joinedload(Order.product)).filter(Order.id.in_(order_ids))
+    }
+    # Idempotent per order: an order that already has a shipment was handled before
+    handled = set(db.session.execute(
+        select(Shipment.order_id).where(Shipment.order_id.in_(order_ids))
+    ).scalars())
+    records = []
+    shipments = []
+    transit = {}
+    for event in events:
+        order = orders.get(event.order_id)
+        if order is None:
+            raise LookupError(f'order {event.order_id} not found')
+        if order.id in handled:
+            continue
+        confirmed_at = datetime.fromisoformat(json.loads(event.payload)['confirmed_at'])
+        key = (order.supplier_id, order.package_type)
+        if key not in transit:
+            transit[key] = estimate_transit(*key)
+        estimated_delivery, _, _ = estimate_delivery(*key, confirmed_at=confirmed_at, transit=transit[key])
+        shipment = Shipment(
+            order_id=order.id,
+            tracking_number=new_tracking_number(),
+            estimated_delivery=estimated_delivery
+        )
+        db.session.add(shipment)
+        shipments.append((shipment, order))
+        records.append(FinancialRecord(
+            order_id=order.id,
+            transaction_type='income',
+            amount=order.total_cost,
+            description=f'Order payment for {order.product.name}',
+            transaction_date=confirmed_at
+        ))
+        db.session.add(SupplierTransaction(
+            supplier_id=order.supplier_id,
+            order_id=order.id,
+            amount=order.total_cost - order.logistics_cost,
+            transaction_date=confirmed_at
+        ))
+        handled.add(order.id)
+    record_financial_transactions(records)
+    if shipments:
+        db.session.flush()  # shipment ids for the live stream
+        publish_shipment_changes([
+            shipment_delta(shipment.id, order.id, order.user_id, shipment.tracking_number, 'preparing')
+            for shipment, order in shipments
+        ])
+
+HANDLERS = {
+    ORDER_CONFIRMED: _handle_order_confirmed,
+}
+
+def _claim(limit, event_ids=None):
+    query = OutboxEvent.query.filter(
+        OutboxEvent.status == 'pending',
+        OutboxEvent.available_at <= datetime.utcnow()
+    )
+    if event_ids is not None:
+        query = query.filter(OutboxEvent.id.in_(event_ids))
+    # SKIP LOCKED lets several workers drain the queue without blocking each other
+    return query.order_by(OutboxEvent.id).limit(limit).with_for_update(skip_locked=True).all()
+
+def _handle(events):
+    by_type = {}
+    for event in events:
+        by_type.setdefault(event.event_type, []).append(event)
+    for event_type, batch in by_type.items():
+        HANDLERS[event_type](batch)
+    now = datetime.utcnow()
+    for event in events:
+        event.status = 'done'
+        event.attempts += 1
+        event.processed_at = now
+        event.last_error = None
+
+def _record_failure(event_id, error, max_attempts):
+    event = db.session.get(OutboxEvent, event_id)
+    event.attempts += 1
+    event.last_error = str(error)[:2000]
+    if event.attempts >= max_attempts:
+        event.status = 'failed'
+    else:
+        # Exponential backoff: 2, 4, 8, ... seconds
+        event.available_at = datetime.utcnow() + timedelta(seconds=2 ** event.attempts)
+    db.session.commit()
+    _counters['failed_attempts_total'] += 1
+    logger.warning('Outbox event %s failed (attempt %s): %s', event_id, event.attempts, error)
+
+def process_batch(batch_size=100, max_attempts=5):
+    """Handle up to ``batch_size`` due events in one transaction; returns how many were claimed.
+
+    If the batch fails, its events are retried one by one so that a single bad
+    event cannot hold back the rest.
+    """
+    events = _claim(batch_size)
+    if not events:
+        db.session.rollback()
+        return 0
+    event_ids = [event.id for event in events]
+    try:
+        _handle(events)
+        db.session.commit()
+        _counters['processed_total'] += len(event_ids)
+        return len(event_ids)
+    except Exception:
+        db.session.rollback()
+    for event_id in event_ids:
+        try:
+            claimed = _claim(1, [event_id])
+            if not claimed:
+                db.session.rollback()
+                continue
+            _handle(claimed)
+            db.session.commit()
+            _counters['processed_total'] += 1
+        except Exception as exc:
+            db.session.rollback()
+            _record_failure(event_id, exc, max_attempts)
+    return len(event_ids)
+
+def drain(app, batch_size=None):
+    """Process due events until the queue is empty; returns the number handled."""
+    batch_size = batch_size or app.config.get('OUTBOX_BATCH_SIZE', 100)
+    max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', 5)
+    total = 0
+    while True:
+        with app.app_context():
+            claimed = process_batch(batch_size, max_attempts)
+        total += claimed
+        if claimed < batch_size:
+            return total
+
+class OutboxWorker(threading.Thread):
+    """Background thread that drains the outbox, woken by notify() or every poll interval."""
+
+    def __init__(self, app):
+        super().__init__(name='outbox-worker', daemon=True)
+        self.app = app
+        self.poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', 2)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                processed = drain(self.app)
+            except Exception:
+                logger.exception('Outbox worker iteration failed')
+                processed = 0
+            if not processed:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+def outbox_metrics():
+    pending, failed, oldest = db.session.execute(
+        select(
+            func.coalesce(func.sum(case((OutboxEvent.status == 'pending', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((OutboxEvent.status == 'failed', 1), else_=0)), 0),
+            func.min(case((OutboxEvent.status == 'pending', OutboxEvent.created_at)))
+        ).where(OutboxEvent.status != 'done')
+    ).one()
+    return {
+        'queue_depth': pending,
+        'failed': failed,
+        'lag_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        **_counters,
+    }
+
+def _start_worker(app):
+    global _worker
+    # Setelah fork (gunicorn) thread milik master tidak ikut, jadi cek per proses
+    if _worker is None or _worker[0] != os.getpid() or not _worker[1].is_alive():
+        thread = OutboxWorker(app)
+        thread.start()
+        _worker = (os.getpid(), thread)
+
+def init_app(app):
+    register_metrics_provider('outbox', outbox_metrics)
+    if app.config.get('OUTBOX_WORKER') == 'thread':
+        app.before_request(lambda: _start_worker(app))
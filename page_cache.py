@@ -0,0 +1,120 @@
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app, make_response, request
+from profiling import register_metrics_provider
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+class CachedPage:
+    """One rendered page held in memory with its precompressed variants."""
+
+    def __init__(self, body, version, last_modified, mimetype):
+        self.body = body
+        self.version = version
+        self.last_modified = last_modified
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.encoded = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(body, quality=11)
+        self.built_at = time.monotonic()
+
+    def variant(self, accept_encodings):
+        """(encoding or None, body) of the smallest variant the client accepts."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and accept_encodings[encoding]:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+_pages = {}
+_lock = threading.Lock()
+_counters = {'hits_total': 0, 'misses_total': 0, 'not_modified_total': 0, 'bypassed_total': 0}
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def page_cache_stats():
+    with _lock:
+        pages = list(_pages.values())
+    return {
+        'pages': len(pages),
+        'bytes': sum(len(page.body) + sum(map(len, page.encoded.values())) for page in pages),
+        'brotli': brotli is not None,
+        **_counters,
+    }
+
+register_metrics_provider('page_cache', page_cache_stats)
+
+def invalidate_pages():
+    with _lock:
+        _pages.clear()
+
+def _build(view, args, kwargs, version, previous):
+    response = make_response(view(*args, **kwargs))
+    if response.status_code != 200 or response.direct_passthrough:
+        return None, response
+    body = response.get_data()
+    # Isi sama (mis. hanya TTL habis): pertahankan Last-Modified agar validator klien tetap berlaku
+    if previous is not None and previous.body == body:
+        last_modified = previous.last_modified
+    else:
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+    return CachedPage(body, version, last_modified, response.mimetype), response
+
+def cached_page(version=None):
+    """Serve a public GET view from memory with validators and precompressed bodies.
+
+    The rendered page is kept per path for PUBLIC_PAGE_CACHE_TTL seconds and
+    rebuilt early when ``version()`` (e.g. a fingerprint of the data it
+    shows) changes. Responses carry an ETag per encoding, Last-Modified and
+    PUBLIC_PAGE_CACHE_CONTROL, and conditional requests get a 304 without
+    rendering. Requests with a session cookie bypass the cache, since the
+    page may then show the logged-in user.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            cookies = (config.get('SESSION_COOKIE_NAME', 'session'),
+                       config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+            if any(name in request.cookies for name in cookies):
+                _count('bypassed_total')
+                return view(*args, **kwargs)
+            key = request.path
+            current = version() if version is not None else None
+            with _lock:
+                page = _pages.get(key)
+            if (page is None or page.version != current
+                    or time.monotonic() - page.built_at >= config.get('PUBLIC_PAGE_CACHE_TTL', 300)):
+                _count('misses_total')
+                rebuilt, response = _build(view, args, kwargs, current, page)
+                if rebuilt is None:
+                    return response
+                page = rebuilt
+                with _lock:
+                    _pages[key] = page
+            else:
+                _count('hits_total')
+
+            encoding, body = page.variant(request.accept_encodings)
+            response = current_app.response_class(body, mimetype=page.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.set_etag(f'{page.etag}-{encoding}' if encoding else page.etag)
+            response.last_modified = page.last_modified
+            response.headers['Cache-Control'] = config.get('PUBLIC_PAGE_CACHE_CONTROL', 'public, max-age=300')
+            response.vary.update(('Accept-Encoding', 'Cookie'))
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                _count('not_modified_total')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+import base64
+import json
+from datetime import datetime
+from flask import abort, request
+from sqlalchemy import DateTime, Integer, and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class KeysetPage:
+    """One page of a keyset-paginated listing plus the cursors around it."""
+
+    def __init__(self, items, page_size, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(values):
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Turn a cursor back into column values; returns None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        decoded = []
+        for col, v in zip(columns, values):
+            # Key columns are NOT NULL, so a null or mistyped value means the cursor was edited
+            if isinstance(col.type, DateTime):
+                if not isinstance(v, str):
+                    return None
+                v = datetime.fromisoformat(v)
+            elif isinstance(col.type, Integer) and (not isinstance(v, int) or isinstance(v, bool)):
+                return None
+            decoded.append(v)
+        return decoded
+    except (ValueError, TypeError):
+        return None
+
+def page_args():
+    """Read cursor, direction and page size from the query string."""
+    try:
+        page_size = int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    direction = 'prev' if request.args.get('dir') == 'prev' else 'next'
+    return request.args.get('cursor'), direction, page_size
+
+def _after(columns, values, descending):
+    # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y), spelled out so every backend can use the index
+    clauses = []
+    for i, col in enumerate(columns):
+        cmp = col < values[i] if descending else col > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], cmp))
+    return or_(*clauses)
+
+def _page_rows(query, columns, values, backwards, limit):
+    if values is not None:
+        query = query.filter(_after(columns, values, descending=not backwards))
+    if backwards:
+        query = query.order_by(*[col.asc() for col in columns])
+    else:
+        query = query.order_by(*[col.desc() for col in columns])
+    return query.limit(limit).all()
+
+def keyset_paginate(query, columns, cursor=None, direction='next', page_size=DEFAULT_PAGE_SIZE):
+    """Paginate ``query`` newest-first on ``columns`` (the last one must be unique, e.g. the id).
+
+    Each page costs one indexed range scan of ``page_size + 1`` rows regardless of
+    how deep into the listing it is.
+    """
+    return keyset_paginate_union([(query, columns)], cursor, direction, page_size)
+
+def keyset_paginate_union(sources, cursor=None, direction='next', page_size=DEFAULT_PAGE_SIZE):
+    """keyset_paginate over several ``(query, columns)`` sources listed as one.
+
+    Used to show a live table together with its archive: every source is read
+    with the same cursor and the pages are merged. The key columns must have
+    the same names in every source and the last one must be unique across them.
+    A cursor that does not decode to values of the key columns' types aborts
+    with 400.
+    """
+    columns = sources[0][1]
+    values = None
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if values is None:
+            abort(400, 'Invalid page cursor')
+    backwards = direction == 'prev' and values is not None
+
+    rows = []
+    for query, source_columns in sources:
+        rows.extend(_page_rows(query, source_columns, values, backwards, page_size + 1))
+    if len(sources) > 1:
+        keys = [col.key for col in columns]
+        rows.sort(key=lambda item: [getattr(item, key) for key in keys], reverse=not backwards)
+
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    if backwards:
+        items.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, values is not None
+
+    def cursor_for(item):
+        return encode_cursor([getattr(item, col.key) for col in columns])
+
+    return KeysetPage(
+        items,
+        page_size,
+        next_cursor=cursor_for(items[-1]) if items and has_next else None,
+        prev_cursor=cursor_for(items[0]) if items and has_prev else None,
+    )
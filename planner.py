@@ -0,0 +1,187 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import delete, func, insert, select, union_all
+from app import db
+from models import Product, Supplier, Order, ArchivedOrder, ReplenishmentSuggestion
+
+DEFAULT_HISTORY_DAYS = 730
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_COVERAGE_DAYS = 30
+DEFAULT_SERVICE_Z = 1.65  # ~95% service level
+
+def _order_lines(start, product_ids=None):
+    # Archived orders are part of the demand history too
+    def lines(model):
+        query = select(
+            model.product_id, model.supplier_id, model.quantity, model.order_date,
+            func.date(model.order_date).label('day')
+        ).where(model.order_date >= start, model.status != 'cancelled')
+        if product_ids is not None:
+            query = query.where(model.product_id.in_(product_ids))
+        return query
+    return union_all(lines(Order), lines(ArchivedOrder)).subquery()
+
+def _demand_history(start):
+    """(product ids, sum of daily demand, sum of squared daily demand, first order time), aggregated in the database."""
+    lines = _order_lines(start)
+    daily = (
+        select(lines.c.product_id, func.sum(lines.c.quantity).label('qty'),
+               func.min(lines.c.order_date).label('first_order'))
+        .group_by(lines.c.product_id, lines.c.day)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(daily.c.product_id, func.sum(daily.c.qty), func.sum(daily.c.qty * daily.c.qty),
+               func.min(daily.c.first_order))
+        .group_by(daily.c.product_id)
+    ).all()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0, 'datetime64[s]')
+    ids, sums, squares, first_orders = zip(*rows)
+    return (np.array(ids, np.int64), np.array(sums, float), np.array(squares, float),
+            np.array(first_orders, 'datetime64[s]'))
+
+def _lookup(ids, keys):
+    """Positions of ``keys`` in the sorted array ``ids`` and a mask of the keys found."""
+    positions = np.searchsorted(ids, keys)
+    clipped = np.minimum(positions, max(len(ids) - 1, 0))
+    found = (positions < len(ids)) & (ids[clipped] == keys) if len(ids) else np.zeros(len(keys), bool)
+    return positions, found
+
+def _preferred_suppliers(start, product_ids):
+    """Supplier with the largest ordered quantity for each of ``product_ids`` (a list)."""
+    lines = _order_lines(start, product_ids)
+    totals = (
+        select(
+            lines.c.product_id, lines.c.supplier_id,
+            # Peringkat dihitung di database agar hanya satu baris per produk yang dikirim
+            func.row_number().over(
+                partition_by=lines.c.product_id,
+                order_by=(func.sum(lines.c.quantity).desc(), lines.c.supplier_id)
+            ).label('rank')
+        )
+        .group_by(lines.c.product_id, lines.c.supplier_id)
+        .subquery()
+    )
+    return db.session.execute(
+        select(totals.c.product_id, totals.c.supplier_id).where(totals.c.rank == 1)
+    ).all()
+
+def plan_replenishment(history_days=DEFAULT_HISTORY_DAYS, lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+                       coverage_days=DEFAULT_COVERAGE_DAYS, service_z=DEFAULT_SERVICE_Z,
+                       batch_size=10000, now=None):
+    """Recompute replenishment_suggestions for every product.
+
+    Daily demand per product comes from one aggregate query over the order
+    history; the statistics are then computed for all products at once:
+
+    - demand rate and standard deviation of daily demand (days without
+      orders count as zero) over the days the product has existed: the
+      window, or less for products created or first ordered within it
+    - safety stock = z * std * sqrt(lead time)
+    - reorder point = rate * lead time + safety stock
+    - when stock is at or below the reorder point, order enough to cover
+      ``coverage_days`` on top of the reorder point
+
+    Products without history fall back to their min_stock_level. Returns a
+    summary of the run.
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    start = now - timedelta(days=history_days)
+
+    products = db.session.execute(
+        select(Product.id, Product.stock_quantity, Product.min_stock_level, Product.created_at).order_by(Product.id)
+    ).all()
+    if products:
+        ids, stock, min_level, created = (np.array(column) for column in zip(*products))
+        created = created.astype('datetime64[s]')  # None -> NaT
+    else:
+        ids = stock = min_level = np.empty(0, np.int64)
+        created = np.empty(0, 'datetime64[s]')
+    stock = np.nan_to_num(stock.astype(float))
+    min_level = np.nan_to_num(min_level.astype(float))
+
+    history_ids, sums, squares, first_orders = _demand_history(start)
+    positions, known = _lookup(ids, history_ids)
+    total = np.zeros(len(ids))
+    total_sq = np.zeros(len(ids))
+    first_seen = created.copy()
+    total[positions[known]] = sums[known]
+    total_sq[positions[known]] = squares[known]
+    # Orders may predate created_at (e.g. imported catalogs): the earlier of the two counts
+    first_seen[positions[known]] = np.fmin(first_seen[positions[known]], first_orders[known])
+
+    # Days observed per product, at least one so a product created today is not divided by zero
+    age_days = (np.datetime64(now, 's') - first_seen).astype(float) / 86400.0
+    days = np.clip(np.where(np.isnat(first_seen), history_days, age_days), 1.0, history_days)
+    rate = total / days
+    std = np.sqrt(np.maximum(total_sq / days - rate ** 2, 0.0))
+    safety = service_z * std * np.sqrt(lead_time_days)
+    has_history = total > 0
+    reorder_point = np.where(has_history, rate * lead_time_days + safety, min_level)
+    target = reorder_point + rate * coverage_days
+    suggested = np.where(stock <= reorder_point, np.ceil(np.maximum(target - stock, 0.0)), 0).astype(np.int64)
+    # Only products that need ordering get a supplier, which keeps this query small
+    preferred = np.zeros(len(ids), np.int64)
+    reorder_ids = ids[suggested > 0].tolist()
+    for i in range(0, len(reorder_ids), batch_size):
+        rows = _preferred_suppliers(start, reorder_ids[i:i + batch_size])
+        if rows:
+            product_ids, supplier_ids = (np.array(column, np.int64) for column in zip(*rows))
+            positions, found = _lookup(ids, product_ids)
+            preferred[positions[found]] = supplier_ids[found]
+
+    table = ReplenishmentSuggestion.__table__
+    db.session.execute(delete(table))
+    columns = (ids.tolist(), preferred.tolist(), rate.tolist(), std.tolist(), safety.tolist(),
+               reorder_point.tolist(), stock.astype(np.int64).tolist(), suggested.tolist())
+    rows = [
+        {'product_id': product_id, 'supplier_id': supplier_id or None, 'demand_rate': demand_rate,
+         'demand_std': demand_std, 'safety_stock': safety_stock, 'reorder_point': point,
+         'stock_quantity': on_hand, 'suggested_quantity': quantity, 'computed_at': now}
+        for product_id, supplier_id, demand_rate, demand_std, safety_stock, point, on_hand, quantity in zip(*columns)
+    ]
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(insert(table), rows[i:i + batch_size])
+    db.session.commit()
+
+    return {
+        'products': len(ids),
+        'with_history': int(has_history.sum()),
+        'below_reorder_point': int((stock <= reorder_point).sum()),
+        'suggested_units': int(suggested.sum()),
+        'suppliers': len(set(preferred[suggested > 0].tolist()) - {0}),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+# Read side used by the dashboards
+
+def low_stock_condition():
+    """Stock at or below the planned reorder point (min_stock_level until the planner has run)."""
+    return Product.stock_quantity <= func.coalesce(ReplenishmentSuggestion.reorder_point, Product.min_stock_level)
+
+def low_stock_products():
+    return (Product.query
+            .outerjoin(ReplenishmentSuggestion, ReplenishmentSuggestion.product_id == Product.id)
+            .filter(low_stock_condition())
+            .all())
+
+def suggested_purchase_orders():
+    """Suggested purchase orders grouped by preferred supplier, largest value first."""
+    R = ReplenishmentSuggestion
+    rows = db.session.execute(
+        select(R.supplier_id, Supplier.name, func.count(R.product_id), func.sum(R.suggested_quantity),
+               func.sum(R.suggested_quantity * Product.unit_price))
+        .join(Product, Product.id == R.product_id)
+        .outerjoin(Supplier, Supplier.id == R.supplier_id)
+        .where(R.suggested_quantity > 0)
+        .group_by(R.supplier_id, Supplier.name)
+        .order_by(func.sum(R.suggested_quantity * Product.unit_price).desc())
+    ).all()
+    return [
+        {'supplier_id': supplier_id, 'supplier_name': name, 'products': products,
+         'units': units, 'estimated_cost': cost or 0.0}
+        for supplier_id, name, products, units, cost in rows
+    ]
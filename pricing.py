@@ -0,0 +1,21 @@
+# Biaya logistik per jenis paket (Rupiah)
+LOGISTICS_COSTS = {'basic': 50000, 'standard': 100000, 'premium': 200000}
+DEFAULT_PACKAGE_TYPE = 'basic'
+
+def package_rates():
+    """Package types and their logistics cost, cheapest first (the public rates page)."""
+    return [{'package_type': package_type, 'cost': cost}
+            for package_type, cost in sorted(LOGISTICS_COSTS.items(), key=lambda item: item[1])]
+
+def pricing_version():
+    """Fingerprint of the pricing table; changes whenever a cost is added or changed."""
+    return hash(tuple(sorted(LOGISTICS_COSTS.items())))
+
+def logistics_cost(package_type):
+    """Logistics cost of ``package_type``; unknown types are charged as 'basic'."""
+    return LOGISTICS_COSTS.get(package_type, LOGISTICS_COSTS[DEFAULT_PACKAGE_TYPE])
+
+def order_costs(unit_price, quantity, package_type):
+    """(logistics_cost, total_cost) of an order line."""
+    cost = logistics_cost(package_type)
+    return cost, (unit_price * quantity) + cost
@@ -0,0 +1,292 @@
+import math
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+from sqlalchemy import bindparam, func, or_, select, update
+from app import db
+from models import Product, StockReservation
+from orders import MAX_INT
+from search import index_product
+from shipments import iter_feed
+from stats import invalidate_dashboard_stats
+from stock import available_after_count
+
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED = 100
+
+# One parsed line: ``fields`` holds the product columns given in the row,
+# ``on_hand`` a physical count and ``delta`` a relative adjustment (at most
+# one of the two).
+ImportRow = namedtuple('ImportRow', 'line product_id name fields on_hand delta')
+
+class RowError(ValueError):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+def _value(record, name):
+    value = record.get(name)
+    # CSV gives '' for an empty cell
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+def _int(record, name, minimum=None):
+    value = _value(record, name)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError('invalid', f'{name} must be a whole number, got {value!r}')
+    if not math.isfinite(number) or number != int(number):
+        raise RowError('invalid', f'{name} must be a whole number, got {value!r}')
+    if abs(number) > MAX_INT:
+        raise RowError('invalid', f'{name} is out of range')
+    if minimum is not None and number < minimum:
+        raise RowError('invalid', f'{name} must be at least {minimum}')
+    return int(number)
+
+def _parse_row(line, record):
+    if not isinstance(record, dict):
+        raise RowError('invalid', 'not a JSON object')
+    # The stream is decoded with errors='replace', so bytes that were not UTF-8 show up as U+FFFD
+    if any(isinstance(value, str) and '\ufffd' in value for value in record.values()):
+        raise RowError('invalid', 'not valid UTF-8')
+    product_id = _int(record, 'id', 1)
+    name = _value(record, 'name')
+    if name is not None:
+        name = str(name)
+        if len(name) > Product.name.type.length:
+            raise RowError('invalid', f'name is longer than {Product.name.type.length} characters')
+    if product_id is None and name is None:
+        raise RowError('invalid', 'id or name is required')
+
+    fields = {}
+    if name is not None:
+        fields['name'] = name
+    description = _value(record, 'description')
+    if description is not None:
+        fields['description'] = str(description)
+    price = _value(record, 'unit_price')
+    if price is not None:
+        try:
+            fields['unit_price'] = float(price)
+        except (TypeError, ValueError):
+            raise RowError('invalid', f'unit_price must be a number, got {price!r}')
+        if not math.isfinite(fields['unit_price']):
+            raise RowError('invalid', f'unit_price must be a number, got {price!r}')
+        if fields['unit_price'] < 0:
+            raise RowError('invalid', 'unit_price must not be negative')
+    min_stock_level = _int(record, 'min_stock_level', 0)
+    if min_stock_level is not None:
+        fields['min_stock_level'] = min_stock_level
+
+    on_hand = _int(record, 'stock_quantity', 0)
+    delta = _int(record, 'stock_delta')
+    if on_hand is not None and delta is not None:
+        raise RowError('invalid', 'give either stock_quantity or stock_delta, not both')
+    return ImportRow(line, product_id, name, fields, on_hand, delta)
+
+def _reject(summary, line, error):
+    summary['rejected'][error.reason] += 1
+    if len(summary['errors']) < MAX_REPORTED:
+        summary['errors'].append({'line': line, 'error': str(error)})
+
+def _report(summary, key, product):
+    summary[key + '_count'] += 1
+    if len(summary[key]) < MAX_REPORTED:
+        summary[key].append({'id': product.id, 'name': product.name, 'stock_quantity': product.stock_quantity,
+                             'min_stock_level': product.min_stock_level})
+
+_COLUMNS = (Product.id, Product.name, Product.description, Product.unit_price, Product.stock_quantity,
+            Product.min_stock_level)
+
+def _apply_chunk(rows, summary):
+    """Upsert one chunk of parsed rows in the caller's transaction; returns the products touched."""
+    ids = {row.product_id for row in rows if row.product_id is not None}
+    names = {row.name for row in rows if row.product_id is None}
+    conditions = []
+    if ids:
+        conditions.append(Product.id.in_(ids))
+    if names:
+        conditions.append(Product.name.in_(names))
+    query = select(*_COLUMNS).where(or_(*conditions))
+    if any(row.delta is not None for row in rows):
+        # Kunci baris agar stok yang dicek di bawah tetap sama sampai commit
+        query = query.with_for_update()
+    existing = {}
+    by_name = {}
+    for product in db.session.execute(query):
+        existing[product.id] = product
+        by_name.setdefault(product.name, []).append(product.id)
+
+    # Per product: the column changes, the count (on_hand) and the adjustment
+    # on top of it, folded in file order so later rows win
+    pending = {}
+    created = {}
+    for row in rows:
+        if row.product_id is not None:
+            if row.product_id not in existing:
+                _reject(summary, row.line, RowError('unknown_product', f'no product with id {row.product_id}'))
+                continue
+            key = row.product_id
+        elif row.name in created:
+            key = created[row.name]
+        elif len(by_name.get(row.name, ())) > 1:
+            _reject(summary, row.line, RowError('ambiguous_name', f'several products are named {row.name!r}, use id'))
+            continue
+        elif row.name in by_name:
+            key = by_name[row.name][0]
+        else:
+            key = created[row.name] = ('new', row.name)
+        entry = pending.get(key) or {'fields': {}, 'on_hand': None, 'delta': 0, 'lines': []}
+        if row.delta is not None:
+            base = entry['on_hand']
+            if base is None:
+                base = existing[key].stock_quantity if key in existing else 0
+            if base + entry['delta'] + row.delta < 0:
+                _reject(summary, row.line, RowError(
+                    'insufficient_stock', f'stock_delta {row.delta} would take stock below zero'))
+                continue
+            entry['delta'] += row.delta
+        elif row.on_hand is not None:
+            entry['on_hand'], entry['delta'] = row.on_hand, 0
+        pending[key] = entry
+        entry['fields'].update(row.fields)
+        entry['lines'].append(row.line)
+        summary['accepted'] += 1
+
+    now = datetime.utcnow()
+    table = Product.__table__
+    adjustments = [{'pid': key, 'qty': entry['delta']} for key, entry in pending.items()
+                   if key in existing and entry['on_hand'] is None and entry['delta']]
+    if adjustments:
+        # The guard keeps stock from going negative if orders took it since
+        # the SELECT above (only possible where it could not lock the rows).
+        # Adjustments go first so a product whose guard failed is rejected
+        # with all its rows before any of its other columns are written.
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('pid'), table.c.stock_quantity + bindparam('qty') >= 0)
+            .values(stock_quantity=table.c.stock_quantity + bindparam('qty'), updated_at=now),
+            adjustments
+        )
+        adjusted = dict(db.session.execute(
+            select(Product.id, Product.stock_quantity).where(Product.id.in_([item['pid'] for item in adjustments]))
+        ).all())
+        for item in list(adjustments):
+            if adjusted.get(item['pid']) == existing[item['pid']].stock_quantity + item['qty']:
+                continue
+            adjustments.remove(item)
+            lines = pending.pop(item['pid'])['lines']
+            summary['accepted'] -= len(lines)
+            for line in lines:
+                _reject(summary, line, RowError(
+                    'insufficient_stock', 'stock changed during the import and the stock_delta no longer fits'))
+
+    changes, counts, new_products = [], [], []
+    for key, entry in pending.items():
+        if key not in existing:
+            new_products.append(Product(stock_quantity=(entry['on_hand'] or 0) + entry['delta'], updated_at=now,
+                                        **entry['fields']))
+            continue
+        if entry['fields']:
+            changes.append({'id': key, 'updated_at': now, **entry['fields']})
+        if entry['on_hand'] is not None:
+            counts.append({'pid': key, 'on_hand': entry['on_hand'] + entry['delta']})
+
+    if changes:
+        # Kolom yang tidak ada di baris CSV dibiarkan; kelompokkan per set kolom untuk executemany
+        groups = {}
+        for change in changes:
+            groups.setdefault(tuple(sorted(change)), []).append(change)
+        for group in groups.values():
+            db.session.execute(update(Product), group)
+    if counts:
+        # Same rule as set_stock_on_hand: the count includes units held for pending orders
+        held = (
+            select(func.coalesce(func.sum(StockReservation.quantity), 0))
+            .where(StockReservation.product_id == table.c.id, StockReservation.status == 'held')
+            .scalar_subquery()
+        )
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('pid'))
+            .values(stock_quantity=available_after_count(bindparam('on_hand'), held), updated_at=now),
+            counts
+        )
+    if new_products:
+        db.session.add_all(new_products)
+        db.session.flush()
+
+    # Read the stock back: counts depend on held reservations and other
+    # writers may have moved it since the SELECT above
+    touched = [key for key in pending if key in existing] + [product.id for product in new_products]
+    after = db.session.execute(select(*_COLUMNS).where(Product.id.in_(touched))).all() if touched else []
+    for product in after:
+        before = existing.get(product.id)
+        is_low = product.stock_quantity <= product.min_stock_level
+        if before is None:
+            if is_low:
+                _report(summary, 'below_min_stock', product)
+            continue
+        was_low = before.stock_quantity <= before.min_stock_level
+        if is_low and not was_low:
+            _report(summary, 'below_min_stock', product)
+        elif was_low and not is_low:
+            _report(summary, 'restocked', product)
+
+    summary['created'] += len(new_products)
+    summary['updated'] += len(after) - len(new_products)
+    summary['stock_counts'] += len(counts)
+    summary['stock_adjustments'] += len(adjustments)
+    return after
+
+def import_products(stream, fmt='csv', batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+    """Create or update products and their stock from a CSV or JSONL text ``stream``.
+
+    Each row names a product by ``id`` or, failing that, by ``name`` (a new
+    product is created when no product has that name) and may set name,
+    description, unit_price and min_stock_level. Stock is either a counted
+    ``stock_quantity``, applied like set_stock_on_hand so units held for
+    pending orders stay reserved, or a relative ``stock_delta``.
+
+    Rows are applied ``batch_size`` at a time with executemany statements and
+    one commit per chunk; invalid rows (including ones that were not valid
+    UTF-8, when ``stream`` decodes with errors='replace') are rejected and
+    counted without stopping the import. The summary lists the products whose stock fell to
+    or below min_stock_level, or rose back above it.
+    """
+    started = time.perf_counter()
+    summary = {'rows': 0, 'accepted': 0, 'created': 0, 'updated': 0, 'stock_counts': 0, 'stock_adjustments': 0,
+               'rejected': Counter(), 'errors': [], 'below_min_stock_count': 0, 'below_min_stock': [],
+               'restocked_count': 0, 'restocked': []}
+    batch = []
+
+    def flush():
+        products = _apply_chunk(batch, summary)
+        db.session.commit()
+        for product in products:
+            index_product(product)
+        batch.clear()
+
+    for line, record in iter_feed(stream, fmt):
+        summary['rows'] += 1
+        try:
+            batch.append(_parse_row(line, record))
+        except RowError as exc:
+            _reject(summary, line, exc)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if summary['created'] or summary['updated']:
+        invalidate_dashboard_stats()
+
+    elapsed = time.perf_counter() - started
+    summary['rejected'] = dict(summary['rejected'])
+    summary['rejected_count'] = sum(summary['rejected'].values())
+    summary['seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed, 1) if elapsed else None
+    return summary
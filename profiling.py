@@ -0,0 +1,198 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOWEST_KEPT = 5
+STATEMENT_PREVIEW = 300
+
+logger = logging.getLogger(__name__)
+
+class RequestProfile:
+    """SQL activity of a single request."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest = []  # min-heap of (seconds, statement)
+        self.repeats = Counter()
+
+    def record(self, statement, seconds):
+        self.statements += 1
+        self.db_time += seconds
+        self.repeats[statement] += 1
+        entry = (seconds, statement[:STATEMENT_PREVIEW])
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def repeated(self, threshold):
+        """Statements issued at least ``threshold`` times - the usual N+1 signature."""
+        return [(stmt, n) for stmt, n in self.repeats.most_common() if n >= threshold]
+
+class EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests = 0
+        self.latency_sum = 0.0
+        self.statements = 0
+        self.db_time = 0.0
+        self.max_statements = 0
+        self.n_plus_one = 0
+        self.over_budget = 0
+        self.slowest = []
+
+    def add(self, profile, latency, repeated, over_budget):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.requests += 1
+        self.latency_sum += latency
+        self.statements += profile.statements
+        self.db_time += profile.db_time
+        self.max_statements = max(self.max_statements, profile.statements)
+        self.n_plus_one += 1 if repeated else 0
+        self.over_budget += 1 if over_budget else 0
+        for entry in profile.slowest:
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, entry)
+            elif entry[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def to_dict(self):
+        cumulative = []
+        running = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), self.buckets):
+            running += n
+            cumulative.append({'le': bound if bound != float('inf') else '+Inf', 'count': running})
+        return {
+            'requests': self.requests,
+            'latency_sum_seconds': self.latency_sum,
+            'latency_buckets': cumulative,
+            'statements_total': self.statements,
+            'statements_per_request': self.statements / self.requests if self.requests else 0,
+            'max_statements': self.max_statements,
+            'db_seconds_total': self.db_time,
+            'n_plus_one_requests': self.n_plus_one,
+            'over_budget_requests': self.over_budget,
+            'slowest_statements': [
+                {'seconds': seconds, 'statement': statement}
+                for seconds, statement in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+_lock = threading.Lock()
+_endpoints = {}
+_providers = {}
+
+def register_metrics_provider(name, provider):
+    """Expose ``provider()`` (a dict of numbers) under ``name`` on the metrics endpoint."""
+    _providers[name] = provider
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context():
+        profile = g.get('sql_profile')
+        if profile is not None:
+            profile.record(statement, elapsed)
+
+def _start_request():
+    # Unmatched URLs (404s, scanners) share one label so the registry stays bounded
+    g.sql_profile = RequestProfile(request.endpoint or '<unmatched>')
+
+def _finish_request(app):
+    def finish(exc=None):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return
+        latency = time.perf_counter() - profile.started
+        repeated = profile.repeated(app.config.get('SQL_REPEAT_THRESHOLD', 5))
+        budget_statements = app.config.get('SQL_BUDGET_STATEMENTS', 50)
+        budget_ms = app.config.get('SQL_BUDGET_MS', 500)
+        over_budget = profile.statements > budget_statements or profile.db_time * 1000 > budget_ms
+        if over_budget or repeated:
+            logger.warning(
+                '%s %s: %d statements, %.1f ms in DB, %.1f ms total%s',
+                request.method, request.path, profile.statements, profile.db_time * 1000, latency * 1000,
+                ''.join(f'\n  repeated x{n}: {stmt[:STATEMENT_PREVIEW]}' for stmt, n in repeated[:3])
+            )
+        with _lock:
+            stats = _endpoints.setdefault(profile.endpoint, EndpointStats())
+            stats.add(profile, latency, repeated, over_budget)
+    return finish
+
+def init_app(app):
+    """Hook SQL and request timing into ``app`` when SQL_PROFILING is enabled."""
+    if not app.config.get('SQL_PROFILING'):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request(app))
+
+def metrics_snapshot():
+    with _lock:
+        endpoints = {name: stats.to_dict() for name, stats in sorted(_endpoints.items())}
+    return {
+        'endpoints': endpoints,
+        **{name: provider() for name, provider in sorted(_providers.items())},
+    }
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def prometheus_text():
+    """Render the metrics in the Prometheus text exposition format."""
+    snapshot = metrics_snapshot()
+    lines = [
+        '# HELP simlog_request_duration_seconds Request latency per endpoint.',
+        '# TYPE simlog_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in snapshot['endpoints'].items():
+        label = _label(endpoint)
+        for bucket in stats['latency_buckets']:
+            lines.append(f'simlog_request_duration_seconds_bucket{{endpoint="{label}",le="{bucket["le"]}"}} {bucket["count"]}')
+        lines.append(f'simlog_request_duration_seconds_sum{{endpoint="{label}"}} {stats["latency_sum_seconds"]}')
+        lines.append(f'simlog_request_duration_seconds_count{{endpoint="{label}"}} {stats["requests"]}')
+    counters = [
+        ('sql_statements_total', 'statements_total', 'SQL statements issued.'),
+        ('sql_seconds_total', 'db_seconds_total', 'Time spent executing SQL.'),
+        ('n_plus_one_requests_total', 'n_plus_one_requests', 'Requests with repeated statements.'),
+        ('over_budget_requests_total', 'over_budget_requests', 'Requests over the SQL budget.'),
+    ]
+    for metric, key, help_text in counters:
+        lines.append(f'# HELP simlog_{metric} {help_text}')
+        lines.append(f'# TYPE simlog_{metric} counter')
+        for endpoint, stats in snapshot['endpoints'].items():
+            lines.append(f'simlog_{metric}{{endpoint="{_label(endpoint)}"}} {stats[key]}')
+    for name in sorted(_providers):
+        for key, value in snapshot[name].items():
+            if isinstance(value, (int, float)):
+                # Providers name their monotonic counters *_total, so rate() handles worker restarts
+                kind = 'counter' if key.endswith('_total') else 'gauge'
+                lines.append(f'# TYPE simlog_{name}_{key} {kind}')
+                lines.append(f'simlog_{name}_{key} {int(value) if isinstance(value, bool) else value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,110 @@
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+from config import engine_options
+
+logger = logging.getLogger(__name__)
+
+class ReplicaSet:
+    """Round-robin over read-replica engines, skipping ones that fail a health check."""
+
+    def __init__(self, engines, health_interval=10):
+        self.engines = engines
+        self.health_interval = health_interval
+        self._cycle = itertools.cycle(engines)
+        self._health = {}  # engine -> (healthy, checked_at)
+        self._lock = threading.Lock()
+
+    def _is_healthy(self, engine):
+        healthy, checked_at = self._health.get(engine, (True, None))
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < self.health_interval:
+            return healthy
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            healthy = True
+        except Exception as exc:
+            if self._health.get(engine, (True, None))[0]:
+                logger.warning('Read replica %s unavailable, using primary: %s', engine.url, exc)
+            healthy = False
+        self._health[engine] = (healthy, now)
+        return healthy
+
+    def pick(self):
+        """Next healthy replica engine, or None when all of them are down."""
+        with self._lock:
+            candidates = [next(self._cycle) for _ in self.engines]
+        for engine in candidates:
+            if self._is_healthy(engine):
+                return engine
+        return None
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+def _replica_set():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('simlog_replicas')
+
+def _is_write(clause):
+    return clause is not None and getattr(clause, 'is_dml', False)
+
+class RoutingSession(Session):
+    """Session that sends reads in read-only requests to a replica.
+
+    Writes (flushes and INSERT/UPDATE/DELETE statements) always go to the
+    primary, and once a request has written, the rest of it stays there too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g.db_wrote = True
+            elif g.get('db_read_only') and not g.get('db_wrote'):
+                engine = g.get('db_replica')
+                if engine is None:
+                    replicas = _replica_set()
+                    engine = replicas.pick() if replicas else None
+                    # Satu request memakai satu replica agar bacaannya konsisten
+                    g.db_replica = engine or False
+                if engine:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def use_replica(view):
+    """Let a read-only view read from a replica, unless this client wrote recently."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if session.get('db_primary_until', 0) < time.time():
+            g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapped
+
+def _remember_writes(response):
+    # Read-your-writes: requests right after a write (e.g. the redirect that
+    # follows a POST) read from the primary until replicas have caught up
+    sticky = current_app.config.get('REPLICA_STICKY_SECONDS', 0)
+    if g.get('db_wrote') and sticky:
+        session['db_primary_until'] = time.time() + sticky
+    return response
+
+def init_app(app):
+    urls = app.config.get('DATABASE_REPLICA_URLS') or []
+    if not urls:
+        return
+    engines = [create_engine(url, **engine_options(app.config, url)) for url in urls]
+    app.extensions['simlog_replicas'] = ReplicaSet(engines, app.config.get('REPLICA_HEALTH_INTERVAL', 10))
+    app.after_request(_remember_writes)
+
+def dispose(app):
+    replicas = app.extensions.get('simlog_replicas')
+    if replicas:
+        replicas.dispose()
@@ -1,42 +1,118 @@
-import uuid
-from datetime import datetime, timedelta
-from flask import render_template, request, redirect, url_for, flash, session
+import io
+from datetime import date
+from flask import (render_template, request, redirect, url_for, flash, session, jsonify, Response,
+                   current_app, make_response, stream_with_context)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from app import app, db
-from models import User, Product, Supplier, Order, Shipment, FinancialRecord, SupplierTransaction
+from sqlalchemy.orm import contains_eager, joinedload
+import profiling
+from app import db
+from models import (User, Product, Supplier, Order, Shipment, FinancialRecord, ArchivedOrder, ArchivedShipment,
+                    ArchivedFinancialRecord)
+from exports import EXPORTS, ExportError, iter_csv, iter_parquet, parquet_available
+from identity import load_identity
+from ledger import ledger_summary
+from orders import create_orders_batch
+from outbox import enqueue_order_confirmed, notify as notify_outbox
+from page_cache import cached_page
+from pagination import keyset_paginate, keyset_paginate_union, page_args
+from planner import low_stock_products as planned_low_stock, suggested_purchase_orders
+from pricing import order_costs, package_rates, pricing_version
+from product_import import import_products
+from replicas import use_replica
+from scoring import SORTS as SUPPLIER_SORTS, sorted_suppliers
+from search import catalog, index_product, index_supplier
+from shipment_events import can_hold_connections, get_broker, iter_sse, wait_for_changes
+from shipments import ingest_carrier_feed, invalidate_tracking, tracking_snapshot, update_shipment
+from stats import (admin_dashboard_stats, invalidate_dashboard_stats, user_dashboard_stats,
+                   bump_user_stats, order_status_changed)
+from stock import (InsufficientStock, cancel_order as release_order, commit_reservation, reserve_stock,
+                   set_stock_on_hand)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Routes are collected here and registered on the app by init_app()
+_routes = []
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+def init_app(app):
+    login_manager.init_app(app)
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Snapshot ringan dari cache, bukan baris ORM penuh
+    return load_identity(int(user_id))
 
-# Landing Page Routes
-@app.route('/')
+# Landing Page Routes (rendered once and served from memory, see page_cache.py)
+@route('/')
+@cached_page()
 def index():
     return render_template('index.html')
 
-@app.route('/company-profile')
+@route('/company-profile')
+@cached_page()
 def company_profile():
     return render_template('company_profile.html')
 
-@app.route('/services')
+@route('/services')
+@cached_page()
 def services():
     return render_template('services.html')
 
-@app.route('/rates')
+@route('/rates')
+@cached_page(version=pricing_version)
 def rates():
-    return render_template('rates.html')
+    # Tarif yang sama dengan yang dipakai create_order
+    return render_template('rates.html', rates=package_rates())
 
-@app.route('/contact')
+@route('/contact')
+@cached_page()
 def contact():
     return render_template('contact.html')
 
+# Public shipment tracking
+def _tracking_response(snapshot, body):
+    response = make_response(body)
+    response.set_etag(snapshot['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('TRACKING_MAX_AGE', 30)
+    return response.make_conditional(request)
+
+@route('/track')
+@route('/track/<tracking_number>')
+def track_shipment(tracking_number=None):
+    tracking_number = tracking_number or request.args.get('tracking_number', '')
+    if not tracking_number:
+        return render_template('tracking.html', shipment=None, tracking_number='')
+    snapshot = tracking_snapshot(tracking_number)
+    if snapshot is None:
+        return render_template('tracking.html', shipment=None, tracking_number=tracking_number), 404
+    # Klien yang sudah punya versi terbaru cukup dapat 304 tanpa render ulang
+    if snapshot['etag'] in request.if_none_match:
+        return _tracking_response(snapshot, '')
+    return _tracking_response(snapshot, render_template('tracking.html', shipment=snapshot,
+                                                        tracking_number=snapshot['tracking_number']))
+
+@route('/api/track/<tracking_number>')
+def track_shipment_api(tracking_number):
+    snapshot = tracking_snapshot(tracking_number)
+    if snapshot is None:
+        return jsonify({'error': 'Tracking number not found'}), 404
+    if snapshot['etag'] in request.if_none_match:
+        return _tracking_response(snapshot, '')
+    body = {key: value for key, value in snapshot.items() if key != 'etag'}
+    return _tracking_response(snapshot, jsonify(body))
+
 # Authentication Routes
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -55,7 +131,7 @@ def login():
     
     return render_template('auth/login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -82,85 +158,107 @@ def register():
     
     return render_template('auth/register.html')
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
     return redirect(url_for('index'))
 
 # Dashboard Routes
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
 def user_dashboard():
     if current_user.role == 'admin':
         return redirect(url_for('admin_dashboard'))
     
-    # Get user statistics
-    total_orders = Order.query.filter_by(user_id=current_user.id).count()
-    pending_orders = Order.query.filter_by(user_id=current_user.id, status='pending').count()
-    in_transit = Order.query.join(Shipment).filter(
-        Order.user_id == current_user.id,
-        Shipment.status == 'in_transit'
-    ).count()
+    # Get user statistics (maintained counters, see stats.bump_user_stats)
+    stats = user_dashboard_stats(current_user.id)
     
-    recent_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.order_date.desc()).limit(5).all()
+    recent_orders = Order.query.filter_by(user_id=current_user.id).options(
+        joinedload(Order.product),
+        joinedload(Order.supplier)
+    ).order_by(Order.order_date.desc()).limit(5).all()
     
     return render_template('dashboard/user_dashboard.html', 
-                         total_orders=total_orders,
-                         pending_orders=pending_orders,
-                         in_transit=in_transit,
+                         total_orders=stats['total_orders'],
+                         pending_orders=stats['pending_orders'],
+                         in_transit=stats['in_transit'],
                          recent_orders=recent_orders)
 
-@app.route('/admin/dashboard')
+@route('/admin/dashboard')
 @login_required
+@use_replica
 def admin_dashboard():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
-    # Get admin statistics
-    total_products = Product.query.count()
-    low_stock_count = Product.query.filter(Product.stock_quantity <= Product.min_stock_level).count()
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    total_suppliers = Supplier.query.count()
-    
-    # Recent activities
-    recent_orders = Order.query.order_by(Order.order_date.desc()).limit(5).all()
-    low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock_level).all()
+    # Counters, recent activities and low stock (one cached payload)
+    stats = admin_dashboard_stats()
     
     return render_template('dashboard/admin_dashboard.html',
-                         total_products=total_products,
-                         low_stock_count=low_stock_count,
-                         total_orders=total_orders,
-                         pending_orders=pending_orders,
-                         total_suppliers=total_suppliers,
-                         recent_orders=recent_orders,
-                         low_stock_products=low_stock_products)
+                         total_products=stats['total_products'],
+                         low_stock_count=stats['low_stock_count'],
+                         total_orders=stats['total_orders'],
+                         pending_orders=stats['pending_orders'],
+                         total_suppliers=stats['total_suppliers'],
+                         recent_orders=stats['recent_orders'],
+                         low_stock_products=stats['low_stock_products'])
 
 # User Logistics Routes
-@app.route('/logistics')
+@route('/logistics')
 @login_required
+@use_replica
 def logistics():
     products = Product.query.all()
-    low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock_level).all()
+    low_stock_products = planned_low_stock()
     return render_template('dashboard/logistics.html', products=products, low_stock_products=low_stock_products)
 
+# Typeahead search over products and suppliers
+@route('/api/search')
+@login_required
+def search_catalog():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type')
+    if kind not in (None, 'product', 'supplier'):
+        return jsonify({'error': 'type must be product or supplier'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    
+    total, results = catalog.search(query, kind, offset, limit)
+    next_offset = offset + limit if offset + limit < total else None
+    return jsonify({'query': query, 'total': total, 'results': results, 'next_offset': next_offset})
+
 # User Orders Routes
-@app.route('/orders')
+@route('/orders')
 @login_required
 def orders():
-    user_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.order_date.desc()).all()
+    cursor, direction, page_size = page_args()
+    query = Order.query.filter_by(user_id=current_user.id).options(
+        joinedload(Order.product),
+        joinedload(Order.supplier)
+    )
+    page = keyset_paginate(query, [Order.order_date, Order.id], cursor, direction, page_size)
     suppliers = Supplier.query.all()
     products = Product.query.all()
-    return render_template('dashboard/orders.html', orders=user_orders, suppliers=suppliers, products=products)
+    return render_template('dashboard/orders.html', orders=page.items, page=page, suppliers=suppliers, products=products)
 
-@app.route('/orders/create', methods=['POST'])
+@route('/orders/create', methods=['POST'])
 @login_required
 def create_order():
     supplier_id = request.form['supplier_id']
     product_id = request.form['product_id']
-    quantity = int(request.form['quantity'])
+    try:
+        quantity = int(request.form['quantity'])
+    except ValueError:
+        quantity = 0
     package_type = request.form['package_type']
+    if quantity <= 0:
+        # Negative quantity akan menambah stok lewat take_stock
+        flash('Quantity must be a positive whole number')
+        return redirect(url_for('orders'))
     
     product = Product.query.get(product_id)
     if not product:
@@ -168,11 +266,8 @@ def create_order():
         return redirect(url_for('orders'))
     
     # Calculate costs based on package type
-    logistics_costs = {'basic': 50000, 'standard': 100000, 'premium': 200000}
-    logistics_cost = logistics_costs.get(package_type, 50000)
-    
     unit_price = product.unit_price
-    total_cost = (unit_price * quantity) + logistics_cost
+    logistics_cost, total_cost = order_costs(unit_price, quantity, package_type)
     
     order = Order(
         user_id=current_user.id,
@@ -186,12 +281,35 @@ def create_order():
     )
     
     db.session.add(order)
+    bump_user_stats(current_user.id, total=1, pending=1)
+    try:
+        reserve_stock(order)
+    except InsufficientStock:
+        db.session.rollback()
+        flash(f'Insufficient stock for {product.name}')
+        return redirect(url_for('orders'))
     db.session.commit()
+    invalidate_dashboard_stats()
     
     flash('Order created successfully')
     return redirect(url_for('orders'))
 
-@app.route('/orders/<int:order_id>/confirm', methods=['POST'])
+@route('/api/orders/batch', methods=['POST'])
+@login_required
+def create_orders_batch_api():
+    payload = request.get_json(silent=True)
+    lines = payload.get('orders') if isinstance(payload, dict) else payload
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'error': 'Expected a JSON list of orders or {"orders": [...]}'}), 400
+    max_lines = current_app.config.get('ORDER_BATCH_MAX_LINES', 1000)
+    if len(lines) > max_lines:
+        return jsonify({'error': f'At most {max_lines} orders per batch'}), 413
+    
+    results = create_orders_batch(current_user.id, lines)
+    created = sum(1 for r in results if r['status'] == 'created')
+    return jsonify({'created': created, 'failed': len(results) - created, 'results': results}), 201 if created else 422
+
+@route('/orders/<int:order_id>/confirm', methods=['POST'])
 @login_required
 def confirm_order(order_id):
     order = Order.query.get_or_404(order_id)
@@ -199,67 +317,142 @@ def confirm_order(order_id):
         flash('Unauthorized')
         return redirect(url_for('orders'))
     
-    order.status = 'confirmed'
-    
-    # Create shipment record
-    tracking_number = f"SIMLOG{uuid.uuid4().hex[:8].upper()}"
-    shipment = Shipment(
-        order_id=order.id,
-        tracking_number=tracking_number,
-        estimated_delivery=datetime.utcnow() + timedelta(days=7)
-    )
+    if order.status != 'pending':
+        flash('Order already confirmed')
+        return redirect(url_for('orders'))
     
-    # Create financial record
-    financial_record = FinancialRecord(
-        order_id=order.id,
-        transaction_type='income',
-        amount=order.total_cost,
-        description=f'Order payment for {order.product.name}'
-    )
+    try:
+        commit_reservation(order)
+    except InsufficientStock:
+        db.session.rollback()
+        flash('Insufficient stock to confirm this order')
+        return redirect(url_for('orders'))
     
-    # Create supplier transaction
-    supplier_transaction = SupplierTransaction(
-        supplier_id=order.supplier_id,
-        order_id=order.id,
-        amount=order.total_cost - order.logistics_cost
-    )
+    old_status = order.status
+    order.status = 'confirmed'
+    order_status_changed(order.user_id, old_status, order.status)
     
-    db.session.add(shipment)
-    db.session.add(financial_record)
-    db.session.add(supplier_transaction)
+    # Shipment, financial record and supplier transaction are created by the
+    # outbox worker; the event commits together with the status change
+    enqueue_order_confirmed(order)
     db.session.commit()
+    invalidate_dashboard_stats()
+    notify_outbox()
     
     flash('Order confirmed successfully')
     return redirect(url_for('orders'))
 
+@route('/orders/<int:order_id>/cancel', methods=['POST'])
+@login_required
+def cancel_order(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != current_user.id and current_user.role != 'admin':
+        flash('Unauthorized')
+        return redirect(url_for('orders'))
+    
+    if order.status != 'pending' or not release_order(order):
+        db.session.rollback()
+        flash('Only pending orders can be cancelled')
+        return redirect(url_for('orders'))
+    db.session.commit()
+    invalidate_dashboard_stats()
+    
+    flash('Order cancelled')
+    return redirect(url_for('orders'))
+
 # User Distribution Routes
-@app.route('/distribution')
+@route('/distribution')
 @login_required
 def distribution():
-    user_shipments = db.session.query(Shipment).join(Order).filter(Order.user_id == current_user.id).all()
-    return render_template('dashboard/distribution.html', shipments=user_shipments)
+    cursor, direction, page_size = page_args()
+    query = db.session.query(Shipment).join(Order).filter(Order.user_id == current_user.id).options(
+        contains_eager(Shipment.order).joinedload(Order.product)
+    )
+    page = keyset_paginate(query, [Shipment.id], cursor, direction, page_size)
+    return render_template('dashboard/distribution.html', shipments=page.items, page=page)
 
-@app.route('/suppliers')
+# Live shipment changes for the distribution pages: a server-sent event
+# stream, and a long-poll endpoint for clients that cannot keep one open.
+# Both need an async worker (gevent); elsewhere they answer 204, which stops
+# EventSource from reconnecting, and the pages fall back to reloading.
+def _shipment_cursor():
+    value = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def _shipment_audience():
+    # Admin melihat semua pengiriman, customer hanya miliknya
+    return None if current_user.role == 'admin' else current_user.id
+
+@route('/shipments/stream')
+@login_required
+def shipment_stream():
+    if not can_hold_connections(request.environ):
+        return '', 204
+    config = current_app.config
+    stream = iter_sse(get_broker(), _shipment_cursor(), _shipment_audience(),
+                      config.get('SHIPMENT_STREAM_HEARTBEAT', 15), config.get('SHIPMENT_STREAM_MAX_SECONDS', 300))
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx must not buffer the stream
+    return response
+
+@route('/api/shipments/changes')
+@login_required
+def shipment_changes():
+    if not can_hold_connections(request.environ):
+        return '', 204
+    broker = get_broker()
+    after = _shipment_cursor()
+    if after is None:
+        # First call only fetches the current cursor
+        return jsonify({'events': [], 'cursor': broker.last_id, 'reset': False})
+    max_timeout = current_app.config.get('SHIPMENT_LONG_POLL_TIMEOUT', 25)
+    try:
+        timeout = max(0.0, min(float(request.args.get('timeout', max_timeout)), max_timeout))
+    except ValueError:
+        return jsonify({'error': 'timeout must be a number'}), 400
+    audience = _shipment_audience()
+    # Kembalikan koneksi ke pool selama menunggu
+    db.session.remove()
+    events, cursor, reset = wait_for_changes(broker, after, audience, timeout)
+    return jsonify({'events': events, 'cursor': cursor, 'reset': reset})
+
+@route('/suppliers')
 @login_required
 def view_suppliers():
     if current_user.role == 'admin':
-        return redirect(url_for('admin_suppliers'))
+        return redirect(url_for('admin_suppliers', **request.args))
     
-    suppliers = Supplier.query.all()
-    return render_template('dashboard/suppliers.html', suppliers=suppliers)
+    # Metrik dihitung oleh `flask score-suppliers`, di sini hanya diurutkan
+    sort = request.args.get('sort', 'name')
+    suppliers = sorted_suppliers(sort)
+    return render_template('dashboard/suppliers.html', suppliers=suppliers, sort=sort, sorts=list(SUPPLIER_SORTS))
 
 # Admin Routes
-@app.route('/admin/logistics')
+@route('/admin/logistics')
 @login_required
 def admin_logistics():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
     products = Product.query.all()
-    low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock_level).all()
+    low_stock_products = planned_low_stock()
     return render_template('dashboard/admin_logistics.html', products=products, low_stock_products=low_stock_products)
 
-@app.route('/admin/products/create', methods=['POST'])
+@route('/admin/replenishment')
+@login_required
+@use_replica
+def admin_replenishment():
+    if current_user.role != 'admin':
+        return redirect(url_for('user_dashboard'))
+    
+    # Output of the last `flask plan-replenishment` run
+    return jsonify({'purchase_orders': suggested_purchase_orders()})
+
+@route('/admin/products/create', methods=['POST'])
 @login_required
 def create_product():
     if current_user.role != 'admin':
@@ -282,11 +475,13 @@ def create_product():
     
     db.session.add(product)
     db.session.commit()
+    invalidate_dashboard_stats()
+    index_product(product)
     
     flash('Product created successfully')
     return redirect(url_for('admin_logistics'))
 
-@app.route('/admin/products/<int:product_id>/update', methods=['POST'])
+@route('/admin/products/<int:product_id>/update', methods=['POST'])
 @login_required
 def update_product_stock(product_id):
     if current_user.role != 'admin':
@@ -294,34 +489,95 @@ def update_product_stock(product_id):
         return redirect(url_for('user_dashboard'))
     
     product = Product.query.get_or_404(product_id)
-    new_stock = int(request.form['stock_quantity'])
-    
-    product.stock_quantity = new_stock
-    product.updated_at = datetime.utcnow()
+    try:
+        new_stock = int(request.form['stock_quantity'])
+    except ValueError:
+        new_stock = -1
+    if new_stock < 0:
+        flash('Stock must be a whole number of at least 0')
+        return redirect(url_for('admin_logistics'))
+    
+    # The form carries the counted stock; units held for pending orders stay reserved
+    set_stock_on_hand(product.id, new_stock)
     db.session.commit()
+    invalidate_dashboard_stats()
+    index_product(product)
     
     flash('Stock updated successfully')
     return redirect(url_for('admin_logistics'))
 
-@app.route('/admin/orders')
+@route('/admin/products/import', methods=['POST'])
 @login_required
+def import_products_upload():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Upload the product file as the "file" field'}), 400
+    fmt = request.form.get('format') or ('csv' if upload.filename.lower().endswith('.csv') else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    # Byte yang bukan UTF-8 ditolak per baris, jangan sampai 500 setelah sebagian chunk di-commit
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', errors='replace', newline='')
+    summary = import_products(stream, fmt, current_app.config.get('PRODUCT_IMPORT_BATCH_SIZE', 1000))
+    return jsonify(summary)
+
+def _include_archived():
+    # Opt-in: ?include_archived=1 also lists rows moved out by archive.py
+    return request.args.get('include_archived') == '1'
+
+@route('/admin/orders')
+@login_required
+@use_replica
 def admin_orders():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
-    all_orders = Order.query.order_by(Order.order_date.desc()).all()
-    return render_template('dashboard/admin_orders.html', orders=all_orders)
+    cursor, direction, page_size = page_args()
+    query = Order.query.options(
+        joinedload(Order.user),
+        joinedload(Order.product),
+        joinedload(Order.supplier)
+    )
+    sources = [(query, [Order.order_date, Order.id])]
+    include_archived = _include_archived()
+    if include_archived:
+        archived = ArchivedOrder.query.options(
+            joinedload(ArchivedOrder.user),
+            joinedload(ArchivedOrder.product),
+            joinedload(ArchivedOrder.supplier)
+        )
+        sources.append((archived, [ArchivedOrder.order_date, ArchivedOrder.id]))
+    page = keyset_paginate_union(sources, cursor, direction, page_size)
+    return render_template('dashboard/admin_orders.html', orders=page.items, page=page,
+                           include_archived=include_archived)
 
-@app.route('/admin/distribution')
+@route('/admin/distribution')
 @login_required
+@use_replica
 def admin_distribution():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
-    all_shipments = Shipment.query.join(Order).order_by(Shipment.id.desc()).all()
-    return render_template('dashboard/admin_distribution.html', shipments=all_shipments)
+    cursor, direction, page_size = page_args()
+    query = Shipment.query.join(Order).options(
+        contains_eager(Shipment.order).joinedload(Order.user),
+        contains_eager(Shipment.order).joinedload(Order.product)
+    )
+    sources = [(query, [Shipment.id])]
+    include_archived = _include_archived()
+    if include_archived:
+        archived = ArchivedShipment.query.options(
+            joinedload(ArchivedShipment.order).joinedload(ArchivedOrder.user),
+            joinedload(ArchivedShipment.order).joinedload(ArchivedOrder.product)
+        )
+        sources.append((archived, [ArchivedShipment.id]))
+    page = keyset_paginate_union(sources, cursor, direction, page_size)
+    return render_template('dashboard/admin_distribution.html', shipments=page.items, page=page,
+                           include_archived=include_archived)
 
-@app.route('/admin/shipments/<int:shipment_id>/update', methods=['POST'])
+@route('/admin/shipments/<int:shipment_id>/update', methods=['POST'])
 @login_required
 def update_shipment_status(shipment_id):
     if current_user.role != 'admin':
@@ -332,31 +588,40 @@ def update_shipment_status(shipment_id):
     new_status = request.form['status']
     current_location = request.form.get('current_location', '')
     
-    shipment.status = new_status
-    shipment.current_location = current_location
-    
-    if new_status == 'in_transit' and not shipment.shipped_date:
-        shipment.shipped_date = datetime.utcnow()
-    elif new_status == 'delivered':
-        shipment.actual_delivery = datetime.utcnow()
-        # Update order status
-        shipment.order.status = 'delivered'
-    
+    update_shipment(shipment, new_status, current_location)
     db.session.commit()
+    invalidate_tracking([shipment.tracking_number])
+    invalidate_dashboard_stats()
     
     flash('Shipment status updated successfully')
     return redirect(url_for('admin_distribution'))
 
-@app.route('/admin/suppliers')
+@route('/admin/shipments/feed', methods=['POST'])
+@login_required
+def upload_carrier_feed():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Upload the feed as the "file" field'}), 400
+    fmt = request.form.get('format') or ('csv' if upload.filename.lower().endswith('.csv') else 'jsonl')
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    summary = ingest_carrier_feed(stream, fmt, current_app.config.get('CARRIER_FEED_BATCH_SIZE', 1000))
+    return jsonify(summary)
+
+@route('/admin/suppliers')
 @login_required
 def admin_suppliers():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
-    suppliers = Supplier.query.all()
-    return render_template('dashboard/admin_suppliers.html', suppliers=suppliers)
+    sort = request.args.get('sort', 'name')
+    suppliers = sorted_suppliers(sort)
+    return render_template('dashboard/admin_suppliers.html', suppliers=suppliers, sort=sort,
+                           sorts=list(SUPPLIER_SORTS))
 
-@app.route('/admin/suppliers/create', methods=['POST'])
+@route('/admin/suppliers/create', methods=['POST'])
 @login_required
 def create_supplier():
     if current_user.role != 'admin':
@@ -379,38 +644,96 @@ def create_supplier():
     
     db.session.add(supplier)
     db.session.commit()
+    invalidate_dashboard_stats()
+    index_supplier(supplier)
     
     flash('Supplier created successfully')
     return redirect(url_for('admin_suppliers'))
 
-@app.route('/admin/financial')
+@route('/admin/financial')
 @login_required
+@use_replica
 def admin_financial():
     if current_user.role != 'admin':
         return redirect(url_for('user_dashboard'))
     
-    financial_records = FinancialRecord.query.order_by(FinancialRecord.transaction_date.desc()).all()
-    
-    # Calculate totals
-    total_income = db.session.query(db.func.sum(FinancialRecord.amount)).filter_by(transaction_type='income').scalar() or 0
-    total_expenses = db.session.query(db.func.sum(FinancialRecord.amount)).filter_by(transaction_type='expense').scalar() or 0
-    net_profit = total_income - total_expenses
+    cursor, direction, page_size = page_args()
+    sources = [(FinancialRecord.query, [FinancialRecord.transaction_date, FinancialRecord.id])]
+    include_archived = _include_archived()
+    if include_archived:
+        sources.append((ArchivedFinancialRecord.query,
+                        [ArchivedFinancialRecord.transaction_date, ArchivedFinancialRecord.id]))
+    page = keyset_paginate_union(sources, cursor, direction, page_size)
+    
+    # Totals come from the day/month rollups maintained by record_financial_transaction
+    totals = ledger_summary()
+    
+    # Optional date-range summary (?start=YYYY-MM-DD&end=YYYY-MM-DD)
+    range_summary = None
+    start = request.args.get('start')
+    end = request.args.get('end')
+    if start or end:
+        try:
+            range_summary = ledger_summary(
+                date.fromisoformat(start) if start else None,
+                date.fromisoformat(end) if end else None
+            )
+        except ValueError:
+            flash('Invalid date range')
     
     return render_template('dashboard/admin_financial.html', 
-                         financial_records=financial_records,
-                         total_income=total_income,
-                         total_expenses=total_expenses,
-                         net_profit=net_profit)
-
-# Initialize default admin user
-def create_default_admin():
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(username='admin', email='admin@simlog.com', role='admin')
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
+                         financial_records=page.items,
+                         page=page,
+                         total_income=totals['total_income'],
+                         total_expenses=totals['total_expenses'],
+                         net_profit=totals['net_profit'],
+                         range_summary=range_summary,
+                         start=start,
+                         end=end,
+                         include_archived=include_archived)
 
-# Create default admin when app starts
-with app.app_context():
-    create_default_admin()
+@route('/admin/export/<name>')
+@login_required
+@use_replica
+def admin_export(name):
+    if current_user.role != 'admin':
+        return redirect(url_for('user_dashboard'))
+    if name not in EXPORTS:
+        return jsonify({'error': f"Unknown export, expected one of {', '.join(EXPORTS)}"}), 404
+    
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD&status=...&format=csv|parquet
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    status = request.args.get('status') or None
+    fmt = request.args.get('format', 'csv')
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export is not available on this server'}), 501
+    if fmt not in ('csv', 'parquet'):
+        return jsonify({'error': 'format must be csv or parquet'}), 400
+    if status and EXPORTS[name][2] is None:
+        return jsonify({'error': f'{name} cannot be filtered by status'}), 400
+    
+    # Streamed batch by batch (keyset pages by id); nothing is buffered
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 10000)
+    if fmt == 'parquet':
+        body = iter_parquet(name, start, end, status, batch_size)
+        mimetype = 'application/vnd.apache.parquet'
+    else:
+        body = iter_csv(name, start, end, status, batch_size)
+        mimetype = 'text/csv'
+    filename = f"{name}-{date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if current_user.role != 'admin':
+        return redirect(url_for('user_dashboard'))
+    
+    if request.args.get('format') == 'prometheus':
+        return Response(profiling.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify(profiling.metrics_snapshot())
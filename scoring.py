@@ -0,0 +1,263 @@
+import json
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import and_, delete, func, insert, or_, select, union_all, update
+from sqlalchemy.orm import contains_eager
+from app import db
+from models import (Supplier, Order, Shipment, SupplierTransaction, ArchivedOrder, ArchivedShipment,
+                    ArchivedSupplierTransaction, SupplierScore, SupplierScoreRun)
+
+DEFAULT_DELIVERY_LAG_HOURS = 24
+DEFAULT_COMMIT_WINDOW_HOURS = 24
+# Most missing transaction ids carried from one run to the next
+MAX_PENDING_TRANSACTIONS = 10000
+DEFAULT_PRIOR_WEIGHT = 10
+# Share of each metric in the 0-5 rating
+WEIGHTS = {'on_time': 0.5, 'lead_time': 0.25, 'volume': 0.15, 'spend': 0.10}
+
+_TOTALS = ('order_count', 'spend_total', 'delivered_count', 'on_time_count', 'late_count', 'lead_time_hours_total')
+
+def _transaction_lines(condition):
+    # Archived transactions keep their ids, so the watermark covers both tables
+    return union_all(*(
+        select(model.id, model.supplier_id, model.amount).where(condition(model))
+        for model in (SupplierTransaction, ArchivedSupplierTransaction)
+    )).subquery()
+
+def _transaction_ids(condition):
+    return set(db.session.execute(select(_transaction_lines(condition).c.id)).scalars())
+
+def _transaction_totals(after_id, pending):
+    """supplier_id -> (count, amount) for the transactions not counted yet.
+
+    Reads the ids above ``after_id`` and those in ``pending``. Ids are
+    handed out before commit, so a gap below the highest id read may be a
+    transaction that commits later; such ids are left out and returned as
+    missing, with the new watermark and the pending ids found this time.
+    """
+    lines = _transaction_lines(lambda model: model.id > after_id)
+    count, last_id = db.session.execute(select(func.count(), func.max(lines.c.id))).one()
+    last_id = last_id or after_id
+    missing = set()
+    if count < last_id - after_id:
+        low = max(after_id, last_id - MAX_PENDING_TRANSACTIONS)
+        missing = set(range(low + 1, last_id + 1)) - _transaction_ids(
+            lambda model: and_(model.id > low, model.id <= last_id))
+    found = _transaction_ids(lambda model: model.id.in_(pending)) if pending else set()
+    # Batas last_id dan missing yang sama, agar baris yang commit di antara query tidak terhitung dua kali
+    lines = _transaction_lines(lambda model: or_(
+        and_(model.id > after_id, model.id <= last_id, model.id.not_in(missing)), model.id.in_(found)))
+    rows = db.session.execute(
+        select(lines.c.supplier_id, func.count(), func.sum(lines.c.amount)).group_by(lines.c.supplier_id)
+    ).all()
+    totals = {supplier_id: (count, amount or 0.0) for supplier_id, count, amount in rows}
+    return totals, last_id, missing, found
+
+def _load_pending(run):
+    if run is None or not run.pending_transaction_ids:
+        return {}
+    return {int(key): datetime.fromisoformat(value) for key, value in json.loads(run.pending_transaction_ids).items()}
+
+def _dump_pending(pending):
+    if not pending:
+        return None
+    kept = sorted(pending)[-MAX_PENDING_TRANSACTIONS:]
+    return json.dumps({str(key): pending[key].isoformat() for key in kept})
+
+def _delivery_totals(after, until, batch_size):
+    """supplier_id -> [delivered, on time, late, lead time hours] for deliveries in (after, until]."""
+    totals = {}
+    for shipment, order in ((Shipment, Order), (ArchivedShipment, ArchivedOrder)):
+        query = (
+            select(order.supplier_id, order.order_date, shipment.estimated_delivery, shipment.actual_delivery)
+            .join(order, order.id == shipment.order_id)
+            .where(shipment.status == 'delivered', shipment.actual_delivery <= until)
+            .execution_options(yield_per=batch_size)
+        )
+        if after is not None:
+            query = query.where(shipment.actual_delivery > after)
+        for rows in db.session.execute(query).partitions():
+            supplier_ids, ordered, estimated, delivered = zip(*rows)
+            suppliers, index = np.unique(np.array(supplier_ids, np.int64), return_inverse=True)
+            delivered = np.array(delivered, 'datetime64[s]')
+            estimated = np.array(estimated, 'datetime64[s]')  # None -> NaT
+            ordered = np.array(ordered, 'datetime64[s]')
+            lead = (delivered - ordered).astype(float) / 3600.0
+            has_estimate = ~np.isnat(estimated)
+            on_time = has_estimate & (delivered <= estimated)
+            columns = (
+                np.bincount(index, minlength=len(suppliers)),
+                np.bincount(index, weights=on_time, minlength=len(suppliers)),
+                np.bincount(index, weights=has_estimate & ~on_time, minlength=len(suppliers)),
+                np.bincount(index, weights=np.nan_to_num(np.maximum(lead, 0.0)), minlength=len(suppliers)),
+            )
+            for position, supplier_id in enumerate(suppliers.tolist()):
+                entry = totals.setdefault(supplier_id, [0, 0, 0, 0.0])
+                for i, column in enumerate(columns):
+                    entry[i] += column[position]
+    return totals
+
+def _percentile_rank(values):
+    """0 for the smallest value and 1 for the largest; ties share a rank."""
+    if len(values) < 2:
+        return np.full(len(values), 0.5)
+    ordered = np.sort(values)
+    low = np.searchsorted(ordered, values, side='left')
+    high = np.searchsorted(ordered, values, side='right') - 1
+    return (low + high) / 2.0 / (len(values) - 1)
+
+def compute_ratings(totals, prior_weight=DEFAULT_PRIOR_WEIGHT):
+    """(on_time_rate, avg_lead_time_hours, rating) arrays for the running totals of every supplier.
+
+    ``totals`` maps the names in _TOTALS to aligned arrays. Rates and lead
+    times are shrunk towards the overall average by ``prior_weight``
+    deliveries, so a supplier with two lucky deliveries does not top the
+    list. Lead time is scored by rank (fastest = 1) and volume and spend on a
+    log scale relative to the largest supplier.
+    """
+    orders = totals['order_count'].astype(float)
+    spend = np.maximum(totals['spend_total'], 0.0)
+    delivered = totals['delivered_count'].astype(float)
+    on_time = totals['on_time_count'].astype(float)
+    rated = on_time + totals['late_count']
+    lead_total = totals['lead_time_hours_total']
+
+    prior_rate = on_time.sum() / rated.sum() if rated.sum() else 1.0
+    prior_lead = lead_total.sum() / delivered.sum() if delivered.sum() else 0.0
+    on_time_rate = (on_time + prior_weight * prior_rate) / (rated + prior_weight)
+    avg_lead = (lead_total + prior_weight * prior_lead) / (delivered + prior_weight)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume = np.nan_to_num(np.log1p(orders) / np.log1p(orders.max(initial=0.0)))
+        spend_score = np.nan_to_num(np.log1p(spend) / np.log1p(spend.max(initial=0.0)))
+    lead_score = np.where(delivered > 0, 1.0 - _percentile_rank(avg_lead), 0.5)
+    rating = 5.0 * (WEIGHTS['on_time'] * on_time_rate + WEIGHTS['lead_time'] * lead_score
+                    + WEIGHTS['volume'] * volume + WEIGHTS['spend'] * spend_score)
+    # Tanpa data pengiriman, tampilkan NULL dan bukan angka prior
+    shown_rate = np.where(rated > 0, on_time_rate, np.nan)
+    shown_lead = np.where(delivered > 0, lead_total / np.maximum(delivered, 1.0), np.nan)
+    return shown_rate, shown_lead, np.round(rating, 2)
+
+def _nullable(values):
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+def score_suppliers(full=False, delivery_lag_hours=DEFAULT_DELIVERY_LAG_HOURS,
+                    prior_weight=DEFAULT_PRIOR_WEIGHT, batch_size=10000, now=None,
+                    commit_window_hours=DEFAULT_COMMIT_WINDOW_HOURS):
+    """Fold new supplier activity into supplier_scores and rewrite Supplier.rating.
+
+    Only supplier transactions with an id above the last run's watermark and
+    deliveries after the last run's ``delivered_until`` are read, with
+    aggregate queries, so a run costs what happened since the previous one.
+    Ids below the watermark that were missing (a transaction that had not
+    committed yet) are looked for again on later runs, until they are
+    ``commit_window_hours`` old.
+    Deliveries are read up to ``delivery_lag_hours`` ago because carrier
+    feeds may report a delivery some time after it happened; anything
+    reported later than that is only counted by a ``full`` rebuild.
+
+    The ratings are relative (volume and spend are compared with the
+    largest supplier), so every scored supplier is re-rated each run; that
+    is one executemany UPDATE over a table with one row per supplier. Meant
+    to be run from a single scheduler, not concurrently.
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    until = now - timedelta(hours=delivery_lag_hours)
+    if full:
+        db.session.execute(delete(SupplierScore.__table__))
+        last = None
+    else:
+        last = db.session.execute(
+            select(SupplierScoreRun).order_by(SupplierScoreRun.id.desc()).limit(1)
+        ).scalar()
+    after_id = last.last_transaction_id if last else 0
+    pending = _load_pending(last)
+    after = last.delivered_until if last else None
+    if after is not None and after > until:
+        until = after
+
+    transactions, last_transaction_id, missing, found = _transaction_totals(after_id, list(pending))
+    expired = now - timedelta(hours=commit_window_hours)
+    # Id yang tidak muncul dalam window dianggap rollback
+    pending = {key: seen for key, seen in pending.items() if key not in found and seen >= expired}
+    pending.update(dict.fromkeys(missing, now))
+    deliveries = _delivery_totals(after, until, batch_size)
+
+    rows = db.session.execute(
+        select(SupplierScore.supplier_id, *(getattr(SupplierScore, name) for name in _TOTALS))
+    ).all()
+    existing = {row[0] for row in rows}
+    new_ids = sorted((set(transactions) | set(deliveries)) - existing)
+    ids = np.array([row[0] for row in rows] + new_ids, np.int64)
+    totals = {
+        name: np.array([row[i + 1] or 0 for row in rows] + [0] * len(new_ids), float)
+        for i, name in enumerate(_TOTALS)
+    }
+    positions = {supplier_id: i for i, supplier_id in enumerate(ids.tolist())}
+    for supplier_id, (count, amount) in transactions.items():
+        totals['order_count'][positions[supplier_id]] += count
+        totals['spend_total'][positions[supplier_id]] += amount
+    for supplier_id, (delivered, on_time, late, lead_hours) in deliveries.items():
+        position = positions[supplier_id]
+        totals['delivered_count'][position] += delivered
+        totals['on_time_count'][position] += on_time
+        totals['late_count'][position] += late
+        totals['lead_time_hours_total'][position] += lead_hours
+    on_time_rate, avg_lead, rating = compute_ratings(totals, prior_weight)
+
+    values = [
+        {'supplier_id': supplier_id, 'order_count': int(orders), 'spend_total': float(spend),
+         'delivered_count': int(delivered), 'on_time_count': int(on_time), 'late_count': int(late),
+         'lead_time_hours_total': float(lead_hours), 'on_time_rate': rate, 'avg_lead_time_hours': lead,
+         'rating': float(score), 'updated_at': now}
+        for supplier_id, orders, spend, delivered, on_time, late, lead_hours, rate, lead, score in zip(
+            ids.tolist(), *(totals[name].tolist() for name in _TOTALS),
+            _nullable(on_time_rate), _nullable(avg_lead), rating.tolist())
+    ]
+    updates = [row for row in values if row['supplier_id'] in existing]
+    inserts = [row for row in values if row['supplier_id'] not in existing]
+    ratings = [{'id': row['supplier_id'], 'rating': row['rating']} for row in values]
+    for i in range(0, len(values), batch_size):
+        if updates[i:i + batch_size]:
+            db.session.execute(update(SupplierScore), updates[i:i + batch_size])
+        if inserts[i:i + batch_size]:
+            db.session.execute(insert(SupplierScore), inserts[i:i + batch_size])
+        if ratings[i:i + batch_size]:
+            db.session.execute(update(Supplier), ratings[i:i + batch_size])
+
+    seconds = round(time.perf_counter() - started, 3)
+    db.session.add(SupplierScoreRun(last_transaction_id=last_transaction_id,
+                                    pending_transaction_ids=_dump_pending(pending), delivered_until=until,
+                                    suppliers_scored=len(values), seconds=seconds, ran_at=now))
+    db.session.commit()
+    return {
+        'full': full or last is None,
+        'new_transactions': sum(count for count, _ in transactions.values()),
+        'new_deliveries': int(sum(entry[0] for entry in deliveries.values())),
+        'suppliers_scored': len(values),
+        'last_transaction_id': last_transaction_id,
+        'pending_transactions': len(pending),
+        'delivered_until': until.isoformat(),
+        'seconds': seconds,
+    }
+
+# Sort keys for the supplier pages: (column, descending)
+SORTS = {
+    'name': (Supplier.name, False),
+    'rating': (Supplier.rating, True),
+    'on_time': (SupplierScore.on_time_rate, True),
+    'lead_time': (SupplierScore.avg_lead_time_hours, False),
+    'orders': (SupplierScore.order_count, True),
+    'spend': (SupplierScore.spend_total, True),
+}
+
+def sorted_suppliers(sort=None):
+    """Suppliers with their precomputed score, ordered by one of SORTS (unscored suppliers last)."""
+    column, descending = SORTS.get(sort, SORTS['name'])
+    return (Supplier.query
+            .outerjoin(SupplierScore, SupplierScore.supplier_id == Supplier.id)
+            .options(contains_eager(Supplier.score))
+            .order_by(column.is_(None), column.desc() if descending else column, Supplier.id)
+            .all())
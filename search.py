@@ -0,0 +1,230 @@
+import bisect
+import re
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from models import Product, Supplier
+from profiling import register_metrics_provider
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+class SearchIndex:
+    """Inverted index with prefix lookup over products and suppliers.
+
+    ``postings`` maps a token to ``{doc_key: weight}`` and ``tokens`` keeps
+    the distinct tokens sorted, so a prefix is resolved with a bisect instead
+    of a scan. Documents are keyed by ``(kind, id)``.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.tokens = []
+        self.docs = {}  # doc_key -> (payload, tokens)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, kind, doc_id, fields, payload):
+        """Index (or re-index) one document; ``fields`` is a list of (text, weight)."""
+        key = (kind, doc_id)
+        weights = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), weight)
+        with self._lock:
+            self._remove(key)
+            for token, weight in weights.items():
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = self.postings[token] = {}
+                    bisect.insort(self.tokens, token)
+                posting[key] = weight
+            self.docs[key] = (payload, tuple(weights))
+
+    def remove(self, kind, doc_id):
+        with self._lock:
+            self._remove((kind, doc_id))
+
+    def _remove(self, key):
+        entry = self.docs.pop(key, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            posting = self.postings[token]
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def _prefix_matches(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        for token in self.tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def search(self, query, kind=None, offset=0, limit=20):
+        """Ranked ``(total, [payload, ...])`` for documents matching every query term.
+
+        Every term matches as a word prefix; whole-word matches and matches
+        in heavier fields score higher, and names starting with the query
+        come first among equal scores.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token in self._prefix_matches(term):
+                    exact = 2 if token == term else 1
+                    for key, weight in self.postings[token].items():
+                        if kind is not None and key[0] != kind:
+                            continue
+                        score = weight * exact
+                        if score > term_scores.get(key, 0):
+                            term_scores[key] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+                if not scores:
+                    return 0, []
+            phrase = ' '.join(terms)
+            ranked = sorted(
+                scores.items(),
+                key=lambda item: (
+                    -item[1],
+                    not ' '.join(tokenize(self.docs[item[0]][0]['name'])).startswith(phrase),
+                    len(self.docs[item[0]][0]['name']),
+                    item[0],
+                )
+            )
+            return len(ranked), [dict(self.docs[key][0], score=score) for key, score in ranked[offset:offset + limit]]
+
+# Field weights: a match in the name counts more than one in the description/address
+def _product_doc(product_id, name, description, unit_price, stock_quantity):
+    return ('product', product_id, [(name, 3), (description, 1)],
+            {'type': 'product', 'id': product_id, 'name': name, 'unit_price': unit_price,
+             'stock_quantity': stock_quantity})
+
+def _supplier_doc(supplier_id, name, contact_person, address):
+    return ('supplier', supplier_id, [(name, 3), (contact_person, 2), (address, 1)],
+            {'type': 'supplier', 'id': supplier_id, 'name': name, 'contact_person': contact_person})
+
+_PRODUCT_COLUMNS = (Product.id, Product.name, Product.description, Product.unit_price, Product.stock_quantity)
+_SUPPLIER_COLUMNS = (Supplier.id, Supplier.name, Supplier.contact_person, Supplier.address)
+
+class CatalogSearch:
+    """The per-process product/supplier index plus what is needed to keep it fresh.
+
+    Built lazily on the first search. Writes made by this process are indexed
+    right after they commit (see index_product/index_supplier); changes made by
+    other workers are picked up by refresh(), at most every
+    SEARCH_REFRESH_INTERVAL seconds, from Product.updated_at and new supplier
+    ids.
+    """
+
+    def __init__(self):
+        self.index = SearchIndex()
+        self.built = False
+        self.build_seconds = None
+        self.product_watermark = None
+        self.supplier_watermark = 0
+        self.refreshed_at = 0.0
+        self._seen = {}  # product id -> updated_at indexed inside the overlap window
+        self._lock = threading.Lock()
+
+    def _index_products(self, index, rows):
+        """Index product rows (columns + updated_at) and move the watermark to what was read.
+
+        updated_at is stamped before the writer commits, so a row may become
+        visible after rows with a later timestamp. The next refresh therefore
+        starts SEARCH_REFRESH_OVERLAP seconds behind the newest updated_at
+        seen, and rows already indexed at the same updated_at are skipped.
+        """
+        latest = None
+        for row in rows:
+            *columns, updated_at = row
+            if updated_at is not None and self._seen.get(columns[0]) == updated_at:
+                continue
+            index.add(*_product_doc(*columns))
+            if updated_at is not None:
+                self._seen[columns[0]] = updated_at
+                latest = updated_at if latest is None else max(latest, updated_at)
+        if latest is not None:
+            overlap = timedelta(seconds=current_app.config.get('SEARCH_REFRESH_OVERLAP', 60))
+            watermark = latest - overlap
+            if self.product_watermark is None or watermark > self.product_watermark:
+                self.product_watermark = watermark
+                self._seen = {key: value for key, value in self._seen.items() if value >= watermark}
+
+    def build(self, batch_size=5000):
+        started = time.perf_counter()
+        index = SearchIndex()
+        self.product_watermark = None
+        self._seen = {}
+        supplier_watermark = 0
+        self._index_products(index, db.session.execute(
+            select(*_PRODUCT_COLUMNS, Product.updated_at).execution_options(yield_per=batch_size)
+        ))
+        for row in db.session.execute(select(*_SUPPLIER_COLUMNS).execution_options(yield_per=batch_size)):
+            index.add(*_supplier_doc(*row))
+            supplier_watermark = max(supplier_watermark, row.id)
+        self.index = index
+        self.supplier_watermark = supplier_watermark
+        self.refreshed_at = time.monotonic()
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        self.built = True
+
+    def refresh(self):
+        query = select(*_PRODUCT_COLUMNS, Product.updated_at)
+        if self.product_watermark is not None:
+            query = query.where(Product.updated_at >= self.product_watermark)
+        self._index_products(self.index, db.session.execute(query))
+        for row in db.session.execute(select(*_SUPPLIER_COLUMNS).where(Supplier.id > self.supplier_watermark)):
+            self.index.add(*_supplier_doc(*row))
+            self.supplier_watermark = max(self.supplier_watermark, row.id)
+        self.refreshed_at = time.monotonic()
+
+    def ensure_fresh(self):
+        interval = current_app.config.get('SEARCH_REFRESH_INTERVAL', 5)
+        with self._lock:
+            if not self.built:
+                self.build()
+            elif time.monotonic() - self.refreshed_at >= interval:
+                self.refresh()
+
+    def search(self, query, kind=None, offset=0, limit=20):
+        self.ensure_fresh()
+        return self.index.search(query, kind, offset, limit)
+
+    def stats(self):
+        return {
+            'built': self.built,
+            'documents': len(self.index),
+            'tokens': len(self.index.tokens),
+            'build_seconds': self.build_seconds,
+        }
+
+catalog = CatalogSearch()
+register_metrics_provider('search_index', catalog.stats)
+
+def index_product(product):
+    """Re-index a product after its change was committed."""
+    if catalog.built:
+        catalog.index.add(*_product_doc(product.id, product.name, product.description,
+                                        product.unit_price, product.stock_quantity))
+
+def index_supplier(supplier):
+    if catalog.built:
+        catalog.index.add(*_supplier_doc(supplier.id, supplier.name, supplier.contact_person,
+                                         supplier.address))
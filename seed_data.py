@@ -1,115 +1,248 @@
+import argparse
 import json
+import os
+import time
 from datetime import datetime
-from app import app, db
+from sqlalchemy import DateTime, insert, select
+from app import create_app, db
+from ledger import rebuild_rollups
+from stats import repair_user_stats
 from models import User, Product, Supplier, Order, Shipment, FinancialRecord, SupplierTransaction
 
+# Urutan tabel mengikuti foreign key: parent selalu dimuat lebih dulu
+BULK_LOAD_ORDER = [
+    ('users.json', User),
+    ('products.json', Product),
+    ('suppliers.json', Supplier),
+    ('orders.json', Order),
+    ('shipments.json', Shipment),
+    ('financial_records.json', FinancialRecord),
+    ('supplier_transactions.json', SupplierTransaction),
+]
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Helper untuk konversi tanggal dari format ISO
+def parse_date(date_str):
+    if not date_str:
+        return None
+    # Mengganti 'Z' dengan '+00:00' agar bisa diparsing oleh fromisoformat
+    if date_str.endswith('Z'):
+        date_str = date_str[:-1] + '+00:00'
+    return datetime.fromisoformat(date_str)
+
+def iter_json_array(path, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith('['):
+            raise ValueError(f'{path}: expected a JSON array')
+        pos = 1
+        eof = False
+        while True:
+            # Lewati whitespace dan koma di antara elemen
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # Nilai yang berakhir tepat di ujung buffer bisa saja terpotong
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                complete = False
+            if complete:
+                yield item
+                pos = end
+                continue
+            if eof:
+                raise ValueError(f'{path}: malformed or truncated JSON array')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+def _row_from_json(table, record, date_columns):
+    row = {}
+    for column in table.columns:
+        if column.key in record:
+            value = record[column.key]
+            if column.key in date_columns:
+                value = parse_date(value)
+            if value is None and column.default is not None:
+                # Sama seperti ORM: kolom kosong memakai default (order_date, transaction_date NOT NULL)
+                continue
+            row[column.key] = value
+    return row
+
+def _flush_batch(table, batch):
+    ids = [row['id'] for row in batch]
+    existing = set(db.session.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars())
+    new_rows = [row for row in batch if row['id'] not in existing]
+    if new_rows:
+        # executemany butuh kunci yang sama di tiap baris (kolom default bisa
+        # dilewati), jadi kelompokkan per set kolom
+        groups = {}
+        for row in new_rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for group in groups.values():
+            db.session.execute(insert(table), group)
+    db.session.commit()
+    return len(new_rows), len(batch) - len(new_rows)
+
+def bulk_load_table(model, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream one JSON file into its table; returns (inserted, skipped, seconds)."""
+    table = model.__table__
+    date_columns = {c.key for c in table.columns if isinstance(c.type, DateTime)}
+    inserted = skipped = 0
+    started = time.perf_counter()
+    batch = []
+    for record in iter_json_array(path):
+        batch.append(_row_from_json(table, record, date_columns))
+        if len(batch) >= batch_size:
+            added, dup = _flush_batch(table, batch)
+            inserted += added
+            skipped += dup
+            batch = []
+    if batch:
+        added, dup = _flush_batch(table, batch)
+        inserted += added
+        skipped += dup
+    return inserted, skipped, time.perf_counter() - started
+
+def bulk_seed_data(data_dir='DB', batch_size=DEFAULT_BATCH_SIZE):
+    print(f"Bulk seeding database (batch size {batch_size})...")
+    loaded = set()
+    for filename, model in BULK_LOAD_ORDER:
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            print(f"  {model.__tablename__}: {path} not found, skipped")
+            continue
+        inserted, skipped, elapsed = bulk_load_table(model, path, batch_size)
+        total = inserted + skipped
+        rate = total / elapsed if elapsed else 0
+        print(f"  {model.__tablename__}: {inserted} inserted, {skipped} already present "
+              f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+        if inserted:
+            loaded.add(model)
+    # Tabel turunan tidak ikut di-insert langsung, bangun ulang dari histori
+    if FinancialRecord in loaded:
+        rebuild_rollups()
+        print("  financial_rollups rebuilt")
+    if loaded & {Order, Shipment}:
+        repair_user_stats()
+        print("  user_order_stats rebuilt")
+    print("Database seeded successfully.")
+
 def seed_data():
-    with app.app_context():
-        print("Seeding database...")
-
-        # Helper untuk konversi tanggal dari format ISO
-        def parse_date(date_str):
-            if not date_str:
-                return None
-            # Mengganti 'Z' dengan '+00:00' agar bisa diparsing oleh fromisoformat
-            if date_str.endswith('Z'):
-                date_str = date_str[:-1] + '+00:00'
-            return datetime.fromisoformat(date_str)
-
-        # 1. Users
-        with open('DB/users.json') as f:
-            users_data = json.load(f)
-            for u in users_data:
-                if not User.query.get(u['id']):
-                    new_user = User(
-                        id=u['id'],
-                        username=u['username'],
-                        email=u['email'],
-                        password_hash=u['password_hash'],
-                        role=u['role'],
-                        created_at=parse_date(u['created_at'])
-                    )
-                    db.session.add(new_user)
-
-        # 2. Products
-        with open('DB/products.json') as f:
-            products_data = json.load(f)
-            for p in products_data:
-                 if not Product.query.get(p['id']):
-                    new_product = Product(
-                        id=p['id'], name=p['name'], description=p['description'],
-                        stock_quantity=p['stock_quantity'], min_stock_level=p['min_stock_level'],
-                        unit_price=p['unit_price'], created_at=parse_date(p['created_at']),
-                        updated_at=parse_date(p['updated_at'])
-                    )
-                    db.session.add(new_product)
-
-        # 3. Suppliers
-        with open('DB/suppliers.json') as f:
-            suppliers_data = json.load(f)
-            for s in suppliers_data:
-                if not Supplier.query.get(s['id']):
-                    new_supplier = Supplier(
-                        id=s['id'], name=s['name'], contact_person=s['contact_person'],
-                        email=s['email'], phone=s['phone'], address=s['address'],
-                        rating=s['rating'], created_at=parse_date(s['created_at'])
-                    )
-                    db.session.add(new_supplier)
-
-        db.session.commit() # Commit setelah user, product, supplier dibuat
-
-        # 4. Orders
-        with open('DB/orders.json') as f:
-            orders_data = json.load(f)
-            for o in orders_data:
-                if not Order.query.get(o['id']):
-                    new_order = Order(
-                        id=o['id'], user_id=o['user_id'], supplier_id=o['supplier_id'],
-                        product_id=o['product_id'], quantity=o['quantity'], unit_price=o['unit_price'],
-                        total_cost=o['total_cost'], logistics_cost=o['logistics_cost'],
-                        package_type=o['package_type'], status=o['status'],
-                        order_date=parse_date(o['order_date'])
-                    )
-                    db.session.add(new_order)
-
-        # 5. Shipments
-        with open('DB/shipments.json') as f:
-            shipments_data = json.load(f)
-            for s in shipments_data:
-                if not Shipment.query.get(s['id']):
-                    new_shipment = Shipment(
-                        id=s['id'], order_id=s['order_id'], tracking_number=s['tracking_number'],
-                        status=s['status'], shipped_date=parse_date(s['shipped_date']),
-                        estimated_delivery=parse_date(s['estimated_delivery']),
-                        actual_delivery=parse_date(s['actual_delivery']), current_location=s['current_location']
-                    )
-                    db.session.add(new_shipment)
-
-        # 6. Financial Records
-        with open('DB/financial_records.json') as f:
-            records_data = json.load(f)
-            for r in records_data:
-                if not FinancialRecord.query.get(r['id']):
-                    new_record = FinancialRecord(
-                        id=r['id'], order_id=r['order_id'], transaction_type=r['transaction_type'],
-                        amount=r['amount'], description=r['description'],
-                        transaction_date=parse_date(r['transaction_date'])
-                    )
-                    db.session.add(new_record)
-
-        # 7. Supplier Transactions
-        with open('DB/supplier_transactions.json') as f:
-            trans_data = json.load(f)
-            for t in trans_data:
-                if not SupplierTransaction.query.get(t['id']):
-                    new_tran = SupplierTransaction(
-                        id=t['id'], supplier_id=t['supplier_id'], order_id=t['order_id'],
-                        amount=t['amount'], transaction_date=parse_date(t['transaction_date'])
-                    )
-                    db.session.add(new_tran)
-
-        db.session.commit()
-        print("Database seeded successfully.")
+    print("Seeding database...")
+
+    # 1. Users
+    with open('DB/users.json') as f:
+        users_data = json.load(f)
+        for u in users_data:
+            if not User.query.get(u['id']):
+                new_user = User(
+                    id=u['id'],
+                    username=u['username'],
+                    email=u['email'],
+                    password_hash=u['password_hash'],
+                    role=u['role'],
+                    created_at=parse_date(u['created_at'])
+                )
+                db.session.add(new_user)
+
+    # 2. Products
+    with open('DB/products.json') as f:
+        products_data = json.load(f)
+        for p in products_data:
+             if not Product.query.get(p['id']):
+                new_product = Product(
+                    id=p['id'], name=p['name'], description=p['description'],
+                    stock_quantity=p['stock_quantity'], min_stock_level=p['min_stock_level'],
+                    unit_price=p['unit_price'], created_at=parse_date(p['created_at']),
+                    updated_at=parse_date(p['updated_at'])
+                )
+                db.session.add(new_product)
+
+    # 3. Suppliers
+    with open('DB/suppliers.json') as f:
+        suppliers_data = json.load(f)
+        for s in suppliers_data:
+            if not Supplier.query.get(s['id']):
+                new_supplier = Supplier(
+                    id=s['id'], name=s['name'], contact_person=s['contact_person'],
+                    email=s['email'], phone=s['phone'], address=s['address'],
+                    rating=s['rating'], created_at=parse_date(s['created_at'])
+                )
+                db.session.add(new_supplier)
+
+    db.session.commit() # Commit setelah user, product, supplier dibuat
+
+    # 4. Orders
+    with open('DB/orders.json') as f:
+        orders_data = json.load(f)
+        for o in orders_data:
+            if not Order.query.get(o['id']):
+                new_order = Order(
+                    id=o['id'], user_id=o['user_id'], supplier_id=o['supplier_id'],
+                    product_id=o['product_id'], quantity=o['quantity'], unit_price=o['unit_price'],
+                    total_cost=o['total_cost'], logistics_cost=o['logistics_cost'],
+                    package_type=o['package_type'], status=o['status'],
+                    order_date=parse_date(o['order_date'])
+                )
+                db.session.add(new_order)
+
+    # 5. Shipments
+    with open('DB/shipments.json') as f:
+        shipments_data = json.load(f)
+        for s in shipments_data:
+            if not Shipment.query.get(s['id']):
+                new_shipment = Shipment(
+                    id=s['id'], order_id=s['order_id'], tracking_number=s['tracking_number'],
+                    status=s['status'], shipped_date=parse_date(s['shipped_date']),
+                    estimated_delivery=parse_date(s['estimated_delivery']),
+                    actual_delivery=parse_date(s['actual_delivery']), current_location=s['current_location']
+                )
+                db.session.add(new_shipment)
+
+    # 6. Financial Records
+    with open('DB/financial_records.json') as f:
+        records_data = json.load(f)
+        for r in records_data:
+            if not FinancialRecord.query.get(r['id']):
+                new_record = FinancialRecord(
+                    id=r['id'], order_id=r['order_id'], transaction_type=r['transaction_type'],
+                    amount=r['amount'], description=r['description'],
+                    transaction_date=parse_date(r['transaction_date'])
+                )
+                db.session.add(new_record)
+
+    # 7. Supplier Transactions
+    with open('DB/supplier_transactions.json') as f:
+        trans_data = json.load(f)
+        for t in trans_data:
+            if not SupplierTransaction.query.get(t['id']):
+                new_tran = SupplierTransaction(
+                    id=t['id'], supplier_id=t['supplier_id'], order_id=t['order_id'],
+                    amount=t['amount'], transaction_date=parse_date(t['transaction_date'])
+                )
+                db.session.add(new_tran)
+
+    db.session.commit()
+    rebuild_rollups()
+    repair_user_stats()
+    print("Database seeded successfully.")
 
 if __name__ == "__main__":
-    seed_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Load DB/*.json into the database')
+    parser.add_argument('--bulk', action='store_true', help='stream files and insert in batches')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--data-dir', default='DB')
+    args = parser.parse_args()
+    with create_app().app_context():
+        if args.bulk:
+            bulk_seed_data(args.data_dir, args.batch_size)
+        else:
+            seed_data()
\ No newline at end of file
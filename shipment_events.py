@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+from app import db
+from models import ShipmentEvent
+from profiling import register_metrics_provider
+
+logger = logging.getLogger(__name__)
+
+# Most missing row ids remembered by DatabaseBroker while it waits for them to commit
+MAX_PENDING_IDS = 1000
+
+def _sequence_start():
+    # Each process numbers its events from its own random offset (below 2**53
+    # so JavaScript keeps it exact): a cursor from another worker or an older
+    # process then falls outside this buffer and gets a reset
+    return random.getrandbits(40) << 12
+
+def shipment_delta(shipment_id, order_id, user_id, tracking_number, status, current_location=None,
+                   shipped_date=None, actual_delivery=None):
+    """The event sent to live clients when a shipment is created or changes."""
+    iso = lambda value: value.isoformat() if value else None
+    return {
+        'shipment_id': shipment_id,
+        'order_id': order_id,
+        'user_id': user_id,
+        'tracking_number': tracking_number,
+        'status': status,
+        'current_location': current_location,
+        'shipped_date': iso(shipped_date),
+        'actual_delivery': iso(actual_delivery),
+    }
+
+class LocalBroker:
+    """In-process pub/sub for shipment deltas.
+
+    Published events go into a ring buffer under increasing ids and waiting
+    readers share one condition variable, so an idle subscriber costs no
+    memory beyond its cursor. A reader whose cursor fell out of the buffer
+    (or belongs to another process) gets ``reset`` and should reload its
+    list.
+
+    Events are staged in the writer's session and published only after it
+    commits. They reach subscribers of this process only; use
+    DatabaseBroker to fan out across gunicorn workers.
+    """
+
+    name = 'local'
+
+    def __init__(self, buffer_size=10000):
+        self._events = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self.last_id = _sequence_start()
+        self.published = 0
+        self.waiting = 0
+
+    def stage(self, deltas):
+        db.session.info.setdefault('shipment_deltas', []).extend(deltas)
+        db.session.info['shipment_broker'] = self
+
+    def publish(self, deltas):
+        with self._cond:
+            for delta in deltas:
+                self.last_id += 1
+                self._events.append(dict(delta, id=self.last_id))
+            self.published += len(deltas)
+            self._cond.notify_all()
+
+    def read(self, after, timeout):
+        """(events with id > after, cursor, reset), waiting up to ``timeout`` seconds for the first one."""
+        with self._cond:
+            if after is None:
+                return [], self.last_id, False
+            oldest = self._events[0]['id'] - 1 if self._events else self.last_id
+            if after > self.last_id or after < oldest:
+                return [], self.last_id, True
+            if self.last_id <= after and timeout > 0:
+                self.waiting += 1
+                try:
+                    self._cond.wait_for(lambda: self.last_id > after, timeout)
+                finally:
+                    self.waiting -= 1
+            if self.last_id <= after:
+                return [], after, False
+            events = []
+            for delta in reversed(self._events):
+                if delta['id'] <= after:
+                    break
+                events.append(delta)
+            return events[::-1], self.last_id, False
+
+    def start(self, app):
+        # Setelah fork (gunicorn) tiap worker memulai urutan id sendiri
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._events.clear()
+                    self.last_id = _sequence_start()
+                    self._pid = os.getpid()
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'last_id': self.last_id,
+            'buffered': len(self._events),
+            'published_total': self.published,
+            'waiting': self.waiting,
+        }
+
+class DatabaseBroker(LocalBroker):
+    """Shares deltas between processes through the shipment_events table.
+
+    Writers insert rows in their own transaction; one thread per process
+    polls the table every SHIPMENT_EVENTS_POLL_INTERVAL seconds and
+    publishes new rows to the local subscribers. Row ids are handed out
+    before commit, so a lower id can become visible after a higher one: ids
+    skipped by a poll are asked for again on later polls for
+    SHIPMENT_EVENTS_COMMIT_WINDOW seconds, and every row id is published
+    once. Subscribers see events in the order this process read them, under
+    its own cursor, so a client that reconnects to another worker gets a
+    reset. Rows older than SHIPMENT_EVENTS_RETENTION seconds are pruned by
+    the poller.
+    """
+
+    name = 'database'
+
+    def __init__(self, buffer_size=10000):
+        super().__init__(buffer_size)
+        self._poller = None
+        self._start_lock = threading.Lock()
+        self._row_id = 0
+        # Row id -> monotonic time it was first found missing
+        self._pending = {}
+
+    def stage(self, deltas):
+        if deltas:
+            db.session.execute(insert(ShipmentEvent), [
+                {'user_id': delta['user_id'], 'payload': json.dumps(delta), 'created_at': datetime.utcnow()}
+                for delta in deltas
+            ])
+
+    def _running(self):
+        # Setelah fork (gunicorn) thread milik master tidak ikut, jadi cek per proses
+        return self._poller is not None and self._poller[0] == os.getpid() and self._poller[1].is_alive()
+
+    def start(self, app):
+        if self._running():
+            return
+        with self._start_lock:
+            if self._running():
+                return
+            super().start(app)
+            with app.app_context():
+                latest = db.session.execute(select(func.max(ShipmentEvent.id))).scalar() or 0
+                db.session.remove()
+            self._row_id, self._pending = latest, {}
+            thread = threading.Thread(target=self._poll, args=(app,), name='shipment-events', daemon=True)
+            thread.start()
+            self._poller = (os.getpid(), thread)
+
+    def _new_rows(self, rows):
+        """Payloads of the ``rows`` not published yet, moving the watermark past them."""
+        now = time.monotonic()
+        payloads = []
+        for event_id, payload in rows:
+            if event_id > self._row_id:
+                for missing in range(max(self._row_id + 1, event_id - MAX_PENDING_IDS), event_id):
+                    self._pending[missing] = now
+                self._row_id = event_id
+            elif self._pending.pop(event_id, None) is None:
+                continue
+            payloads.append(json.loads(payload))
+        return payloads
+
+    def _expire_pending(self, window):
+        # Id yang tidak muncul dalam window dianggap rollback
+        cutoff = time.monotonic() - window
+        self._pending = {event_id: seen for event_id, seen in self._pending.items() if seen >= cutoff}
+        while len(self._pending) > MAX_PENDING_IDS:
+            del self._pending[min(self._pending)]
+
+    def _poll(self, app):
+        interval = app.config.get('SHIPMENT_EVENTS_POLL_INTERVAL', 1)
+        retention = app.config.get('SHIPMENT_EVENTS_RETENTION', 3600)
+        window = app.config.get('SHIPMENT_EVENTS_COMMIT_WINDOW', 30)
+        pruned_at = 0.0
+        while True:
+            try:
+                condition = ShipmentEvent.id > self._row_id
+                if self._pending:
+                    condition = or_(condition, ShipmentEvent.id.in_(list(self._pending)))
+                with app.app_context():
+                    rows = db.session.execute(
+                        select(ShipmentEvent.id, ShipmentEvent.payload)
+                        .where(condition).order_by(ShipmentEvent.id).limit(1000)
+                    ).all()
+                    if time.monotonic() - pruned_at >= 60:
+                        cutoff = datetime.utcnow() - timedelta(seconds=retention)
+                        db.session.execute(delete(ShipmentEvent).where(ShipmentEvent.created_at < cutoff))
+                        db.session.commit()
+                        pruned_at = time.monotonic()
+                    db.session.remove()
+                payloads = self._new_rows(rows)
+                self._expire_pending(window)
+                if payloads:
+                    self.publish(payloads)
+                if len(rows) == 1000:
+                    continue
+            except Exception:
+                logger.exception('Polling shipment events failed')
+            time.sleep(interval)
+
+BACKENDS = {'local': LocalBroker, 'database': DatabaseBroker}
+
+def get_broker():
+    return current_app.extensions['shipment_events']
+
+def publish_shipment_changes(deltas):
+    """Send ``deltas`` to live subscribers once the caller's transaction commits."""
+    if deltas:
+        get_broker().stage(deltas)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_staged(session):
+    deltas = session.info.pop('shipment_deltas', None)
+    broker = session.info.pop('shipment_broker', None)
+    if deltas and broker is not None:
+        broker.publish(deltas)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_staged(session):
+    session.info.pop('shipment_deltas', None)
+    session.info.pop('shipment_broker', None)
+
+def wait_for_changes(broker, after, user_id, timeout):
+    """Deltas visible to ``user_id`` (None = admin, everything) after cursor ``after``.
+
+    Waits until at least one such delta arrives or ``timeout`` seconds pass;
+    returns (deltas, cursor, reset).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        events, cursor, reset = broker.read(after, max(deadline - time.monotonic(), 0))
+        if user_id is not None:
+            events = [delta for delta in events if delta['user_id'] == user_id]
+        if events or reset or time.monotonic() >= deadline:
+            return events, cursor, reset
+        # Hanya perubahan milik user lain; tunggu lagi dari cursor baru
+        after = cursor
+
+def iter_sse(broker, after, user_id, heartbeat=15, max_seconds=300):
+    """Server-sent events for the shipment deltas visible to ``user_id``.
+
+    Sends a comment every ``heartbeat`` seconds so proxies keep the
+    connection open, and ends after ``max_seconds``; EventSource reconnects
+    by itself and resumes from the Last-Event-ID.
+    """
+    if after is None:
+        after = broker.last_id
+    yield f'retry: 3000\nid: {after}\n\n'
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        events, cursor, reset = wait_for_changes(broker, after, user_id,
+                                                 min(heartbeat, deadline - time.monotonic()))
+        if reset:
+            yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+        for delta in events:
+            yield f"id: {delta['id']}\nevent: shipment\ndata: {json.dumps(delta)}\n\n"
+        if not events and not reset:
+            yield ': keepalive\n\n'
+        after = cursor
+
+def can_hold_connections(environ):
+    """Whether this server can keep a stream or long-poll open without tying up a worker.
+
+    True under gevent (a greenlet per client) and the development server (a
+    thread per connection); False under gunicorn's sync and gthread workers,
+    where every idle client would hold a worker process.
+    """
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return True
+    except ImportError:
+        pass
+    return not environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/')
+
+def init_app(app):
+    backend = app.config.get('SHIPMENT_EVENTS_BACKEND', 'local')
+    if backend not in BACKENDS:
+        raise ValueError(f"SHIPMENT_EVENTS_BACKEND must be one of {', '.join(BACKENDS)}")
+    broker = BACKENDS[backend](app.config.get('SHIPMENT_EVENTS_BUFFER', 10000))
+    app.extensions['shipment_events'] = broker
+    register_metrics_provider('shipment_events', broker.stats)
+    app.before_request(lambda: broker.start(app))
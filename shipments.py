@@ -0,0 +1,308 @@
+import csv
+import hashlib
+import json
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update
+from app import db
+from cache import TTLCache
+from eta import estimate_delivery, estimate_transit, record_delivery, record_delivery_times, transit_hours
+from models import Order, Shipment
+from profiling import register_metrics_provider
+from shipment_events import publish_shipment_changes, shipment_delta
+from stats import (bump_user_stats_many, invalidate_dashboard_stats, order_status_changed,
+                   shipment_status_changed)
+
+SHIPMENT_STATUSES = ('preparing', 'in_transit', 'delivered')
+STATUS_RANK = {status: rank for rank, status in enumerate(SHIPMENT_STATUSES)}
+DEFAULT_FEED_BATCH_SIZE = 1000
+
+FeedEvent = namedtuple('FeedEvent', 'line tracking_number status location timestamp')
+
+tracking_cache = TTLCache(maxsize=50000, ttl=60)
+register_metrics_provider('tracking_cache', tracking_cache.stats)
+
+def status_changes(shipped_date, new_status, location, when):
+    """Column values for moving a shipment to ``new_status``.
+
+    Shared by the admin form and the carrier feed so both follow the same
+    rules: ``shipped_date`` is set the first time it goes in transit,
+    ``actual_delivery`` when it is delivered and ``last_event_at`` always, so
+    feed events older than the latest change are recognised as out of order.
+    """
+    changes = {'status': new_status, 'last_event_at': when}
+    if location is not None:
+        changes['current_location'] = location
+    if new_status == 'in_transit' and not shipped_date:
+        changes['shipped_date'] = when
+    elif new_status == 'delivered':
+        changes['actual_delivery'] = when
+    return changes
+
+def update_shipment(shipment, new_status, location, when=None):
+    """Apply a status change to a loaded shipment, its order and the user counters."""
+    when = when or datetime.utcnow()
+    old_status = shipment.status
+    for key, value in status_changes(shipment.shipped_date, new_status, location, when).items():
+        setattr(shipment, key, value)
+    order = shipment.order
+    if new_status == 'delivered':
+        # Update order status
+        old_order_status = order.status
+        order.status = 'delivered'
+        order_status_changed(order.user_id, old_order_status, 'delivered')
+        if old_status != 'delivered':
+            record_delivery(shipment, order)
+    shipment_status_changed(order.user_id, old_status, new_status)
+    publish_shipment_changes([shipment_delta(
+        shipment.id, order.id, order.user_id, shipment.tracking_number, shipment.status,
+        shipment.current_location, shipment.shipped_date, shipment.actual_delivery
+    )])
+
+# Public tracking lookup
+
+def normalize_tracking_number(tracking_number):
+    return (tracking_number or '').strip().upper()
+
+def _estimate(row):
+    """(eta, earliest, latest) for a shipment that has not been delivered yet."""
+    transit = estimate_transit(row.supplier_id, row.package_type)
+    if row.shipped_date is not None:
+        return estimate_delivery(row.supplier_id, row.package_type, shipped_date=row.shipped_date, transit=transit)
+    if row.estimated_delivery is None:
+        return None, None, None
+    # Belum dikirim: pakai estimasi saat konfirmasi, rentangnya dari statistik transit
+    mean, low, high = transit
+    return (row.estimated_delivery, row.estimated_delivery - timedelta(hours=mean - low),
+            row.estimated_delivery + timedelta(hours=high - mean))
+
+def _load_tracking(tracking_number):
+    row = db.session.execute(
+        select(Shipment.tracking_number, Shipment.status, Shipment.current_location,
+               Shipment.shipped_date, Shipment.estimated_delivery, Shipment.actual_delivery,
+               Order.supplier_id, Order.package_type)
+        .join(Order, Shipment.order_id == Order.id)
+        .where(Shipment.tracking_number == tracking_number)
+    ).first()
+    if row is None:
+        return None
+    eta = earliest = latest = None
+    if row.status != 'delivered':
+        eta, earliest, latest = _estimate(row)
+    iso = lambda value: value.isoformat() if value else None
+    snapshot = {
+        'tracking_number': row.tracking_number,
+        'status': row.status,
+        'current_location': row.current_location,
+        'shipped_date': iso(row.shipped_date),
+        'estimated_delivery': iso(eta or row.estimated_delivery),
+        'estimated_delivery_earliest': iso(earliest),
+        'estimated_delivery_latest': iso(latest),
+        'actual_delivery': iso(row.actual_delivery),
+    }
+    snapshot['etag'] = hashlib.sha1(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()[:20]
+    return snapshot
+
+def tracking_snapshot(tracking_number):
+    """Status, location and ETA of a shipment as a plain dict, or None if unknown.
+
+    Served from an in-process cache; misses are a single lookup on the unique
+    tracking_number index. Unknown numbers are cached briefly as well so that
+    polling for a typo does not reach the database every time.
+    """
+    tracking_number = normalize_tracking_number(tracking_number)
+    if not tracking_number:
+        return None
+    cached = tracking_cache.get(tracking_number)
+    if cached is not None:
+        return cached or None
+    snapshot = _load_tracking(tracking_number)
+    config = current_app.config
+    if snapshot is None:
+        tracking_cache.set(tracking_number, {}, ttl=config.get('TRACKING_NEGATIVE_CACHE_TTL', 10))
+    else:
+        tracking_cache.set(tracking_number, snapshot, ttl=config.get('TRACKING_CACHE_TTL', 60))
+    return snapshot
+
+def invalidate_tracking(tracking_numbers):
+    for tracking_number in tracking_numbers:
+        if tracking_number:
+            tracking_cache.pop(normalize_tracking_number(tracking_number))
+
+# Carrier feed ingestion
+
+def _parse_timestamp(value):
+    if value is None or value == '':
+        return datetime.utcnow()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Unix seconds
+        try:
+            return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError):
+            raise ValueError(f'timestamp {value!r} is out of range')
+    if not isinstance(value, str):
+        raise ValueError('timestamp must be an ISO 8601 string or Unix seconds')
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _text(record, *keys, max_length=None):
+    """The first of ``keys`` present in ``record`` as a stripped string ('' if missing)."""
+    value = next((record[key] for key in keys if record.get(key) is not None), None)
+    if value is None:
+        return ''
+    # JSONL may carry numeric tracking numbers; anything else is a malformed event
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError(f'{keys[0]} must be a string')
+    value = str(value).strip()
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f'{keys[0]} is longer than {max_length} characters')
+    return value
+
+def _parse_event(line, record):
+    if not isinstance(record, dict):
+        raise ValueError('not an object')
+    tracking_number = _text(record, 'tracking_number', max_length=Shipment.tracking_number.type.length)
+    status = _text(record, 'status')
+    if not tracking_number:
+        raise ValueError('missing tracking_number')
+    if status not in STATUS_RANK:
+        raise ValueError(f'unknown status {status!r}')
+    location = _text(record, 'location', 'current_location', max_length=Shipment.current_location.type.length)
+    timestamp = record.get('timestamp', record.get('event_time'))
+    return FeedEvent(line, tracking_number, status, location or None, _parse_timestamp(timestamp))
+
+def iter_feed(stream, fmt):
+    """Yield (line number, record or None) from a CSV or JSONL text stream."""
+    if fmt == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except json.JSONDecodeError:
+            yield line, None
+
+def _apply_batch(events, summary):
+    numbers = {event.tracking_number for event in events}
+    rows = db.session.execute(
+        select(Shipment.id, Shipment.tracking_number, Shipment.status, Shipment.shipped_date,
+               Shipment.current_location, Order.id, Order.user_id, Order.status,
+               Order.supplier_id, Order.package_type, Shipment.last_event_at)
+        .join(Order, Shipment.order_id == Order.id)
+        .where(Shipment.tracking_number.in_(numbers))
+    ).all()
+    state = {
+        row[1]: {
+            'id': row[0], 'tracking_number': row[1], 'status': row[2], 'shipped_date': row[3], 'current_location': row[4],
+            'order_id': row[5], 'user_id': row[6], 'order_status': row[7],
+            'supplier_id': row[8], 'package_type': row[9], 'last_event_at': row[10],
+            'original_status': row[2], 'changes': {},
+        }
+        for row in rows
+    }
+
+    skipped = summary['skipped']
+    # Terapkan event per shipment sesuai urutan waktu kejadian
+    for event in sorted(events, key=lambda e: (e.timestamp, STATUS_RANK[e.status])):
+        current = state.get(event.tracking_number)
+        if current is None:
+            skipped['unknown_tracking_number'] += 1
+            continue
+        new_rank = STATUS_RANK[event.status]
+        current_rank = STATUS_RANK.get(current['status'], 0)
+        # Compared with the stored state, so a feed replayed later (or another
+        # carrier's feed) cannot move a shipment back in time
+        last = current['last_event_at']
+        if new_rank < current_rank or (last is not None and event.timestamp < last) or (
+                current['shipped_date'] and event.status != 'preparing' and event.timestamp < current['shipped_date']):
+            skipped['out_of_order'] += 1
+            continue
+        if new_rank == current_rank and (
+                event.status == 'delivered' or event.location in (None, current['current_location'])):
+            skipped['duplicate'] += 1
+            continue
+        changes = status_changes(current['shipped_date'], event.status, event.location, event.timestamp)
+        current.update(changes)
+        current['changes'].update(changes)
+        summary['applied'] += 1
+
+    changed = [s for s in state.values() if s['changes']]
+    if not changed:
+        return
+    db.session.execute(update(Shipment), [{'id': s['id'], **s['changes']} for s in changed])
+    delivered = [s for s in changed if s['status'] == 'delivered' and s['order_status'] != 'delivered']
+    if delivered:
+        db.session.execute(
+            update(Order).where(Order.id.in_([s['order_id'] for s in delivered])).values(status='delivered'),
+            execution_options={'synchronize_session': False}
+        )
+
+    deltas = {}
+    for s in changed:
+        delta = deltas.setdefault(s['user_id'], {'pending': 0, 'in_transit': 0})
+        delta['in_transit'] += (s['status'] == 'in_transit') - (s['original_status'] == 'in_transit')
+        if s['status'] == 'delivered' and s['order_status'] == 'pending':
+            delta['pending'] -= 1
+    bump_user_stats_many(deltas)
+    record_delivery_times([
+        (s['supplier_id'], s['package_type'], transit_hours(s['shipped_date'], s['actual_delivery']))
+        for s in changed
+        if s['status'] == 'delivered' and s['original_status'] != 'delivered' and s['shipped_date']
+    ])
+    publish_shipment_changes([
+        shipment_delta(s['id'], s['order_id'], s['user_id'], s['tracking_number'], s['status'],
+                       s['current_location'], s['shipped_date'], s.get('actual_delivery'))
+        for s in changed
+    ])
+    summary['shipments_updated'] += len(changed)
+    summary['orders_delivered'] += len(delivered)
+
+def ingest_carrier_feed(stream, fmt='jsonl', batch_size=DEFAULT_FEED_BATCH_SIZE):
+    """Apply a carrier status feed read from a text ``stream``.
+
+    Events are applied in batches (one SELECT, one executemany UPDATE and one
+    commit per batch). Events for unknown tracking numbers, duplicates and
+    events older than the shipment's stored state (its last_event_at and
+    shipped_date) are skipped and counted.
+    """
+    started = time.perf_counter()
+    summary = {'events': 0, 'applied': 0, 'shipments_updated': 0, 'orders_delivered': 0,
+               'skipped': Counter(), 'errors': []}
+    batch = []
+
+    def flush():
+        _apply_batch(batch, summary)
+        db.session.commit()
+        invalidate_tracking({event.tracking_number for event in batch})
+        batch.clear()
+
+    for line, record in iter_feed(stream, fmt):
+        summary['events'] += 1
+        try:
+            batch.append(_parse_event(line, record))
+        except (TypeError, ValueError) as exc:
+            summary['skipped']['invalid'] += 1
+            if len(summary['errors']) < 100:
+                summary['errors'].append({'line': line, 'error': str(exc)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if summary['shipments_updated']:
+        invalidate_dashboard_stats()
+
+    elapsed = time.perf_counter() - started
+    summary['skipped'] = dict(summary['skipped'])
+    summary['seconds'] = round(elapsed, 3)
+    summary['events_per_second'] = round(summary['events'] / elapsed, 1) if elapsed else None
+    return summary
@@ -0,0 +1,202 @@
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import bindparam, case, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app import db
+from cache import TTLCache
+from profiling import register_metrics_provider
+from models import Product, Supplier, Order, Shipment, UserOrderStats, ArchivedOrder, ReplenishmentSuggestion
+from planner import low_stock_condition, low_stock_products
+
+DEFAULT_DASHBOARD_CACHE_TTL = 30
+
+dashboard_cache = TTLCache(maxsize=16, ttl=DEFAULT_DASHBOARD_CACHE_TTL)
+register_metrics_provider('dashboard_cache', dashboard_cache.stats)
+
+def _compute_admin_stats():
+    # Semua counter dalam satu round-trip
+    row = db.session.execute(select(
+        select(func.count(Product.id)).scalar_subquery().label('total_products'),
+        select(func.count(Product.id))
+        .outerjoin(ReplenishmentSuggestion, ReplenishmentSuggestion.product_id == Product.id)
+        .where(low_stock_condition()).scalar_subquery().label('low_stock_count'),
+        (select(func.count(Order.id)).scalar_subquery()
+         + select(func.count(ArchivedOrder.id)).scalar_subquery()).label('total_orders'),
+        select(func.count(Order.id)).where(Order.status == 'pending').scalar_subquery().label('pending_orders'),
+        select(func.count(Supplier.id)).scalar_subquery().label('total_suppliers'),
+    )).one()
+    stats = dict(row._mapping)
+    recent_orders = Order.query.options(
+        joinedload(Order.user),
+        joinedload(Order.product)
+    ).order_by(Order.order_date.desc()).limit(5).all()
+    stats['recent_orders'] = [_snapshot(order, user=_snapshot(order.user), product=_snapshot(order.product))
+                              for order in recent_orders]
+    stats['low_stock_products'] = [_snapshot(product) for product in low_stock_products()]
+    return stats
+
+def _snapshot(obj, **related):
+    # Salinan kolom saja: objek ORM tidak boleh dipakai bersama antar request/thread
+    if obj is None:
+        return None
+    values = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    values.update(related)
+    return SimpleNamespace(**values)
+
+def admin_dashboard_stats():
+    """Counters, recent orders and low-stock products for the admin dashboard.
+
+    Cached for DASHBOARD_CACHE_TTL seconds; the rows are plain snapshots of
+    the ORM objects so they can be shared between requests.
+    """
+    stats = dashboard_cache.get('admin')
+    if stats is None:
+        stats = _compute_admin_stats()
+        ttl = current_app.config.get('DASHBOARD_CACHE_TTL', DEFAULT_DASHBOARD_CACHE_TTL)
+        dashboard_cache.set('admin', stats, ttl=ttl)
+    return stats
+
+def invalidate_dashboard_stats():
+    dashboard_cache.clear()
+
+# Per-user counters for the customer dashboard
+
+def _compute_user_stats(user_id):
+    total_orders, pending_orders = db.session.execute(
+        select(func.count(Order.id), func.coalesce(func.sum(case((Order.status == 'pending', 1), else_=0)), 0))
+        .where(Order.user_id == user_id)
+    ).one()
+    in_transit = db.session.execute(
+        select(func.count(Shipment.id)).join(Order)
+        .where(Order.user_id == user_id, Shipment.status == 'in_transit')
+    ).scalar()
+    # Archived orders still count towards the total (they are never pending or in transit)
+    total_orders += db.session.execute(
+        select(func.count(ArchivedOrder.id)).where(ArchivedOrder.user_id == user_id)
+    ).scalar()
+    return {'total_orders': total_orders, 'pending_orders': pending_orders, 'in_transit': in_transit}
+
+def _insert_user_stats(user_id, counts):
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(UserOrderStats.__table__).values(user_id=user_id, **counts))
+        return True
+    except IntegrityError:
+        return False
+
+def bump_user_stats(user_id, total=0, pending=0, in_transit=0):
+    """Apply counter deltas for ``user_id`` in the caller's transaction.
+
+    Call it after the change itself has been added to the session: if the user
+    has no counter row yet, one is created from the base tables (which then
+    already include the change) instead of applying the deltas.
+    """
+    table = UserOrderStats.__table__
+    bump = update(table).where(table.c.user_id == user_id).values(
+        total_orders=table.c.total_orders + total,
+        pending_orders=table.c.pending_orders + pending,
+        in_transit=table.c.in_transit + in_transit
+    )
+    if db.session.execute(bump).rowcount:
+        return
+    db.session.flush()
+    if not _insert_user_stats(user_id, _compute_user_stats(user_id)):
+        # Transaksi lain membuat baris counter lebih dulu
+        db.session.execute(bump)
+
+def bump_user_stats_many(deltas):
+    """Apply ``{user_id: {'total': .., 'pending': .., 'in_transit': ..}}`` in one executemany.
+
+    Like bump_user_stats, call it after the underlying changes were written.
+    """
+    deltas = {user_id: d for user_id, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    table = UserOrderStats.__table__
+    db.session.flush()
+    existing = set(db.session.execute(
+        select(table.c.user_id).where(table.c.user_id.in_(list(deltas)))
+    ).scalars())
+    rows = [
+        {'uid': user_id, 'd_total': d.get('total', 0), 'd_pending': d.get('pending', 0),
+         'd_in_transit': d.get('in_transit', 0)}
+        for user_id, d in deltas.items() if user_id in existing
+    ]
+    if rows:
+        db.session.execute(update(table).where(table.c.user_id == bindparam('uid')).values(
+            total_orders=table.c.total_orders + bindparam('d_total'),
+            pending_orders=table.c.pending_orders + bindparam('d_pending'),
+            in_transit=table.c.in_transit + bindparam('d_in_transit')
+        ), rows)
+    for user_id in deltas.keys() - existing:
+        bump_user_stats(user_id, **deltas[user_id])
+
+def order_status_changed(user_id, old_status, new_status):
+    if old_status != new_status and 'pending' in (old_status, new_status):
+        bump_user_stats(user_id, pending=1 if new_status == 'pending' else -1)
+
+def shipment_status_changed(user_id, old_status, new_status):
+    if old_status != new_status and 'in_transit' in (old_status, new_status):
+        bump_user_stats(user_id, in_transit=1 if new_status == 'in_transit' else -1)
+
+def user_dashboard_stats(user_id):
+    """Counters for the customer dashboard; a missing row is computed and stored once."""
+    stats = db.session.get(UserOrderStats, user_id)
+    if stats is not None:
+        return {'total_orders': stats.total_orders, 'pending_orders': stats.pending_orders,
+                'in_transit': stats.in_transit}
+    counts = _compute_user_stats(user_id)
+    if _insert_user_stats(user_id, counts):
+        db.session.commit()
+    return counts
+
+def repair_user_stats(fix=True):
+    """Recompute every user's counters from the base tables.
+
+    Returns the ids of users whose stored counters were wrong or missing; with
+    ``fix`` they are rewritten.
+    """
+    expected = {}
+    order_counts = db.session.execute(
+        select(Order.user_id, func.count(Order.id), func.sum(case((Order.status == 'pending', 1), else_=0)))
+        .group_by(Order.user_id)
+    )
+    for user_id, total_orders, pending_orders in order_counts:
+        expected[user_id] = {'total_orders': total_orders, 'pending_orders': pending_orders or 0, 'in_transit': 0}
+    archived_counts = db.session.execute(
+        select(ArchivedOrder.user_id, func.count(ArchivedOrder.id)).group_by(ArchivedOrder.user_id)
+    )
+    for user_id, archived in archived_counts:
+        counts = expected.setdefault(user_id, {'total_orders': 0, 'pending_orders': 0, 'in_transit': 0})
+        counts['total_orders'] += archived
+    transit_counts = db.session.execute(
+        select(Order.user_id, func.count(Shipment.id)).join(Shipment, Shipment.order_id == Order.id)
+        .where(Shipment.status == 'in_transit')
+        .group_by(Order.user_id)
+    )
+    for user_id, in_transit in transit_counts:
+        expected[user_id]['in_transit'] = in_transit
+
+    stored = {
+        row.user_id: {'total_orders': row.total_orders, 'pending_orders': row.pending_orders,
+                      'in_transit': row.in_transit}
+        for row in db.session.execute(select(UserOrderStats.__table__))
+    }
+    zero = {'total_orders': 0, 'pending_orders': 0, 'in_transit': 0}
+    table = UserOrderStats.__table__
+    wrong = []
+    for user_id in expected.keys() | stored.keys():
+        counts = expected.get(user_id, zero)
+        if stored.get(user_id) == counts:
+            continue
+        wrong.append(user_id)
+        if not fix:
+            continue
+        if user_id in stored:
+            db.session.execute(update(table).where(table.c.user_id == user_id).values(**counts))
+        else:
+            db.session.execute(insert(table).values(user_id=user_id, **counts))
+    if fix:
+        db.session.commit()
+    return sorted(wrong)
@@ -0,0 +1,198 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, case, func, insert, literal, select, update
+from app import db
+from models import Order, Product, StockReservation
+from stats import bump_user_stats_many, order_status_changed
+
+# Product.stock_quantity is the stock still available for new orders: it is
+# decremented when an order reserves stock and only given back when the
+# reservation is released or expires.
+
+class InsufficientStock(Exception):
+    pass
+
+def _reservation_ttl():
+    return timedelta(seconds=current_app.config.get('STOCK_RESERVATION_TTL', 86400))
+
+def take_stock(product_id, quantity):
+    """Atomically take ``quantity`` from a product's stock; False if there is not enough.
+
+    A single conditional UPDATE, so concurrent orders for the same product
+    only wait on that product's row lock and can never drive it negative.
+    A quantity of 0 or less takes nothing and returns False.
+    """
+    table = Product.__table__
+    result = db.session.execute(
+        update(table)
+        .where(table.c.id == product_id, table.c.stock_quantity >= quantity, literal(quantity) > 0)
+        .values(stock_quantity=table.c.stock_quantity - quantity)
+    )
+    return result.rowcount == 1
+
+def _return_stock(quantities):
+    table = Product.__table__
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('pid'))
+        .values(stock_quantity=table.c.stock_quantity + bindparam('qty')),
+        [{'pid': product_id, 'qty': quantity} for product_id, quantity in quantities.items()]
+    )
+
+def reserve_stock(order):
+    """Hold stock for a new ``order`` in the caller's transaction.
+
+    Raises InsufficientStock. Call it as late as possible before the commit:
+    the product row stays locked until then.
+    """
+    if not take_stock(order.product_id, order.quantity):
+        raise InsufficientStock(order.product_id)
+    now = datetime.utcnow()
+    db.session.add(StockReservation(
+        order=order,
+        product_id=order.product_id,
+        quantity=order.quantity,
+        created_at=now,
+        expires_at=now + _reservation_ttl()
+    ))
+
+def reserve_many(lines):
+    """Take stock for several ``(product_id, quantity)`` lines; returns one bool per line.
+
+    Lines for the same product are taken with one UPDATE when the stock covers
+    all of them, and one by one otherwise. Products are locked in id order so
+    concurrent batches cannot deadlock.
+    """
+    by_product = defaultdict(list)
+    for index, (product_id, quantity) in enumerate(lines):
+        by_product[product_id].append((index, quantity))
+    taken = [False] * len(lines)
+    for product_id in sorted(by_product):
+        entries = by_product[product_id]
+        if take_stock(product_id, sum(quantity for _, quantity in entries)):
+            for index, _ in entries:
+                taken[index] = True
+            continue
+        for index, quantity in entries:
+            taken[index] = take_stock(product_id, quantity)
+    return taken
+
+def add_reservations(orders):
+    """Reservation rows for flushed ``orders`` whose stock was taken by reserve_many()."""
+    if not orders:
+        return
+    now = datetime.utcnow()
+    expires_at = now + _reservation_ttl()
+    db.session.execute(insert(StockReservation), [
+        {'order_id': order.id, 'product_id': order.product_id, 'quantity': order.quantity,
+         'status': 'held', 'created_at': now, 'expires_at': expires_at}
+        for order in orders
+    ])
+
+def _resolve(order, status):
+    """Move the order's held reservation to ``status``; returns its row count (0 or 1)."""
+    return db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order.id, StockReservation.status == 'held')
+        .values(status=status, resolved_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+def _has_reservation(order):
+    return db.session.execute(
+        select(StockReservation.id).where(StockReservation.order_id == order.id)
+    ).first() is not None
+
+def commit_reservation(order):
+    """Turn the order's held stock into a sale when it is confirmed.
+
+    Orders created before reservations existed take their stock now. Raises
+    InsufficientStock when that fails or when the reservation has already
+    expired or been released.
+    """
+    if _resolve(order, 'committed'):
+        return
+    if _has_reservation(order) or not take_stock(order.product_id, order.quantity):
+        raise InsufficientStock(order.product_id)
+    now = datetime.utcnow()
+    db.session.add(StockReservation(
+        order_id=order.id,
+        product_id=order.product_id,
+        quantity=order.quantity,
+        status='committed',
+        expires_at=now,
+        resolved_at=now
+    ))
+
+def cancel_order(order):
+    """Cancel a pending order and give its held stock back.
+
+    Returns False when a concurrent confirm, cancel or expiry got to the
+    reservation first.
+    """
+    if _resolve(order, 'released'):
+        _return_stock({order.product_id: order.quantity})
+    elif _has_reservation(order):
+        return False
+    old_status = order.status
+    order.status = 'cancelled'
+    order_status_changed(order.user_id, old_status, order.status)
+    return True
+
+def expire_reservations(batch_size=500, now=None):
+    """Release reservations held past their expiry and cancel their pending orders.
+
+    Works in batches of ``batch_size`` with one transaction each; rows locked
+    by a concurrent confirm or cancel are skipped. Returns the number expired.
+    """
+    now = now or datetime.utcnow()
+    expired = 0
+    while True:
+        reservations = StockReservation.query.filter(
+            StockReservation.status == 'held',
+            StockReservation.expires_at < now
+        ).order_by(StockReservation.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not reservations:
+            db.session.rollback()
+            return expired
+        quantities = defaultdict(int)
+        for reservation in reservations:
+            reservation.status = 'expired'
+            reservation.resolved_at = now
+            quantities[reservation.product_id] += reservation.quantity
+        order_ids = [reservation.order_id for reservation in reservations]
+        pending = db.session.execute(
+            select(Order.user_id, func.count()).where(Order.id.in_(order_ids), Order.status == 'pending')
+            .group_by(Order.user_id)
+        ).all()
+        db.session.execute(
+            update(Order).where(Order.id.in_(order_ids), Order.status == 'pending').values(status='cancelled'),
+            execution_options={'synchronize_session': False}
+        )
+        _return_stock(quantities)
+        bump_user_stats_many({user_id: {'pending': -count} for user_id, count in pending})
+        db.session.commit()
+        expired += len(reservations)
+        if len(reservations) < batch_size:
+            return expired
+
+def set_stock_on_hand(product_id, on_hand):
+    """Set a product's stock from a physical count.
+
+    ``on_hand`` includes units held for unconfirmed orders, so those are
+    subtracted in the same statement instead of being overwritten. A count
+    below the held units leaves 0 available rather than negative stock.
+    """
+    table = Product.__table__
+    held = (
+        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+        .where(StockReservation.product_id == product_id, StockReservation.status == 'held')
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(table).where(table.c.id == product_id).values(stock_quantity=available_after_count(on_hand, held))
+    )
+
+def available_after_count(on_hand, held):
+    """SQL for the available stock left by a physical count of ``on_hand`` with ``held`` units reserved."""
+    return case((on_hand > held, on_hand - held), else_=0)